@@ -0,0 +1,65 @@
+"""Benchmarks per frame decoding against numpy batch decoding
+
+Run from the project root:
+
+    python benchmarks/batch_decode.py [--frames 10000]
+"""
+
+import argparse
+import sys
+import timeit
+
+sys.path.append("src")
+
+from sensortags.registry import get_registry  # noqa: E402
+from sensortags.tagbatch import TagBatch  # noqa: E402
+from sensortags.vectorized import decode_batch, decode_frames, stack_frames  # noqa: E402
+
+SAMPLE_FRAMES = [
+    "0201060303e1ff0d16e1ffa10264016b9aa23f23ac",
+    "0201060303e1ff1016e1ffa101640a304c593182ab3f23ac",
+    "02010612ff3906a40164010101ff0677aa3f23ac3b5a",
+    "02010611ff990403658145c71effcafff404050b71",
+    "02010611ff99040512fc5394c37c0004fffc040cac364200cdcbb8334c884f",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch decoding of advertising data")
+    parser.add_argument("--frames", action="store", default=10_000, type=int, help="frames per batch")
+    parser.add_argument("--repeat", action="store", default=20, type=int, help="best of how many runs")
+    args = parser.parse_args()
+
+    registry = get_registry()
+    payloads = [bytes.fromhex(SAMPLE_FRAMES[i % len(SAMPLE_FRAMES)]) for i in range(args.frames)]
+    (frames, lengths) = stack_frames(payloads)
+    tags = [
+        {
+            "tagId": f"ac233f{i:06x}",
+            "advertisingDataPayload": " ".join(f"0x{byte:02x}" for byte in payload),
+            "advertisingDataPayloadTS": i,
+            "advertisingDataPayloadSignalStrength": -60.0,
+            "advertisingDataPayloadLocatorId": "001122334455",
+        }
+        for (i, payload) in enumerate(payloads)
+    ]
+    batch = TagBatch.from_tags(tags)
+
+    def per_frame():
+        for payload in payloads:
+            registry.get(registry.candidates(payload)[0]).layout.decode(payload)
+
+    results = {
+        "per_frame": per_frame,
+        "stack_frames": lambda: stack_frames(payloads),
+        "decode_frames": lambda: decode_frames(frames, lengths, registry),
+        "TagBatch.from_tags": lambda: TagBatch.from_tags(tags),
+        "decode_batch": lambda: decode_batch(batch, registry),
+    }
+    for (name, func) in results.items():
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print(f"{name:>18}: {best * 1000:8.3f} ms for {args.frames} frames")
+
+
+if __name__ == "__main__":
+    main()
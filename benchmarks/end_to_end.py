@@ -0,0 +1,236 @@
+"""Measures every stage of getting sensor tag data from a getTagData ALL_ITEMS
+response into influx DB, and the whole path end to end, on synthetic responses
+mixing every supported packet type with unparseable frames (see
+sensortags.synthetic). QPE and influx DB are local stand-ins.
+
+For every response size, reports the best time of --repeat runs, tags/s and
+the peak memory traced by tracemalloc in a separate run. Results are written as
+JSON so runs of different versions can be compared with --compare.
+
+Stages, the first three per tag of the response, the others per gateway tag:
+
+- json: json.loads of the whole body and the gateway tags filtered out
+- stream: TagStream over 64 KiB chunks, see QpeClient.iter_gateway_data
+- end_to_end: QpeClient streaming getTagData, decoding, influx DB posts done
+- gateway_tag: GatewayTag.from_any_dict, tokenize_data and as_influx_point_dict
+- decode: SensorReading.from_any_dict
+- serialize: SensorReading.write_line_protocol
+- write: InfluxWriter posting the line protocol, gzipped
+
+Run from the project root:
+
+    python benchmarks/end_to_end.py [--tags 1000 10000 100000] [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import gc
+import gzip
+import json
+import platform
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append("src")
+
+from helpers.influx import InfluxWriter  # noqa: E402
+from helpers.qpe import QpeClient  # noqa: E402
+from sensortags.lineprotocol import LineProtocolBuffer  # noqa: E402
+from sensortags.readings import SensorReading  # noqa: E402
+from sensortags.sensordata import GatewayTag  # noqa: E402
+from sensortags.synthetic import synthetic_tags, tag_data_response  # noqa: E402
+from sensortags.tagstream import GATEWAY_KEYS, TagStream  # noqa: E402
+
+CHUNK_SIZE = 64 * 1024
+TAG_KEYS = ["tagId", "advertisingDataPayloadLocatorId"]
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """answers getTagData with server.body, and accepts influx DB writes"""
+
+    protocol_version = "HTTP/1.1"  # keep alive
+    disable_nagle_algorithm = True  # headers and body are separate writes
+
+    def do_GET(self):
+        body = self.server.body
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        self.server.points += body.count(b"\n")
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def json_stage(body: bytes) -> list:
+    return [
+        {key: tag[key] for key in GATEWAY_KEYS}
+        for tag in json.loads(body)["tags"]
+        if tag["advertisingDataPayload"] is not None
+    ]
+
+
+def stream_stage(body: bytes) -> list:
+    return list(TagStream(body[i : i + CHUNK_SIZE] for i in range(0, len(body), CHUNK_SIZE)))
+
+
+def gateway_tag_stage(tags: list) -> list:
+    points = []
+    for tag in tags:
+        gateway_tag = GatewayTag.from_any_dict(tag)
+        if gateway_tag.tokenize_data():
+            points.append(gateway_tag.as_influx_point_dict(tag_keys=TAG_KEYS))
+    return points
+
+
+def decode_stage(tags: list) -> list:
+    return [reading for tag in tags if (reading := SensorReading.from_any_dict(tag))]
+
+
+def serialize_stage(readings: list) -> LineProtocolBuffer:
+    buffer = LineProtocolBuffer()
+    for reading in readings:
+        reading.write_line_protocol(buffer, tag_keys=TAG_KEYS)
+    return buffer
+
+
+def write_stage(server: ThreadingHTTPServer, buffer: LineProtocolBuffer) -> None:
+    with InfluxWriter(f"http://127.0.0.1:{server.server_address[1]}", "token", "org", "bucket") as writer:
+        writer.write_lines(buffer.getvalue(), buffer.lines)
+
+
+def end_to_end_stage(server: ThreadingHTTPServer) -> None:
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    with QpeClient(f"{url}/qpe") as qpe, InfluxWriter(url, "token", "org", "bucket") as writer:
+        for tag in qpe.iter_gateway_data():
+            if reading := SensorReading.from_any_dict(tag):
+                writer.write(reading, tag_keys=TAG_KEYS)
+
+
+def measure(func, repeat: int) -> dict:
+    """best time of repeat runs, then the peak memory of one more run"""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": min(times), "peak_memory_bytes": peak}
+
+
+def run(count: int, repeat: int, server: ThreadingHTTPServer) -> list:
+    tags = synthetic_tags(count, seed=count)
+    body = tag_data_response(tags)
+    server.body = body
+    gateway_tags = json_stage(body)
+    readings = decode_stage(gateway_tags)
+    buffer = serialize_stage(readings)
+
+    stages = {
+        "json": (count, lambda: json_stage(body)),
+        "stream": (count, lambda: stream_stage(body)),
+        "end_to_end": (count, lambda: end_to_end_stage(server)),
+        "gateway_tag": (len(gateway_tags), lambda: gateway_tag_stage(gateway_tags)),
+        "decode": (len(gateway_tags), lambda: decode_stage(gateway_tags)),
+        "serialize": (len(readings), lambda: serialize_stage(readings)),
+        "write": (buffer.lines, lambda: write_stage(server, buffer)),
+    }
+    results = []
+    for (stage, (items, func)) in stages.items():
+        result = measure(func, repeat)
+        result.update(
+            {
+                "stage": stage,
+                "tags": count,
+                "items": items,
+                "items_per_second": items / result["seconds"] if result["seconds"] else 0.0,
+                "response_bytes": len(body),
+            }
+        )
+        results.append(result)
+    return results
+
+
+def version() -> str:
+    try:
+        res = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True, timeout=5)
+        return res.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results: list, baseline: dict) -> None:
+    """prints the change in items/s and peak memory against a baseline run"""
+    previous = {(result["tags"], result["stage"]): result for result in baseline["results"]}
+    print(f"compared to {baseline.get('version')}:", file=sys.stderr)
+    for result in results:
+        if (old := previous.get((result["tags"], result["stage"]))) is None:
+            continue
+        speed = result["items_per_second"] / old["items_per_second"] - 1.0 if old["items_per_second"] else 0.0
+        memory = result["peak_memory_bytes"] / old["peak_memory_bytes"] - 1.0 if old["peak_memory_bytes"] else 0.0
+        print(
+            f"{result['tags']:>7} tags {result['stage']:>12}: {speed:+7.1%} items/s, {memory:+7.1%} peak memory",
+            file=sys.stderr,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sensor tag data path end to end")
+    parser.add_argument("--tags", action="store", default=[1_000, 10_000, 100_000], type=int, nargs="+")
+    parser.add_argument("--repeat", action="store", default=3, type=int, help="best of how many runs")
+    parser.add_argument("--output", action="store", default=None, help="json file for the results, else stdout")
+    parser.add_argument("--compare", action="store", default=None, help="json results of an earlier run")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.points = 0
+    threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True).start()
+
+    results = []
+    for count in args.tags:
+        for result in run(count, args.repeat, server):
+            results.append(result)
+            print(
+                f"{count:>7} tags {result['stage']:>12}: {result['seconds'] * 1e3:9.1f} ms,"
+                f" {result['items_per_second']:>10.0f} items/s, peak {result['peak_memory_bytes'] / 2**20:7.1f} MiB",
+                file=sys.stderr,
+            )
+    server.shutdown()
+
+    report = {
+        "version": version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(results, json.load(baseline))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Measures the per point cost of InfluxPoint conversions, and of getting
+a point into line protocol through influxdb_client or a LineProtocolBuffer
+
+Run from the project root:
+
+    python benchmarks/influx_point.py [--points 10000]
+"""
+
+import argparse
+import sys
+import timeit
+
+sys.path.append("src")
+
+from influxdb_client import Point  # noqa: E402
+
+from sensortags.lineprotocol import LineProtocolBuffer  # noqa: E402
+from sensortags.readings import SensorReading  # noqa: E402
+from sensortags.sensordata import GatewayTag, QpeInfoData  # noqa: E402
+
+RUUVI_PAYLOAD = "02010611ff99040512fc5394c37c0004fffc040cac364200cdcbb8334c884f"
+
+GATEWAY_TAG = {  # trimmed getTagData ALL_ITEMS tag
+    "tagId": "ac233fa29a16",
+    "tagName": "ruuvi",
+    "tagGroupName": None,
+    "color": "#FF0000",
+    "location": [1.0, 2.0, 0.0],
+    "locationTS": 1650000000000,
+    "advertisingDataPayload": " ".join(f"0x{RUUVI_PAYLOAD[i:i + 2]}" for i in range(0, len(RUUVI_PAYLOAD), 2)),
+    "advertisingDataPayloadTS": 1650000000000,
+    "advertisingDataPayloadSignalStrength": -60.0,
+    "advertisingDataPayloadLocatorId": "001122334455",
+    "advertisingDataPayloadLocatorName": "locator",
+    "configStatus": "done",
+    "batteryVoltage": 3.0,
+}
+
+PE_INFO = {
+    "cpuLoad": 5.0,
+    "issues": [],
+    "memoryAllocated": 6.0,
+    "memoryFree": 7.0,
+    "memoryMax": 8.0,
+    "memoryUsed": 9.1,
+    "packetsPerSecond": 10.2,
+    "projectName": "projname",
+    "running": True,
+    "udpRx": 11.2,
+    "udpTx": 15.6,
+    "networkLossRate": 0.0,
+    "qpeLossRate": 0.0,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark InfluxPoint conversions")
+    parser.add_argument("--points", action="store", default=10_000, type=int, help="points per run")
+    parser.add_argument("--repeat", action="store", default=5, type=int, help="best of how many runs")
+    args = parser.parse_args()
+
+    tag = GatewayTag.from_any_dict(GATEWAY_TAG)
+    tag.tokenize_data()
+    info = QpeInfoData.from_any_dict(PE_INFO)
+    tag_keys = ["tagId", "advertisingDataPayloadLocatorId"]
+    reading = SensorReading.from_any_dict(GATEWAY_TAG)
+    buffer = LineProtocolBuffer()
+
+    def write_line(point) -> None:
+        point.write_line_protocol(buffer, tag_keys=tag_keys)
+        if buffer.lines == args.points:  # one batch per run
+            buffer.clear()
+
+    cases = {
+        "GatewayTag.from_any_dict": lambda: GatewayTag.from_any_dict(GATEWAY_TAG),
+        "GatewayTag.as_influx_point_dict": lambda: tag.as_influx_point_dict(tag_keys=tag_keys),
+        "QpeInfoData.from_any_dict": lambda: QpeInfoData.from_any_dict(PE_INFO),
+        "QpeInfoData.as_influx_point_dict": lambda: info.as_influx_point_dict(),
+        "GatewayTag via Point.from_dict": lambda: Point.from_dict(
+            dict(tag.as_influx_point_dict(tag_keys=tag_keys), time=tag.advertisingDataPayloadTS), write_precision="ms"
+        ).to_line_protocol(),
+        "GatewayTag.write_line_protocol": lambda: write_line(tag),
+        "SensorReading via Point.from_dict": lambda: Point.from_dict(
+            dict(reading.as_influx_point_dict(tag_keys), time=reading.advertisingDataPayloadTS), write_precision="ms"
+        ).to_line_protocol(),
+        "SensorReading.write_line_protocol": lambda: write_line(reading),
+    }
+    for (name, func) in cases.items():
+        best = min(timeit.repeat(func, number=args.points, repeat=args.repeat))
+        print(f"{name:>33}: {best / args.points * 1e6:6.2f} us per point")
+
+
+if __name__ == "__main__":
+    main()
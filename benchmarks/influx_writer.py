@@ -0,0 +1,104 @@
+"""Measures influx DB write throughput against a local stand-in endpoint
+
+Compares creating an InfluxDBClient and doing a synchronous write per point,
+as sensor_tag_monitor.py used to, with one long lived InfluxWriter. The stand-in
+only reads and, if needed, decompresses the posts, so the numbers are the cost
+on the client side plus one local round trip per post.
+
+Run from the project root:
+
+    python benchmarks/influx_writer.py [--points 100000]
+"""
+
+import argparse
+import gzip
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append("src")
+
+from influxdb_client import InfluxDBClient  # noqa: E402
+from influxdb_client.client.write_api import SYNCHRONOUS  # noqa: E402
+
+from helpers.influx import InfluxWriter  # noqa: E402
+from sensortags.readings import SensorReading  # noqa: E402
+
+RUUVI_PAYLOAD = "02010611ff99040512fc5394c37c0004fffc040cac364200cdcbb8334c884f"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep alive
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        self.server.points += body.count(b"\n") + (not body.endswith(b"\n"))
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def readings(count: int) -> list:
+    return [
+        SensorReading.from_any_dict(
+            {
+                "tagId": f"{index:012x}",
+                "advertisingDataPayload": RUUVI_PAYLOAD,
+                "advertisingDataPayloadTS": 1650000000000 + index,
+                "advertisingDataPayloadSignalStrength": -60.0,
+                "advertisingDataPayloadLocatorId": "001122334455",
+            }
+        )
+        for index in range(count)
+    ]
+
+
+def per_point_client(url: str, points: list) -> None:
+    for reading in points:
+        influx = InfluxDBClient(url=url, token="token", org="org")
+        write_api = influx.write_api(write_options=SYNCHRONOUS)
+        write_api.write(bucket="bucket", org="org", record=reading.as_influx_point_dict())
+        influx.close()
+
+
+def batching_writer(url: str, points: list, compress: bool) -> None:
+    with InfluxWriter(url, "token", "org", "bucket", compress=compress) as writer:
+        for reading in points:
+            writer.write(reading)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark influx DB writers")
+    parser.add_argument("--points", action="store", default=100_000, type=int, help="points for InfluxWriter")
+    parser.add_argument("--per_point", action="store", default=500, type=int, help="points for per point clients")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.points = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    points = readings(args.points)
+    cases = {
+        "client per point, synchronous": lambda: per_point_client(url, points[: args.per_point]),
+        "InfluxWriter": lambda: batching_writer(url, points, compress=False),
+        "InfluxWriter, gzip": lambda: batching_writer(url, points, compress=True),
+    }
+    for (name, func) in cases.items():
+        server.points = 0
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        print(f"{name:>30}: {server.points / elapsed:10.0f} points/s ({server.points} points in {elapsed:.2f} s)")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
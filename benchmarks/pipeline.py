@@ -0,0 +1,119 @@
+"""Measures poll cycles of 20k tags done serially against the staged pipeline,
+with a simulated QPE response time per fetch and a writer that only counts
+
+Run from the project root:
+
+    python benchmarks/pipeline.py [--tags 20000] [--cycles 5] [--fetch_latency 0.3] [--decode_processes 0]
+"""
+
+import argparse
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+sys.path.append("src")
+
+from helpers.pipeline import Pipeline, Stage, batched  # noqa: E402
+from sensortags.lineprotocol import LineProtocolBuffer  # noqa: E402
+from sensortags.readings import SensorReading  # noqa: E402
+
+SAMPLE_FRAMES = [
+    "0201060303e1ff0d16e1ffa10264016b9aa23f23ac",
+    "0201060303e1ff1016e1ffa101640a304c593182ab3f23ac",
+    "02010612ff3906a40164010101ff0677aa3f23ac3b5a",
+    "02010611ff990403658145c71effcafff404050b71",
+    "02010611ff99040512fc5394c37c0004fffc040cac364200cdcbb8334c884f",
+]
+
+
+def make_tags(count: int) -> list:
+    return [
+        {
+            "tagId": f"ac233f{i:06x}",
+            "advertisingDataPayload": " ".join(
+                f"0x{SAMPLE_FRAMES[i % len(SAMPLE_FRAMES)][j:j + 2]}"
+                for j in range(0, len(SAMPLE_FRAMES[i % len(SAMPLE_FRAMES)]), 2)
+            ),
+            "advertisingDataPayloadTS": 1650000000000 + i,
+            "advertisingDataPayloadSignalStrength": -60.0,
+            "advertisingDataPayloadLocatorId": "001122334455",
+        }
+        for i in range(count)
+    ]
+
+
+def fetch(tags: list, latency: float) -> list:
+    time.sleep(latency)  # waiting on QPE
+    return tags
+
+
+def decode(tags: list) -> list:
+    return [reading for tag in tags if (reading := SensorReading.from_any_dict(tag))]
+
+
+def serialize(readings: list) -> LineProtocolBuffer:
+    buffer = LineProtocolBuffer()
+    for reading in readings:
+        reading.write_line_protocol(buffer)
+    return buffer
+
+
+def serial(tags: list, cycles: int, latency: float) -> int:
+    points = 0
+    for _ in range(cycles):
+        points += serialize(decode(fetch(tags, latency))).lines
+    return points
+
+
+def pipelined(tags: list, cycles: int, latency: float, chunk_size: int, executor) -> int:
+    points = []
+
+    def source():
+        for _ in range(cycles):
+            yield from batched(fetch(tags, latency), chunk_size)
+
+    concurrency = 2 * executor._max_workers if executor is not None else 1
+    stages = [
+        Stage("decode", decode, executor=executor, concurrency=concurrency),
+        Stage("serialize", serialize),
+        Stage("write", lambda buffer: points.append(buffer.lines), size=lambda buffer: buffer.lines),
+    ]
+    with Pipeline(source(), stages) as pipeline:
+        pipeline.join()
+    for (name, report) in pipeline.report().items():
+        print(
+            f"{name:>20}: {report['items_per_second']:>9.0f} items/s, {report['utilization']:.0%} busy,"
+            f" max queue {report['max_queue_depth']}"
+        )
+    return sum(points)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark serial poll cycles against the staged pipeline")
+    parser.add_argument("--tags", action="store", default=20_000, type=int, help="tags per response")
+    parser.add_argument("--cycles", action="store", default=5, type=int, help="poll cycles")
+    parser.add_argument("--fetch_latency", action="store", default=0.3, type=float, help="seconds per fetch")
+    parser.add_argument("--chunk_size", action="store", default=2_000, type=int, help="tags per batch")
+    parser.add_argument("--decode_processes", action="store", default=0, type=int, help="0 decodes on a thread")
+    args = parser.parse_args()
+
+    tags = make_tags(args.tags)
+    decode(tags)  # warms the parser cache
+
+    start = time.perf_counter()
+    points = serial(tags, args.cycles, args.fetch_latency)
+    elapsed = time.perf_counter() - start
+    print(f"{'serial':>20}: {elapsed / args.cycles:.2f} s per cycle, {points / elapsed:.0f} points/s")
+
+    executor = ProcessPoolExecutor(args.decode_processes) if args.decode_processes else None
+    start = time.perf_counter()
+    points = pipelined(tags, args.cycles, args.fetch_latency, args.chunk_size, executor)
+    elapsed = time.perf_counter() - start
+    print(f"{'pipelined':>20}: {elapsed / args.cycles:.2f} s per cycle, {points / elapsed:.0f} points/s")
+    if executor is not None:
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Measures the latency of QPE requests, a bare requests.get per call against
+one QpeClient, using a local stand-in for QPE that answers getTagData with
+a small fixed response
+
+Run from the project root:
+
+    python benchmarks/qpe_client.py [--requests 500]
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.append("src")
+
+from helpers.qpe import QpeClient  # noqa: E402
+
+BODY = json.dumps({"code": 0, "tags": [{"tagId": "ac233fa29a16", "advertisingDataPayload": None}]}).encode()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep alive
+    disable_nagle_algorithm = True  # headers and body are separate writes
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def latencies(func, count: int) -> list:
+    result = []
+    for _ in range(count):
+        start = time.perf_counter()
+        func()
+        result.append(time.perf_counter() - start)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark QPE request latency")
+    parser.add_argument("--requests", action="store", default=500, type=int, help="requests per case")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/qpe"
+
+    client = QpeClient(base_url)
+    cases = {
+        "requests.get": lambda: requests.get(client.urls.get_tag_data_all_items).json(),
+        "QpeClient.get_tag_data": client.get_tag_data,
+    }
+    for (name, func) in cases.items():
+        times = latencies(func, args.requests)
+        print(
+            f"{name:>23}: median {statistics.median(times) * 1e3:.2f} ms,"
+            f" p99 {statistics.quantiles(times, n=100)[98] * 1e3:.2f} ms"
+        )
+
+    client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Measures the memory held per decoded reading, GatewayTag against SensorReading
+
+Run from the project root:
+
+    python benchmarks/reading_memory.py [--readings 100000]
+"""
+
+import argparse
+import sys
+import tracemalloc
+
+sys.path.append("src")
+
+from sensortags.readings import SensorReading  # noqa: E402
+from sensortags.registry import get_parser_cache  # noqa: E402
+from sensortags.sensordata import GatewayTag  # noqa: E402
+
+SAMPLE_FRAMES = [
+    "0201060303e1ff0d16e1ffa10264016b9aa23f23ac",
+    "0201060303e1ff1016e1ffa101640a304c593182ab3f23ac",
+    "02010612ff3906a40164010101ff0677aa3f23ac3b5a",
+    "02010611ff990403658145c71effcafff404050b71",
+    "02010611ff99040512fc5394c37c0004fffc040cac364200cdcbb8334c884f",
+]
+LOCATORS = 50
+
+
+def synthetic_tags(count: int) -> list[dict]:
+    """getTagData-like tags, one per tag id, spread over a few locators"""
+    return [
+        {
+            "tagId": f"ac233f{i:06x}",
+            "advertisingDataPayload": " ".join(f"0x{frame[j:j + 2]}" for j in range(0, len(frame), 2)),
+            "advertisingDataPayloadTS": 1650000000000 + i,
+            "advertisingDataPayloadSignalStrength": -60.0,
+            "advertisingDataPayloadLocatorId": f"0011223344{i % LOCATORS:02x}",
+            "advertisingDataPayloadLocatorName": f"locator {i % LOCATORS}",
+        }
+        for (i, frame) in ((i, SAMPLE_FRAMES[i % len(SAMPLE_FRAMES)]) for i in range(count))
+    ]
+
+
+def gateway_tags(raw_tags: list[dict]) -> list:
+    tags = [GatewayTag.from_any_dict(tag) for tag in raw_tags]
+    for tag in tags:
+        tag.tokenize_data()
+    return tags
+
+
+def sensor_readings(raw_tags: list[dict]) -> list:
+    return [SensorReading.from_any_dict(tag) for tag in raw_tags]
+
+
+def measure(build, raw_tags: list[dict]) -> int:
+    """bytes still allocated after building the readings, the response itself excluded"""
+    get_parser_cache().entries.clear()  # both ways fill the shared tag id -> parser cache
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    readings = build(raw_tags)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    assert len(readings) == len(raw_tags)
+    return sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark memory per decoded reading")
+    parser.add_argument("--readings", action="store", default=100_000, type=int, help="readings to hold")
+    args = parser.parse_args()
+
+    raw_tags = synthetic_tags(args.readings)
+    sensor_readings(raw_tags[: len(SAMPLE_FRAMES)])  # create the record classes up front
+
+    for build in (gateway_tags, sensor_readings):
+        size = measure(build, raw_tags)
+        print(f"{build.__name__:>16}: {size / 2**20:8.1f} MiB, {size / args.readings:6.0f} bytes per reading")
+
+
+if __name__ == "__main__":
+    main()
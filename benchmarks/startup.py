@@ -0,0 +1,58 @@
+"""Measures the startup of the sensor tag monitor: importing it in a fresh
+interpreter, with the slowest imports as -X importtime reports them, and the
+first parser discovery
+
+Run from the project root:
+
+    python benchmarks/startup.py [--runs 5] [--top 10]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+DISCOVER = (
+    "import time, sensortags.registry as registry; start = time.perf_counter(); registry.get_parser_cache(); "
+    "print(time.perf_counter() - start)"
+)
+
+
+def import_times(module: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd="src",
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "cumulative" not in line:
+            (_, cumulative, name) = line.split("|")
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [import_times("sensor_tag_monitor") for _ in range(args.runs)]
+    total = [times["sensor_tag_monitor"] for times in runs]
+    print(f"import sensor_tag_monitor: median {statistics.median(total) * 1000:.1f} ms over {args.runs} runs")
+    print("slowest imports of the last run, cumulative:")
+    for (name, seconds) in sorted(runs[-1].items(), key=lambda item: -item[1])[1 : args.top + 1]:
+        print(f"  {seconds * 1000:8.1f} ms  {name}")
+
+    start = time.perf_counter()
+    discover = [float(subprocess.check_output([sys.executable, "-c", DISCOVER], cwd="src")) for _ in range(args.runs)]
+    print(f"first parser discovery: median {statistics.median(discover) * 1000:.1f} ms")
+    print(f"total {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Measures time and peak memory of getting the gateway tags out of a
+getTagData ALL_ITEMS response: json.loads of the whole body against a TagStream
+over 64 KiB chunks, one third of the tags having gateway data
+
+Run from the project root:
+
+    python benchmarks/tag_stream.py [--tags 1000 10000 50000]
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+sys.path.append("src")
+
+from sensortags.tagstream import GATEWAY_KEYS, TagStream  # noqa: E402
+
+RUUVI_PAYLOAD = "0x02 0x01 0x06 0x11 0xff 0x99 0x04 0x05 0x12 0xfc 0x53 0x94 0xc3 0x7c 0x00 0x04"
+
+
+def all_items_response(count: int) -> bytes:
+    tags = []
+    for index in range(count):
+        gateway = index % 3 == 0
+        tags.append(
+            {
+                "tagId": f"{index:012x}",
+                "tagName": f"tag {index}",
+                "tagGroupName": None,
+                "color": "#FF0000",
+                "location": [1.0, 2.0, 0.0],
+                "locationTS": 1650000000000,
+                "locationCoordSysId": "coordsys",
+                "locationZones": [{"id": "zone", "name": "Zone"}],
+                "locationRadius": 0.5,
+                "locationMovementStatus": "moving",
+                "rssiLocator": "001122334455",
+                "rssi": -60.0,
+                "battery": 3.0,
+                "button1State": "notPushed",
+                "configStatus": "done",
+                "advertisingDataPayload": RUUVI_PAYLOAD if gateway else None,
+                "advertisingDataPayloadTS": 1650000000000 if gateway else None,
+                "advertisingDataPayloadSignalStrength": -60.0 if gateway else None,
+                "advertisingDataPayloadLocatorId": "001122334455" if gateway else None,
+                "advertisingDataPayloadLocatorName": "locator" if gateway else None,
+            }
+        )
+    return json.dumps({"code": 0, "command": "getTagData", "tags": tags}).encode()
+
+
+def whole_body(body: bytes) -> list:
+    return [
+        {key: tag[key] for key in GATEWAY_KEYS}
+        for tag in json.loads(body)["tags"]
+        if tag["advertisingDataPayload"] is not None
+    ]
+
+
+def streamed(body: bytes) -> list:
+    return list(TagStream(body[i : i + 65536] for i in range(0, len(body), 65536)))
+
+
+def measure(func, body: bytes) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(body)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return (elapsed, peak)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming getTagData ingestion")
+    parser.add_argument("--tags", action="store", default=[1_000, 10_000, 50_000], type=int, nargs="+")
+    args = parser.parse_args()
+
+    for count in args.tags:
+        body = all_items_response(count)
+        for (name, func) in {"json.loads": whole_body, "TagStream": streamed}.items():
+            (elapsed, peak) = measure(func, body)
+            print(
+                f"{count:>7} tags, {len(body) / 2**20:6.1f} MiB, {name:>10}: {elapsed * 1e3:8.1f} ms,"
+                f" peak {peak / 2**20:6.1f} MiB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3.10
+# Python 3.10.0
+"""
+This script monitors a whole fleet of QPE instances from one process, doing
+the work of one qpe_sys_monitor.py and one sensor_tag_monitor.py per QPE.
+The script expects a keys.json file to be available, see sensor_tag_monitor.py.
+
+The general process is as follows
+
+- Setup
+    - Logging
+    - Credentials
+    - Handle CL args, one --qpe_addr per QPE
+- Poll getPEInfo and getTagData of every QPE concurrently, each on its own schedule
+- Parse Data, tagged with the QPE it came from, on a worker thread so a large
+  response does not hold up the polls of the other QPEs
+- Post data to influx_db through one shared writer
+- Log the request latency of every QPE
+
+Typical usage:
+
+```bash
+    python src/fleet_monitor.py --qpe_addr http://site-1:8080/qpe --qpe_addr http://site-2:8080/qpe
+```
+"""
+__author__ = "Quuppa"
+
+import argparse
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import helpers.startup as startup
+from helpers.fleet import PE_INFO, FleetPoller, PollResult, QpeInstance
+from helpers.influx import InfluxWriter
+from helpers.spool import Spool
+from sensortags.changes import ChangeTracker
+from sensortags.readings import SensorReading
+from sensortags.registry import ParserCache, get_registry
+
+TAG_KEYS = ["tagId", "advertisingDataPayloadLocatorId"]
+
+
+class FleetPipeline:
+    """The shared decode and write steps for the results of every QPE
+
+    They run on worker threads, off the event loop, so while a large getTagData
+    response is decoded the other QPEs are still polled on schedule. Only the
+    polls of the QPE the result came from wait for it, so the results of a QPE
+    are processed one at a time and its change tracker and parser cache are
+    never used by two threads at once.
+    """
+
+    def __init__(self, writer: InfluxWriter, poller: FleetPoller = None, workers: int = 4):
+        """
+        Args:
+            writer (InfluxWriter): where the points go
+            poller (FleetPoller, optional): if given, its adaptive tag data intervals are adapted
+                to the changes. Defaults to None.
+            workers (int, optional): results processed at the same time, e.g. one per QPE. Defaults to 4.
+        """
+        self.log = logging.getLogger("FleetMon")
+        self.writer = writer
+        self.poller = poller
+        # per QPE, tag ids are only unique per site
+        self.changes: dict[str, ChangeTracker] = {}
+        self.parser_caches: dict[str, ParserCache] = {}
+        self.parser_cache_path = None  # warms the parser caches, see load_parser_caches
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="FleetPipeline")
+
+    async def handle(self, result: PollResult) -> None:
+        """decodes and writes a poll result on the worker thread, see process
+
+        Args:
+            result (PollResult): a result of the FleetPoller
+        """
+        changed = await asyncio.get_running_loop().run_in_executor(self._executor, self.process, result)
+        if changed is not None and self.poller is not None:
+            self.poller.adapt(result.qpe, changed)
+
+    def process(self, result: PollResult) -> float:
+        """decodes a poll result and writes it, tagged with its source QPE as "qpe"
+
+        Args:
+            result (PollResult): a result of the FleetPoller
+
+        Returns:
+            float: the fraction of tags with a new frame for tag data, else None
+        """
+        if result.error is not None:
+            return None
+
+        if result.endpoint == PE_INFO:
+            # the project is the measurement, tagged with the qpe, and the QpeInfoData fields are
+            # written: cpuLoad, the issues counted, memoryAllocated, memoryFree, memoryUsed,
+            # percentMemoryUsed, packetsPerSecond, running, udpRx and udpTx. Unlike qpe_sys_monitor.py
+            # the networkLossRate and qpeLossRate are not, QpeInfoData does not keep them
+            info = result.data
+            data = dict(info.__dict__, qpe=result.qpe, issues=len(info.issues))
+            self.writer.write(
+                info, data=data, measurement_key=info.projectName, tag_keys=["qpe"], fields_to_ignore=["projectName"]
+            )
+            return None
+
+        changes = self.changes.setdefault(result.qpe, ChangeTracker())
+        parser_cache = self._parser_cache(result.qpe)
+        gateway_data = [tag for tag in result.data if tag.get("advertisingDataPayload") is not None]
+        new_data = changes.filter_new_frames(gateway_data)
+
+        source = {"qpe": result.qpe}
+        for tag in new_data:
+            reading = SensorReading.from_any_dict(tag, parser_cache=parser_cache)
+            if reading is None:
+                self.log.debug(f"No parser found for tag {tag['tagId']} of {result.qpe}")
+            elif changes.is_new_reading(reading):
+                self.writer.write(reading, tag_keys=TAG_KEYS, tags=source)
+        return len(new_data) / len(gateway_data) if gateway_data else 0.0
+
+    def _parser_cache(self, qpe: str) -> ParserCache:
+        if (parser_cache := self.parser_caches.get(qpe)) is None:
+            parser_cache = self.parser_caches[qpe] = ParserCache(get_registry())
+            if self.parser_cache_path:
+                parser_cache.load(self.parser_cache_path)
+        return parser_cache
+
+    def load_parser_caches(self, path: str) -> None:
+        """warms the parser cache of every QPE from a file written by save_parser_caches
+
+        Args:
+            path (str): the file, a missing one is not an error
+        """
+        self.parser_cache_path = path
+        for parser_cache in self.parser_caches.values():
+            parser_cache.load(path)
+
+    def save_parser_caches(self, path: str) -> None:
+        """writes the parsers resolved for the tags of every QPE to one file, if any changed
+
+        Args:
+            path (str): the file
+        """
+        if not any(parser_cache.dirty for parser_cache in self.parser_caches.values()):
+            return
+        merged = ParserCache(get_registry(), max_size=sum(len(cache.entries) for cache in self.parser_caches.values()))
+        for parser_cache in self.parser_caches.values():
+            merged.entries.update(parser_cache.parsers())  # taken under its lock, a worker may be resolving
+        merged.save(path)
+
+    def close(self) -> None:
+        """waits for the results being processed, results not started are dropped"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+async def report_latency(poller: FleetPoller, interval: float) -> None:
+    """logs the latency of every QPE of the fleet every interval seconds"""
+    log = logging.getLogger("FleetMon")
+    while True:
+        await asyncio.sleep(interval)
+        for (qpe, endpoints) in poller.latency_report().items():
+            for (endpoint, stats) in endpoints.items():
+                log.info(
+                    f"{qpe} {endpoint}: last {stats['last'] * 1e3:.1f} ms, median {stats['median'] * 1e3:.1f} ms,"
+                    f" max {stats['max'] * 1e3:.1f} ms, errors {stats['errors']},"
+                    f" interval {stats['interval']:.3g} s, overruns {stats['overruns']}"
+                )
+
+
+async def monitor(poller: FleetPoller, pipeline: FleetPipeline, report_interval: float) -> None:
+    report = asyncio.create_task(report_latency(poller, report_interval))
+    try:
+        await poller.poll(pipeline.handle)
+    finally:
+        report.cancel()
+
+
+if __name__ == "__main__":
+    ################# Config and Resource Init #################
+
+    parser = argparse.ArgumentParser(description="Monitor a fleet of QPEs")
+    startup.add_qpe_base_urls_arg(parser)
+    startup.add_poll_interval_arg(parser)
+    parser.add_argument(
+        "--pe_info_interval",
+        action="store",
+        default=15.0,
+        type=float,
+        help="Time in seconds between getPEInfo calls to each QPE",
+    )
+    startup.add_parser_cache_arg(parser)
+    startup.add_spool_arg(parser)
+    startup.add_schedule_args(parser)
+    args = parser.parse_args()
+
+    startup.configure_logging()
+    log: logging.Logger = logging.getLogger("FleetMon")
+
+    qpe_addrs = args.qpe_addr or ["http://localhost:8080/qpe"]
+    log.info(f"Started with {len(qpe_addrs)} QPEs, polling tag data every {args.poll_interval} seconds")
+
+    spool = Spool(args.spool) if args.spool else None
+    writer = InfluxWriter.from_credentials(startup.get_influx_credentials(), spool=spool)
+    poller = FleetPoller(
+        [QpeInstance(addr, args.pe_info_interval, args.poll_interval) for addr in qpe_addrs],
+        overrun_policy=args.overrun_policy,
+        adaptive_interval=args.adaptive_interval,
+    )
+
+    pipeline = FleetPipeline(writer, poller, workers=len(qpe_addrs))
+    if args.parser_cache:
+        pipeline.load_parser_caches(args.parser_cache)
+    try:
+        asyncio.run(monitor(poller, pipeline, report_interval=60.0))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        poller.close()
+        pipeline.close()
+        writer.close()
+        if args.parser_cache:
+            pipeline.save_parser_caches(args.parser_cache)
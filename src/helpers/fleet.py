@@ -0,0 +1,202 @@
+"""Concurrent polling of many QPE instances from one process
+
+A FleetPoller polls getPEInfo and getTagData of every QPE instance of a fleet
+on the instance's own schedule, all from one asyncio event loop. Requests are
+made with one pooled QpeClient per instance, run on a thread pool sized for
+the fleet so a slow or unreachable QPE never holds up the others. Every result
+is tagged with the QPE it came from and handed to one shared handler, e.g. the
+decode and write pipeline of fleet_monitor.py.
+
+Typical usage:
+
+    poller = FleetPoller([QpeInstance("http://site-1:8080/qpe"), QpeInstance("http://site-2:8080/qpe")])
+    asyncio.run(poller.poll(handle_result))  # handle_result(PollResult), runs forever
+"""
+
+import asyncio
+import logging
+import statistics
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, NamedTuple
+
+from helpers.qpe import QpeClient
+from helpers.schedule import COALESCE, PollScheduler
+
+PE_INFO = "getPEInfo"
+TAG_DATA = "getTagData"
+
+
+@dataclass
+class QpeInstance:
+    """A QPE of the fleet and its poll schedule, an interval of None disables the endpoint"""
+
+    base_url: str
+    pe_info_interval: float = 15.0
+    tag_data_interval: float = 15.0
+    name: str = None  # the source tag of its results. Defaults to base_url
+
+    def __post_init__(self):
+        if self.name is None:
+            self.name = self.base_url
+
+
+class PollResult(NamedTuple):
+    """The outcome of one request to one QPE of the fleet"""
+
+    qpe: str  # QpeInstance.name of the source
+    endpoint: str  # PE_INFO or TAG_DATA
+    data: object  # QpeInfoData for PE_INFO, the list of tags for TAG_DATA, None on error
+    latency: float  # seconds the request took
+    error: Exception = None
+
+
+@dataclass
+class FleetPoller:
+    """Polls every instance of a fleet concurrently, each on its own schedule"""
+
+    instances: list  # QpeInstance
+    client_options: dict = field(default_factory=dict)  # passed on to every QpeClient
+    latency_window: int = 100  # latencies kept per instance and endpoint
+    overrun_policy: str = COALESCE  # for requests that take longer than the interval, see PollScheduler
+    adaptive_interval: tuple = None  # (min, max) seconds of an adaptive tag data interval
+    target_changed: float = 0.5  # the fraction of tags changed per poll an adaptive interval aims for
+
+    def __post_init__(self):
+        self.log = logging.getLogger("FleetPoller")
+        self.clients = {
+            instance.name: QpeClient(instance.base_url, **self.client_options) for instance in self.instances
+        }
+        # (qpe, endpoint) -> the latest latencies in seconds
+        self.latencies: dict[tuple, deque] = {}
+        self.errors: dict[tuple, int] = {}
+        # (qpe, endpoint) -> the deadlines of its polls
+        self.schedulers: dict[tuple, PollScheduler] = {}
+        self._executor = ThreadPoolExecutor(max(1, 2 * len(self.instances)), thread_name_prefix="FleetPoller")
+
+    async def request(self, instance: QpeInstance, endpoint: str) -> PollResult:
+        """requests one endpoint of one instance, errors are returned, not raised
+
+        Args:
+            instance (QpeInstance): the QPE
+            endpoint (str): PE_INFO or TAG_DATA
+
+        Returns:
+            PollResult: the result, tagged with instance.name
+        """
+        client = self.clients[instance.name]
+        call = client.get_pe_info if endpoint == PE_INFO else client.get_tag_data
+        key = (instance.name, endpoint)
+
+        start = time.perf_counter()
+        try:
+            (data, error) = (await asyncio.get_running_loop().run_in_executor(self._executor, call), None)
+        except Exception as exception:  # requests.RequestException, QpeError, invalid json...
+            (data, error) = (None, exception)
+            self.errors[key] = self.errors.get(key, 0) + 1
+            self.log.warning(f"{endpoint} of {instance.name} failed: {exception}")
+        latency = time.perf_counter() - start
+
+        self.latencies.setdefault(key, deque(maxlen=self.latency_window)).append(latency)
+        return PollResult(instance.name, endpoint, data, latency, error)
+
+    async def poll_once(self) -> list[PollResult]:
+        """requests every enabled endpoint of every instance once, concurrently
+
+        Returns:
+            list[PollResult]: the results, in instance order
+        """
+        return await asyncio.gather(
+            *(
+                self.request(instance, endpoint)
+                for instance in self.instances
+                for (endpoint, interval) in self._schedule(instance)
+            )
+        )
+
+    async def poll(self, handle: Callable, duration: float = None) -> None:
+        """polls every instance on its schedule and hands every result to handle.
+        Starts are staggered over the first interval so the fleet is not
+        requested all at once.
+
+        Args:
+            handle (Callable): called with every PollResult, can be a coroutine function
+            duration (float, optional): seconds to poll for. Defaults to None, forever.
+        """
+        tasks = []
+        count = len(self.instances)
+        for (index, instance) in enumerate(self.instances):
+            for (endpoint, interval) in self._schedule(instance):
+                scheduler = self._scheduler(endpoint, interval, offset=interval * index / count)
+                self.schedulers[(instance.name, endpoint)] = scheduler
+                tasks.append(asyncio.create_task(self._poll_endpoint(instance, endpoint, scheduler, handle)))
+
+        try:
+            await asyncio.wait(tasks, timeout=duration)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    def _schedule(instance: QpeInstance) -> list:
+        schedule = [(PE_INFO, instance.pe_info_interval), (TAG_DATA, instance.tag_data_interval)]
+        return [(endpoint, interval) for (endpoint, interval) in schedule if interval is not None]
+
+    def _scheduler(self, endpoint: str, interval: float, offset: float) -> PollScheduler:
+        if endpoint == TAG_DATA and self.adaptive_interval is not None:
+            (min_interval, max_interval) = self.adaptive_interval
+            return PollScheduler(
+                interval, self.overrun_policy, min_interval, max_interval, self.target_changed, offset=offset
+            )
+        return PollScheduler(interval, self.overrun_policy, offset=offset)
+
+    async def _poll_endpoint(
+        self, instance: QpeInstance, endpoint: str, scheduler: PollScheduler, handle: Callable
+    ) -> None:
+        while True:
+            await asyncio.sleep(scheduler.next_delay())
+            result = await self.request(instance, endpoint)
+            try:
+                if asyncio.iscoroutine(handled := handle(result)):
+                    await handled
+            except Exception:
+                self.log.exception(f"Handling {endpoint} of {instance.name} failed")
+
+    def adapt(self, qpe: str, changed: float) -> None:
+        """adapts the tag data interval of a QPE, if adaptive, see PollScheduler.adapt
+
+        Args:
+            qpe (str): QpeInstance.name
+            changed (float): the fraction of tags that changed since the last poll
+        """
+        scheduler = self.schedulers.get((qpe, TAG_DATA))
+        if scheduler is not None and scheduler.adaptive:
+            scheduler.adapt(changed)
+
+    def latency_report(self) -> dict:
+        """latency statistics of the latest requests per instance
+
+        Returns:
+            dict: qpe -> endpoint -> {"last", "median", "max", "errors", "interval", "overruns"}, in seconds
+        """
+        report: dict[str, dict] = {}
+        for ((qpe, endpoint), latencies) in self.latencies.items():
+            scheduler = self.schedulers.get((qpe, endpoint))
+            report.setdefault(qpe, {})[endpoint] = {
+                "last": latencies[-1],
+                "median": statistics.median(latencies),
+                "max": max(latencies),
+                "errors": self.errors.get((qpe, endpoint), 0),
+                "interval": scheduler.interval if scheduler is not None else None,
+                "overruns": scheduler.overruns if scheduler is not None else 0,
+            }
+        return report
+
+    def close(self) -> None:
+        """closes the clients and the thread pool"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for client in self.clients.values():
+            client.close()
@@ -0,0 +1,352 @@
+"""A long lived, batching writer for influx DB
+
+Creating an InfluxDBClient and doing a synchronous write for every point costs
+a connection and a round trip per point. An InfluxWriter loads its credentials
+once, appends points as line protocol to a batch, and hands full batches, or
+batches older than flush_interval, to a background thread that posts them over
+one keep alive connection to the influx DB /api/v2/write endpoint.
+
+Batches waiting to be posted are held in a bounded queue. When influx DB can't
+keep up and the queue is full, the oldest batch is dropped and counted.
+Posts that fail while influx DB is unreachable (no connection, a time out, a 5xx
+or a 429) are retried with exponential backoff. Batches influx DB rejects (any
+other 4xx, e.g. bad line protocol or a field type conflict) are not retried,
+they are dropped and counted as failed.
+
+With a spool (see helpers.spool), batches that could not be posted, or that
+would have been dropped, are written to disk instead. While influx DB is down
+new batches go straight to the spool, without retries, and once a post goes
+through again the spool is replayed in large batches at replay_rate points/s.
+A rejected replay is narrowed down by posting the records it covered one at a
+time, so a single bad record is dropped and the good ones behind it are written.
+
+With a Metrics registry (see helpers.metrics), every post observes its latency
+in influx_write_seconds and its points in influx_batch_points, and the queued
+batches and the point counters are sampled as gauges.
+
+Typical usage:
+
+    with InfluxWriter.from_credentials(startup.get_influx_credentials()) as writer:
+        while True:
+            for reading in get_readings():
+                writer.write(reading, tag_keys=["tagId"])
+            time.sleep(poll_interval)
+"""
+
+import gzip
+import logging
+import queue
+import threading
+import time
+
+import requests
+
+from helpers.metrics import SIZE_BUCKETS, Metrics
+from helpers.spool import Spool
+from sensortags.lineprotocol import PRECISION, LineProtocolBuffer
+
+# influx DB responses worth retrying, anything else is logged and dropped
+RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+# what became of a post
+WRITTEN = "written"
+REJECTED = "rejected"  # for good, retrying or spooling it would not help
+UNREACHABLE = "unreachable"  # influx DB is down, the batch can be posted later
+
+
+class InfluxWriter:
+    """Batches points as line protocol and posts them on a background thread"""
+
+    def __init__(
+        self,
+        url: str,
+        token: str,
+        org: str,
+        bucket: str,
+        batch_size: int = 5_000,
+        flush_interval: float = 1.0,
+        max_queued_batches: int = 100,
+        compress: bool = True,
+        retries: int = 5,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        timeout: tuple = (3.05, 10.0),
+        session: requests.Session = None,
+        spool: Spool = None,
+        replay_batch_size: int = 50_000,
+        replay_rate: float = 100_000.0,
+        metrics: Metrics = None,
+    ):
+        """
+        Args:
+            url (str): the influx DB url, e.g. https://eu-central-1-1.aws.cloud2.influxdata.com
+            token (str): the influx DB token
+            org (str): the influx DB org
+            bucket (str): the bucket to write to
+            batch_size (int, optional): points per post. Defaults to 5_000.
+            flush_interval (float, optional): max age in seconds of a batch. Defaults to 1.0.
+            max_queued_batches (int, optional): batches waiting to be posted before
+                the oldest is dropped. Defaults to 100.
+            compress (bool, optional): gzip the posts. Defaults to True.
+            retries (int, optional): retries of a failed post. Defaults to 5.
+            backoff (float, optional): seconds before the first retry, doubled
+                every retry. Defaults to 0.5.
+            max_backoff (float, optional): max seconds between retries. Defaults to 30.0.
+            timeout (tuple, optional): (connect, read) timeouts in seconds. Defaults to (3.05, 10.0).
+            session (requests.Session, optional): Defaults to a new session.
+            spool (Spool, optional): where batches go while influx DB is down. Defaults to None.
+            replay_batch_size (int, optional): points per post when replaying the spool.
+                Defaults to 50_000.
+            replay_rate (float, optional): max points/s when replaying the spool. Defaults to 100_000.0.
+            metrics (Metrics, optional): where posts are measured. Defaults to None, not measured.
+        """
+        self.log = logging.getLogger("InfluxWriter")
+        self.write_url = f"{url.rstrip('/')}/api/v2/write"
+        self.params = {"org": org, "bucket": bucket, "precision": PRECISION}
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compress = compress
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.spool = spool
+        self.replay_batch_size = replay_batch_size
+        self.replay_rate = replay_rate
+
+        self.session = requests.Session() if session is None else session
+        self.session.headers.update(
+            {
+                "Authorization": f"Token {token}",
+                "Content-Type": "text/plain; charset=utf-8",
+            }
+        )
+        if compress:
+            self.session.headers["Content-Encoding"] = "gzip"
+
+        self.written_points = 0  # posted successfully
+        self.failed_points = 0  # given up on after retries or rejected by influx DB
+        self.dropped_points = 0  # dropped from a full queue
+        self.spooled_points = 0  # written to the spool
+        self.replayed_points = 0  # posted from the spool
+
+        self._down_until = 0.0  # time.monotonic() before which influx DB is not tried
+        self._replay_at = 0.0  # time.monotonic() of the next replay, rate limits them
+        self._replay_singly = 0  # spool bytes left to replay one record at a time after a rejection
+
+        self._buffer = LineProtocolBuffer()
+        self._buffer_started = None  # time.monotonic() of the first point in the buffer
+        self._lock = threading.Lock()  # guards the buffer, which both threads flush
+        self._batches: queue.Queue = queue.Queue(max_queued_batches)
+
+        self._write_seconds = self._batch_points = None
+        if metrics is not None:
+            self._write_seconds = metrics.histogram("influx_write_seconds")
+            self._batch_points = metrics.histogram("influx_batch_points", SIZE_BUCKETS)
+            metrics.gauge("influx_queued_batches", self._batches.qsize)
+            for state in ("written", "failed", "dropped", "spooled", "replayed"):
+                metrics.gauge("influx_points", lambda attr=f"{state}_points": getattr(self, attr), state=state)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="InfluxWriter", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_credentials(cls, influx_creds: dict, **kwargs):
+        """creates a writer from a keys.json entry, see startup.get_influx_credentials
+
+        Args:
+            influx_creds (dict): with "url", "token", "org" and "bucket"
+            **kwargs: see InfluxWriter.__init__
+
+        Returns:
+            InfluxWriter: the writer
+        """
+        return cls(influx_creds["url"], influx_creds["token"], influx_creds["org"], influx_creds["bucket"], **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, point, **kwargs) -> bool:
+        """adds a point to the current batch
+
+        Args:
+            point (InfluxPoint | SensorReading | dict): anything with a write_line_protocol
+                method, or a dict in the format of as_influx_point_dict
+            **kwargs: passed on to write_line_protocol, e.g. tag_keys
+
+        Returns:
+            bool: False if the point had no fields and was not added
+        """
+        with self._lock:
+            if isinstance(point, dict):
+                added = self._buffer.append_point(point, **kwargs)
+            else:
+                added = point.write_line_protocol(self._buffer, **kwargs)
+
+            if added and self._buffer_started is None:
+                self._buffer_started = time.monotonic()
+            if self._buffer.lines >= self.batch_size:
+                self._queue_buffer()
+        return added
+
+    def write_lines(self, data: bytes, lines: int) -> None:
+        """adds line protocol that was serialized already to the current batch
+
+        Args:
+            data (bytes): line protocol in ms precision, e.g. LineProtocolBuffer.getvalue()
+            lines (int): the number of points in data
+        """
+        if not lines:
+            return
+        with self._lock:
+            self._buffer.extend(data, lines)
+            if self._buffer_started is None:
+                self._buffer_started = time.monotonic()
+            if self._buffer.lines >= self.batch_size:
+                self._queue_buffer()
+
+    def flush(self) -> None:
+        """queues the current batch, even if it is not full yet"""
+        with self._lock:
+            self._queue_buffer()
+
+    def close(self) -> None:
+        """posts everything written so far and stops the background thread"""
+        if self._closed.is_set():
+            return
+        self.flush()
+        self._closed.set()
+        self._thread.join()
+        self.session.close()
+        if self.spool is not None:
+            self.spool.close()
+
+    def _queue_buffer(self) -> None:
+        """moves the buffer into the queue, the caller holds the lock"""
+        if not self._buffer.lines:
+            return
+
+        batch = (self._buffer.getvalue(), self._buffer.lines)
+        self._buffer.clear()
+        self._buffer_started = None
+
+        while True:
+            try:
+                self._batches.put_nowait(batch)
+                return
+            except queue.Full:
+                self._drop_oldest()
+
+    def _drop_oldest(self) -> None:
+        try:
+            (data, lines) = self._batches.get_nowait()
+        except queue.Empty:
+            return
+        if self.spool is not None:
+            self._spool(data, lines)
+            return
+        self.dropped_points += lines
+        self.log.warning(f"Influx DB is not keeping up, dropped a batch of {lines} points")
+
+    def _spool(self, data: bytes, lines: int) -> None:
+        self.spool.append(data, lines)
+        self.spooled_points += lines
+
+    def _run(self) -> None:
+        """background thread: posts queued batches, flushes the buffer when it gets
+        too old and replays the spool when there is nothing else to do"""
+        while not (self._closed.is_set() and self._batches.empty()):
+            try:
+                (data, lines) = self._batches.get(timeout=min(self.flush_interval, 0.1))
+            except queue.Empty:
+                with self._lock:
+                    started = self._buffer_started
+                    if started is not None and time.monotonic() - started >= self.flush_interval:
+                        self._queue_buffer()
+                if self.spool:
+                    self._replay()
+                continue
+
+            if self.spool is not None and time.monotonic() < self._down_until:
+                self._spool(data, lines)
+                continue
+
+            result = self._post(data, lines, retries=self.retries)
+            if result == WRITTEN:
+                self.written_points += lines
+            elif result == UNREACHABLE and self.spool is not None:
+                self._spool(data, lines)
+                self._down_until = time.monotonic() + self.max_backoff
+            else:
+                self.failed_points += lines
+
+    def _replay(self) -> None:
+        """posts the oldest batches of the spool, once influx DB is up and the rate allows"""
+        now = time.monotonic()
+        if now < self._down_until or now < self._replay_at:
+            return
+
+        (data, lines, size) = self.spool.peek(1 if self._replay_singly else self.replay_batch_size)
+        result = self._post(data, lines, retries=0)
+        if result == UNREACHABLE:
+            self._down_until = time.monotonic() + self.max_backoff
+            return
+
+        if result == REJECTED and not self._replay_singly and size > self.spool.peek(1)[2]:
+            # one bad record rejects them all, find it by posting them one at a time
+            self._replay_singly = size
+            self.log.warning(f"Influx DB rejected {lines} spooled points, replaying them one batch at a time")
+            return
+
+        self.spool.consume(size, lines)
+        self._replay_singly = max(self._replay_singly - size, 0)
+        if result == REJECTED:
+            self.failed_points += lines
+            self.log.error(f"Dropped {lines} spooled points influx DB rejected, {self.spool.pending_points} left")
+            return
+
+        self.replayed_points += lines
+        self._replay_at = now + lines / self.replay_rate
+        self.log.info(f"Replayed {lines} spooled points, {self.spool.pending_points} left")
+
+    def _post(self, data: bytes, lines: int, retries: int) -> str:
+        """posts one batch, retrying with exponential backoff while influx DB is unreachable
+
+        Returns:
+            str: WRITTEN, REJECTED if influx DB will not take the batch, or
+                UNREACHABLE if the retries ran out
+        """
+        if self.compress:
+            data = gzip.compress(data, compresslevel=5)
+
+        if self._batch_points is not None:
+            self._batch_points.observe(lines)
+
+        delay = self.backoff
+        for attempt in range(retries + 1):
+            retry_after = None
+            start = time.perf_counter()
+            try:
+                res = self.session.post(self.write_url, params=self.params, data=data, timeout=self.timeout)
+                if self._write_seconds is not None:
+                    self._write_seconds.observe(time.perf_counter() - start)
+                if res.status_code < 300:
+                    self.log.debug(f"Wrote {lines} points to influx DB")
+                    return WRITTEN
+                if res.status_code not in RETRY_STATUS_CODES:
+                    self.log.error(f"Influx DB rejected {lines} points, {res.status_code}: {res.text}")
+                    return REJECTED
+                retry_after = res.headers.get("Retry-After")
+                self.log.warning(f"Influx DB responded {res.status_code} to a write of {lines} points")
+            except requests.RequestException as error:
+                self.log.warning(f"Could not post {lines} points to influx DB: {error}")
+
+            if attempt < retries:
+                time.sleep(float(retry_after) if retry_after and retry_after.isdigit() else delay)
+                delay = min(delay * 2, self.max_backoff)
+
+        self.log.error(f"Gave up writing {lines} points to influx DB after {retries} retries")
+        return UNREACHABLE
@@ -0,0 +1,333 @@
+"""Cheap counters and histograms for the hot paths of the monitors
+
+The INFO log lines say that a poll cycle happened, not where its time went. A
+Metrics registry holds named counters, histograms and gauges, optionally
+labelled, e.g. by endpoint or packet type, that the hot paths update as they
+go: QpeClient the fetch latency and response bytes, Pipeline the time and items
+of every batch per stage and the queue depths, InfluxWriter the write latency
+and batch sizes.
+
+Updating a metric is an attribute increment or a bisect into a handful of
+bucket bounds, cheap enough for every batch. Look the metric up once and keep
+it, the lookup by name and labels is the expensive part.
+
+The metrics can be written to influx DB as the monitor_self measurement, one
+point per metric with its labels as tags (see Metrics.influx_points), or served
+on a local HTTP endpoint in the Prometheus text format, and as JSON on
+/metrics.json (see MetricsServer).
+
+Typical usage:
+
+    metrics = Metrics()
+    fetched = metrics.histogram("qpe_request_seconds", endpoint="getTagData")
+    with metrics.time(fetched):
+        tags = qpe.get_tag_data()
+    metrics.counter("tags_parsed", packet_type="ruuvi_raw_v2_f5").inc(len(tags))
+
+    with MetricsServer(metrics, ("127.0.0.1", 9102)):  # http://127.0.0.1:9102/metrics
+        ...
+"""
+
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterator
+
+MEASUREMENT = "monitor_self"
+
+# upper bounds of the histogram buckets, values above the last go in an overflow bucket
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # s
+SIZE_BUCKETS = (1, 10, 50, 100, 500, 1_000, 5_000, 10_000, 50_000, 100_000)  # items
+BYTES_BUCKETS = tuple(1 << shift for shift in range(10, 28, 2))  # 1 KiB to 64 MiB
+
+
+class Counter:
+    """A count that only goes up"""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+
+class Histogram:
+    """Counts of observed values per bucket, with their count, sum and max"""
+
+    __slots__ = ("bounds", "buckets", "count", "sum", "max")
+
+    def __init__(self, bounds: tuple = LATENCY_BUCKETS):
+        """
+        Args:
+            bounds (tuple, optional): ascending bucket upper bounds. Defaults to LATENCY_BUCKETS.
+        """
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)  # the last one for values above every bound
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """estimates a quantile as the upper bound of the bucket it falls in
+
+        Args:
+            q (float): e.g. 0.99
+
+        Returns:
+            float: the estimate, the max for the overflow bucket, 0.0 without observations
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for (bound, count) in zip(self.bounds, self.buckets):
+            seen += count
+            if seen >= rank:
+                return float(min(bound, self.max))
+        return float(self.max)
+
+    def summary(self) -> dict:
+        """count, sum, mean, max and the p50, p90 and p99 estimates"""
+        return {
+            "count": self.count,
+            "sum": float(self.sum),
+            "mean": self.sum / self.count if self.count else 0.0,
+            "max": float(self.max),
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Metrics:
+    """A registry of named, labelled counters, histograms and gauges"""
+
+    def __init__(self, clock: Callable = time.perf_counter):
+        """
+        Args:
+            clock (Callable, optional): what time measures with. Defaults to time.perf_counter.
+        """
+        self.clock = clock
+        self.counters: dict[tuple, Counter] = {}  # (name, labels) -> counter
+        self.histograms: dict[tuple, Histogram] = {}
+        self.gauges: dict[tuple, Callable] = {}  # (name, labels) -> function sampled on export
+        self._lock = threading.Lock()  # guards creating metrics, not updating them
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return (name, tuple(sorted((key, str(value)) for (key, value) in labels.items())))
+
+    def counter(self, name: str, **labels) -> Counter:
+        """gets a counter, created on first use
+
+        Args:
+            name (str): e.g. "tags_parsed"
+            **labels: e.g. packet_type="minew_s1"
+
+        Returns:
+            Counter: the counter
+        """
+        key = self._key(name, labels)
+        if (counter := self.counters.get(key)) is None:
+            with self._lock:
+                counter = self.counters.setdefault(key, Counter())
+        return counter
+
+    def histogram(self, name: str, bounds: tuple = LATENCY_BUCKETS, **labels) -> Histogram:
+        """gets a histogram, created on first use
+
+        Args:
+            name (str): e.g. "qpe_request_seconds"
+            bounds (tuple, optional): the bucket upper bounds if it is created. Defaults to LATENCY_BUCKETS.
+            **labels: e.g. endpoint="getTagData"
+
+        Returns:
+            Histogram: the histogram
+        """
+        key = self._key(name, labels)
+        if (histogram := self.histograms.get(key)) is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(key, Histogram(bounds))
+        return histogram
+
+    def gauge(self, name: str, function: Callable, **labels) -> None:
+        """registers a value that is sampled when the metrics are exported, e.g. a queue depth
+
+        Args:
+            name (str): e.g. "stage_queue_depth"
+            function (Callable): returns the current value
+            **labels: e.g. stage="decode"
+        """
+        with self._lock:
+            self.gauges[self._key(name, labels)] = function
+
+    @contextmanager
+    def time(self, histogram: Histogram) -> Iterator[None]:
+        """observes the seconds the block takes in histogram, also when it raises"""
+        start = self.clock()
+        try:
+            yield
+        finally:
+            histogram.observe(self.clock() - start)
+
+    def _sample_gauges(self) -> list[tuple]:
+        samples = []
+        for ((name, labels), function) in list(self.gauges.items()):
+            try:
+                samples.append((name, labels, function()))
+            except Exception:  # e.g. a queue that is gone, a gauge must not break the export
+                continue
+        return samples
+
+    def report(self) -> dict:
+        """every metric, by name and labels, e.g. "tags_parsed{packet_type=minew_s1}"
+
+        Returns:
+            dict: counter and gauge values, and Histogram.summary of every histogram
+        """
+        report = {}
+        for ((name, labels), counter) in list(self.counters.items()):
+            report[_label_name(name, labels)] = counter.value
+        for (name, labels, value) in self._sample_gauges():
+            report[_label_name(name, labels)] = value
+        for ((name, labels), histogram) in list(self.histograms.items()):
+            report[_label_name(name, labels)] = histogram.summary()
+        return report
+
+    def influx_points(self, measurement: str = MEASUREMENT, tags: dict = None, timestamp: int = None) -> list[dict]:
+        """one point per metric, in the format of as_influx_point_dict, for InfluxWriter.write.
+        The metric name and its labels are the tags, counters and gauges have a value
+        field and histograms the fields of Histogram.summary.
+
+        Args:
+            measurement (str, optional): Defaults to MEASUREMENT, "monitor_self".
+            tags (dict, optional): added to every point, e.g. {"script": "sensor_tag_monitor"}.
+                Defaults to None.
+            timestamp (int, optional): in ms, so spooled points keep their time. Defaults to now.
+
+        Returns:
+            list[dict]: the points
+        """
+        tags = tags or {}
+        timestamp = int(time.time() * 1000) if timestamp is None else timestamp
+        points = []
+        for ((name, labels), counter) in list(self.counters.items()):
+            points.append(_point(measurement, name, labels, tags, {"value": counter.value}, timestamp))
+        for (name, labels, value) in self._sample_gauges():
+            points.append(_point(measurement, name, labels, tags, {"value": value}, timestamp))
+        for ((name, labels), histogram) in list(self.histograms.items()):
+            points.append(_point(measurement, name, labels, tags, histogram.summary(), timestamp))
+        return points
+
+    def prometheus(self) -> str:
+        """every metric in the Prometheus text exposition format
+
+        Returns:
+            str: the text, counters as <name>_total and histograms with cumulative buckets
+        """
+        lines = []
+        for ((name, labels), counter) in sorted(self.counters.items()):
+            lines.append(f"{name}_total{_prometheus_labels(labels)} {counter.value}")
+        for (name, labels, value) in sorted(self._sample_gauges(), key=lambda sample: sample[:2]):
+            lines.append(f"{name}{_prometheus_labels(labels)} {float(value)}")
+        for ((name, labels), histogram) in sorted(self.histograms.items(), key=lambda item: item[0]):
+            cumulative = 0
+            for (bound, count) in zip((*histogram.bounds, "+Inf"), histogram.buckets):
+                cumulative += count
+                lines.append(f"{name}_bucket{_prometheus_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_prometheus_labels(labels)} {float(histogram.sum)}")
+            lines.append(f"{name}_count{_prometheus_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _label_name(name: str, labels: tuple) -> str:
+    if not labels:
+        return name
+    return f"{name}{{{','.join(f'{key}={value}' for (key, value) in labels)}}}"
+
+
+def _prometheus_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for (key, value) in labels) + "}"
+
+
+def _point(measurement: str, name: str, labels: tuple, tags: dict, fields: dict, timestamp: int) -> dict:
+    return {
+        "measurement": measurement,
+        "tags": {**tags, **dict(labels), "metric": name},
+        "fields": fields,
+        "time": timestamp,
+    }
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """Serves a Metrics registry, /metrics in the Prometheus text format and /metrics.json as JSON"""
+
+    daemon_threads = True
+
+    def __init__(self, metrics: Metrics, address: tuple = ("127.0.0.1", 9102)):
+        """
+        Args:
+            metrics (Metrics): what to serve
+            address (tuple, optional): (host, port), port 0 picks a free one. Defaults to ("127.0.0.1", 9102).
+        """
+        super().__init__(address, MetricsHandler)
+        self.metrics = metrics
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        (host, port) = self.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self) -> None:
+        """serves on a background thread, returns right away"""
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.1,), name="MetricsServer", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        """stops serving"""
+        if self._thread is not None:
+            self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        metrics: Metrics = self.server.metrics
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path == "/metrics.json":
+            (body, content_type) = (json.dumps(metrics.report()).encode(), "application/json")
+        elif path in ("", "/metrics"):
+            (body, content_type) = (metrics.prometheus().encode(), "text/plain; version=0.0.4")
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
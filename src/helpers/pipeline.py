@@ -0,0 +1,315 @@
+"""Concurrent fetch, decode, serialize and write stages
+
+Done one after another, a poll cycle waits for QPE, then decodes, then
+serializes, and the CPU is idle while waiting on the network and vice versa. A
+Pipeline runs every stage on its own thread, connected by bounded queues, so
+the next response is fetched while the last one is decoded and written. When a
+stage falls behind its queue fills up and the stages before it block on it,
+so memory stays bounded instead of batches piling up.
+
+A stage can hand its batches to an executor, e.g. a ProcessPoolExecutor to
+decode on several cores, keeping up to concurrency batches in flight while the
+output stays in order. A stage that raises on a batch drops it and goes on with
+the next one. The source has no next batch once it raised, so it must handle
+its own errors, e.g. of a poll, and keep going: a source that raises ends the
+pipeline, with the exception in Pipeline.error. Every stage counts its
+batches, items and busy time, see Pipeline.report. With a Metrics registry (see helpers.metrics), every
+batch is also observed in stage_batch_seconds and stage_batch_items, and the
+queue in front of every stage is sampled as stage_queue_depth, labelled by stage.
+
+Typical usage:
+
+    pipeline = Pipeline(
+        source=poll_in_chunks(),  # yields lists of tags
+        stages=[
+            Stage("decode", decode_readings, executor=ProcessPoolExecutor(4), concurrency=8),
+            Stage("serialize", serialize_readings),  # returns a LineProtocolBuffer
+            Stage("write", write_buffer, size=lambda buffer: buffer.lines),
+        ],
+    )
+    pipeline.start()
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor
+from typing import Callable, Iterable, Iterator
+
+from helpers.metrics import SIZE_BUCKETS, Histogram, Metrics
+
+# passed down the queues once the source is exhausted or the pipeline is closed
+_STOP = object()
+
+
+def batched(items: list, size: int) -> Iterator[list]:
+    """splits a list into chunks of at most size items
+
+    Args:
+        items (list): e.g. the tags of a getTagData response
+        size (int): items per chunk
+
+    Yields:
+        Iterator[list]: the chunks, in order
+    """
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+class Stage:
+    """One step of a Pipeline, a function from an input batch to an output batch"""
+
+    def __init__(
+        self,
+        name: str,
+        function: Callable,
+        executor: Executor = None,
+        concurrency: int = 1,
+        size: Callable = len,
+    ):
+        """
+        Args:
+            name (str): the name in reports and logs
+            function (Callable): called with every input batch, returns the output
+                batch, None for nothing. Must be picklable for a process pool.
+            executor (Executor, optional): runs function instead of the stage thread.
+                Defaults to None.
+            concurrency (int, optional): batches in flight on the executor. Defaults to 1.
+            size (Callable, optional): counts the items of an input batch. Defaults to len.
+        """
+        self.log = logging.getLogger(f"Pipeline.{name}")
+        self.name = name
+        self.function = function
+        self.executor = executor
+        self.concurrency = concurrency if executor is not None else 1
+        self.size = size
+
+        self.inbox: queue.Queue = None  # set by the Pipeline
+        self.outbox: queue.Queue = None  # None for the last stage
+
+        self.batches = 0  # input batches done
+        self.items = 0  # items in those batches
+        self.errors = 0  # batches the function raised on, dropped
+        self.busy = 0.0  # seconds spent in the function, or with batches in flight
+        self.blocked = 0.0  # seconds spent waiting for room in the outbox
+        self.max_depth = 0  # highest inbox depth seen
+        self._started = None
+        self._seconds: Histogram = None  # per batch, see instrument
+        self._batch_items: Histogram = None
+
+    def instrument(self, metrics: Metrics) -> None:
+        """observes every batch in metrics, labelled with the name of the stage
+
+        Args:
+            metrics (Metrics): the registry
+        """
+        self._seconds = metrics.histogram("stage_batch_seconds", stage=self.name)
+        self._batch_items = metrics.histogram("stage_batch_items", SIZE_BUCKETS, stage=self.name)
+        if self.inbox is not None:
+            metrics.gauge("stage_queue_depth", self.inbox.qsize, stage=self.name)
+
+    def report(self) -> dict:
+        """throughput and queue depth of the stage
+
+        Returns:
+            dict: batches, items, errors, items_per_second (over the time since
+            the start), utilization (fraction of it busy), blocked (seconds),
+            queue_depth and max_queue_depth of the inbox
+        """
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "errors": self.errors,
+            "items_per_second": self.items / elapsed if elapsed else 0.0,
+            "utilization": self.busy / elapsed if elapsed else 0.0,
+            "blocked": self.blocked,
+            "queue_depth": self.inbox.qsize() if self.inbox is not None else 0,
+            "max_queue_depth": self.max_depth,
+        }
+
+    def _emit(self, batch, items: int, seconds: float) -> None:
+        self.batches += 1
+        self.items += items
+        if self._seconds is not None:
+            self._seconds.observe(seconds)
+            self._batch_items.observe(items)
+        if batch is not None and self.outbox is not None:
+            start = time.monotonic()
+            self.outbox.put(batch)  # blocks while the next stage is behind, backpressure
+            self.blocked += time.monotonic() - start
+
+    def _call(self, batch):
+        try:
+            return self.function(batch)
+        except Exception:
+            self.errors += 1
+            self.log.exception(f"Stage {self.name} failed on a batch, it is dropped")
+            return None
+
+    def _result(self, future):
+        try:
+            return future.result()
+        except Exception:
+            self.errors += 1
+            self.log.exception(f"Stage {self.name} failed on a batch, it is dropped")
+            return None
+
+    def _run(self) -> None:
+        self._started = time.monotonic()
+        if self.executor is None:
+            while True:
+                self.max_depth = max(self.max_depth, self.inbox.qsize())
+                if (batch := self.inbox.get()) is _STOP:
+                    break
+                start = time.monotonic()
+                output = self._call(batch)
+                seconds = time.monotonic() - start
+                self.busy += seconds
+                self._emit(output, self.size(batch), seconds)
+        else:
+            self._run_on_executor()
+
+        if self.outbox is not None:
+            self.outbox.put(_STOP)
+
+    def _run_on_executor(self) -> None:
+        """keeps up to concurrency batches in flight, emitting them in order"""
+        pending: deque = deque()
+        busy_since = None
+        while True:
+            if pending and (len(pending) >= self.concurrency or self.inbox.empty()):
+                (future, items, submitted) = pending.popleft()
+                output = self._result(future)
+                if not pending:
+                    self.busy += time.monotonic() - busy_since
+                    busy_since = None
+                self._emit(output, items, time.monotonic() - submitted)
+                continue
+
+            self.max_depth = max(self.max_depth, self.inbox.qsize())
+            if (batch := self.inbox.get()) is _STOP:
+                break
+            if not pending:
+                busy_since = time.monotonic()
+            pending.append((self.executor.submit(self.function, batch), self.size(batch), time.monotonic()))
+
+        while pending:
+            (future, items, submitted) = pending.popleft()
+            output = self._result(future)
+            self._emit(output, items, time.monotonic() - submitted)
+        if busy_since is not None:
+            self.busy += time.monotonic() - busy_since
+
+
+class Pipeline:
+    """Runs a source and a chain of stages concurrently, connected by bounded queues"""
+
+    def __init__(
+        self,
+        source: Iterable,
+        stages: list[Stage],
+        queue_size: int = 4,
+        source_size: Callable = len,
+        metrics: Metrics = None,
+    ):
+        """
+        Args:
+            source (Iterable): yields the input batches of the first stage, e.g. a
+                generator polling QPE. Iterated on its own thread as the "fetch" stage.
+            stages (list[Stage]): the stages, in order
+            queue_size (int, optional): batches waiting in front of every stage. Defaults to 4.
+            source_size (Callable, optional): counts the items of a source batch. Defaults to len.
+                The busy time of the fetch stage is the time spent waiting on the source.
+            metrics (Metrics, optional): where every stage observes its batches, see Stage.instrument.
+                Defaults to None.
+        """
+        self.log = logging.getLogger("Pipeline")
+        self.source = source
+        self.fetch = Stage("fetch", None, size=source_size)
+        self.stages = stages
+
+        inbox = None
+        for stage in [self.fetch, *stages]:
+            stage.inbox = inbox
+            inbox = stage.outbox = queue.Queue(queue_size)
+        stages[-1].outbox = None
+        if metrics is not None:
+            for stage in [self.fetch, *stages]:
+                stage.instrument(metrics)
+
+        self.error: Exception = None  # the source raised it, ending the pipeline
+        self._stop = threading.Event()
+        self._threads = [threading.Thread(target=self._fetch, name="Pipeline.fetch", daemon=True)]
+        self._threads += [
+            threading.Thread(target=stage._run, name=f"Pipeline.{stage.name}", daemon=True) for stage in stages
+        ]
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self) -> None:
+        """starts every stage, returns right away"""
+        for thread in self._threads:
+            thread.start()
+
+    def join(self, timeout: float = None) -> bool:
+        """waits until the source is exhausted, or raised (see error), and every batch went through
+
+        Args:
+            timeout (float, optional): seconds to wait at most. Defaults to None, no limit.
+
+        Returns:
+            bool: True if the pipeline finished
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return not any(thread.is_alive() for thread in self._threads)
+
+    def close(self, timeout: float = None) -> bool:
+        """stops fetching and waits for the batches fetched so far to go through
+
+        Args:
+            timeout (float, optional): seconds to wait at most. Defaults to None, no limit.
+
+        Returns:
+            bool: True if the pipeline finished
+        """
+        self._stop.set()
+        return self.join(timeout)
+
+    def report(self) -> dict:
+        """per stage throughput and queue depth, see Stage.report
+
+        Returns:
+            dict: stage name -> report, fetch first
+        """
+        return {stage.name: stage.report() for stage in [self.fetch, *self.stages]}
+
+    def _fetch(self) -> None:
+        fetch = self.fetch
+        fetch._started = time.monotonic()
+        source = iter(self.source)
+        while not self._stop.is_set():
+            start = time.monotonic()
+            try:
+                batch = next(source)
+            except StopIteration:
+                break
+            except Exception as error:  # a generator that raised is finished, there is no next batch
+                fetch.errors += 1
+                self.error = error
+                self.log.exception("The source failed, the pipeline stops")
+                break
+            finally:
+                seconds = time.monotonic() - start
+                fetch.busy += seconds
+            fetch._emit(batch, fetch.size(batch), seconds)
+        fetch.outbox.put(_STOP)
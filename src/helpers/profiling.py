@@ -0,0 +1,205 @@
+"""Sampled cProfile and tracemalloc reports for long running monitors
+
+A CycleProfiler profiles one poll cycle in every `every`: the functions it
+wraps (see profiled) run under cProfile during that cycle only and at full
+speed the rest of the time, so it can be left on for hours. At the end of a
+profiled cycle it writes a report to the log directory with the functions
+taking the most time, the hotspots in focus (by default the per tag work of
+GatewayTag.tokenize_data, as_influx_point_dict and their SensorReading
+counterparts) and, if memory is traced, the source lines whose allocations
+grew the most since the last report. The raw stats are saved next to it for
+pstats or snakeviz. Only the latest `keep` reports are kept.
+
+cProfile only sees the thread it is enabled on, so every thread calling a
+wrapped function gets its own profile, and they are merged for the report.
+Functions running in another process, e.g. on a ProcessPoolExecutor, are not
+profiled. A report waits for the wrapped functions running at the time to
+return, so wrap the work, not the waiting, e.g. the fetch rather than the
+scheduler sleeping between polls.
+
+Typical usage:
+
+    profiler = CycleProfiler(every=100)
+    decode = profiler.profiled(decode_readings)
+    while True:
+        decode(poll())
+        profiler.cycle()  # logs/profile-<time>-cycle<n>.txt every 100 cycles
+"""
+
+import cProfile
+import functools
+import io
+import logging
+import pathlib
+import pstats
+import threading
+import time
+import tracemalloc
+from typing import Callable
+
+# what the report lists the callees of
+FOCUS = ("tokenize_data", "as_influx_point_dict", "from_any_dict", "write_line_protocol")
+# left out of the allocation growth, the bookkeeping of the profilers themselves
+_IGNORED_FILES = (tracemalloc.__file__, pstats.__file__, cProfile.__file__, "<frozen importlib._bootstrap>")
+
+
+class CycleProfiler:
+    """Profiles every `every`-th cycle and writes rotating reports to the log directory"""
+
+    def __init__(
+        self,
+        every: int = 100,
+        directory: pathlib.Path = pathlib.Path("logs"),
+        keep: int = 24,
+        top: int = 25,
+        frames: int = 1,
+        focus: tuple = FOCUS,
+    ):
+        """
+        Args:
+            every (int, optional): cycles per report, the last of them is profiled. Defaults to 100.
+            directory (pathlib.Path, optional): where the reports go. Defaults to pathlib.Path("logs").
+            keep (int, optional): reports kept, older ones are deleted. Defaults to 24.
+            top (int, optional): functions and source lines per report section. Defaults to 25.
+            frames (int, optional): stack frames tracemalloc keeps per allocation, 0 does not
+                trace memory, which costs time on every allocation. Defaults to 1.
+            focus (tuple, optional): function names to list the callees of. Defaults to FOCUS.
+        """
+        self.log = logging.getLogger("CycleProfiler")
+        self.every = max(1, every)
+        self.directory = pathlib.Path(directory)
+        self.keep = keep
+        self.top = top
+        self.frames = frames
+        self.focus = focus
+
+        self.cycles = 0
+        self.active = self.every == 1  # profiling the current cycle
+        self.reports: list[pathlib.Path] = sorted(self.directory.glob("profile-*.txt"))  # oldest first
+
+        self._profiles: list[tuple] = []  # (cProfile.Profile, lock) of every thread
+        self._local = threading.local()
+        self._lock = threading.Lock()  # guards self._profiles
+        self._snapshot = None  # tracemalloc snapshot of the last report
+        self._started = time.perf_counter()  # of the profiled cycle
+
+        self._tracing = bool(frames) and not tracemalloc.is_tracing()  # started here, stopped by close
+        if self._tracing:
+            tracemalloc.start(frames)
+        if frames:
+            self._snapshot = self._take_snapshot()
+
+    def _thread_profile(self) -> tuple:
+        if (profile := getattr(self._local, "profile", None)) is None:
+            profile = self._local.profile = (cProfile.Profile(), threading.Lock())
+            with self._lock:
+                self._profiles.append(profile)
+        return profile
+
+    def profiled(self, function: Callable) -> Callable:
+        """wraps function so it runs under cProfile while a cycle is profiled
+
+        Args:
+            function (Callable): e.g. a pipeline stage
+
+        Returns:
+            Callable: the wrapped function
+        """
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not self.active:
+                return function(*args, **kwargs)
+            (profile, lock) = self._thread_profile()
+            with lock:  # held while enabled, so the report never reads a running profile
+                profile.enable()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    profile.disable()
+
+        return wrapper
+
+    def cycle(self) -> pathlib.Path:
+        """ends a cycle, writes a report after a profiled one
+
+        Returns:
+            pathlib.Path: the report if one was written, else None
+        """
+        self.cycles += 1
+        report = None
+        if self.active:
+            self.active = False
+            report = self.write_report()
+        if self.cycles % self.every == self.every - 1 or self.every == 1:
+            self.active = True
+            self._started = time.perf_counter()
+        return report
+
+    def write_report(self) -> pathlib.Path:
+        """writes the cProfile stats and the allocation growth since the last report
+
+        Returns:
+            pathlib.Path: the text report, the raw stats are next to it with a .pstats suffix
+        """
+        seconds = time.perf_counter() - self._started
+        stats = None
+        with self._lock:
+            profiles = list(self._profiles)
+        for (profile, lock) in profiles:
+            with lock:
+                profile.create_stats()
+                if profile.stats:
+                    stats = pstats.Stats(profile) if stats is None else stats.add(profile)
+                profile.clear()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"profile-{time.strftime(r'%Y%m%d-%H%M%S')}-cycle{self.cycles}.txt"
+        text = io.StringIO()
+        text.write(f"Cycle {self.cycles}, profiled for {seconds:.3f} s\n")
+        if stats is None:
+            text.write("\nNo profiled function was called\n")
+        else:
+            stats.stream = text
+            stats.dump_stats(path.with_suffix(".pstats"))
+            text.write(f"\n# Top {self.top} by cumulative time\n")
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+            text.write(f"\n# Top {self.top} by own time\n")
+            stats.sort_stats(pstats.SortKey.TIME).print_stats(self.top)
+            for name in self.focus:
+                text.write(f"\n# Callees of {name}\n")
+                stats.print_callees(rf"\b{name}\b")
+        if self.frames:
+            self._write_allocations(text)
+
+        path.write_text(text.getvalue())
+        self._rotate(path)
+        self.log.info(f"Wrote profile of cycle {self.cycles} to {path}")
+        return path
+
+    def _take_snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, filename) for filename in _IGNORED_FILES]
+        )
+
+    def _write_allocations(self, text: io.StringIO) -> None:
+        snapshot = self._take_snapshot()
+        (current, peak) = tracemalloc.get_traced_memory()
+        text.write(f"\n# Traced memory {current / 2**20:.1f} MiB, peak {peak / 2**20:.1f} MiB\n")
+        text.write(f"\n# Top {self.top} allocation growth since the last report\n")
+        for stat in snapshot.compare_to(self._snapshot, "lineno")[: self.top]:
+            text.write(f"{stat}\n")
+        self._snapshot = snapshot
+
+    def _rotate(self, path: pathlib.Path) -> None:
+        self.reports.append(path)
+        while len(self.reports) > self.keep:
+            old = self.reports.pop(0)
+            old.unlink(missing_ok=True)
+            old.with_suffix(".pstats").unlink(missing_ok=True)
+
+    def close(self) -> None:
+        """stops tracing memory if this profiler started it"""
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
@@ -0,0 +1,218 @@
+"""A pooled client for the QPE API
+
+A bare requests.get opens a new TCP connection for every call and waits
+forever if QPE does not answer. A QpeClient keeps one requests.Session, so
+connections are kept alive and reused from a pool, applies connect and read
+timeouts to every call, and returns typed results instead of raw responses.
+
+Typical usage:
+
+    with QpeClient("http://localhost:8080/qpe") as qpe:
+        info = qpe.get_pe_info()  # QpeInfoData
+        tags = qpe.get_tag_data()  # list of tag dicts
+
+With a Metrics registry (see helpers.metrics), every request observes its
+latency in qpe_request_seconds and its size in qpe_response_bytes, and failed
+requests count in qpe_request_errors, all labelled by endpoint.
+"""
+
+import logging
+import time
+import urllib.parse as urlparse
+from typing import Iterator
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from helpers.metrics import BYTES_BUCKETS, Metrics
+from helpers.urls import QpeUrlCompendium
+from sensortags.sensordata import QpeInfoData
+from sensortags.tagstream import TagStream
+
+
+class QpeError(Exception):
+    """QPE answered, but with a response code other than 0 (Ok)"""
+
+    def __init__(self, code: int, message: str = None):
+        super().__init__(f"QPE response code {code}: {message}")
+        self.code = code
+        self.message = message
+
+
+class QpeClient:
+    """Keep alive, timeout bound access to the endpoints of QpeUrlCompendium"""
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8080/qpe",
+        pool_size: int = 4,
+        timeout: tuple = (3.05, 10.0),
+        session: requests.Session = None,
+        metrics: Metrics = None,
+    ):
+        """
+        Args:
+            base_url (str, optional): the QPE instance. Defaults to "http://localhost:8080/qpe".
+            pool_size (int, optional): connections kept alive to QPE. Defaults to 4.
+            timeout (tuple, optional): (connect, read) timeouts in seconds. Defaults to (3.05, 10.0).
+            session (requests.Session, optional): Defaults to a new session.
+            metrics (Metrics, optional): where requests are measured. Defaults to None, not measured.
+        """
+        self.log = logging.getLogger("QpeClient")
+        self.urls = QpeUrlCompendium(base_url)
+        self.timeout = timeout
+        self.metrics = metrics
+
+        self.session = requests.Session() if session is None else session
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        """closes the pooled connections"""
+        self.session.close()
+
+    def get(self, url: str, params: dict = None) -> dict:
+        """requests a QPE endpoint
+
+        Args:
+            url (str): the endpoint, e.g. one of self.urls
+            params (dict, optional): query parameters added to the url. Defaults to None.
+
+        Raises:
+            requests.RequestException: if the request failed, timed out or got a non 2xx status
+            QpeError: if QPE responded with a code other than 0
+
+        Returns:
+            dict: the QPE response
+        """
+        start = time.perf_counter()
+        try:
+            res = self.session.get(url, params=params, timeout=self.timeout)
+            res.raise_for_status()
+            qpe_res = res.json()
+        except requests.RequestException:
+            self._measure(url, start, None)
+            raise
+        self._measure(url, start, len(res.content))
+        if qpe_res.get("code", 0) != 0:
+            raise QpeError(qpe_res["code"], qpe_res.get("message"))
+        return qpe_res
+
+    def _measure(self, url: str, start: float, size: int) -> None:
+        """observes a request that started at start, size None if it failed"""
+        if self.metrics is None:
+            return
+        endpoint = urlparse.urlparse(url).path.rsplit("/", 1)[-1]
+        if size is None:
+            self.metrics.counter("qpe_request_errors", endpoint=endpoint).inc()
+            return
+        self.metrics.histogram("qpe_request_seconds", endpoint=endpoint).observe(time.perf_counter() - start)
+        self.metrics.histogram("qpe_response_bytes", BYTES_BUCKETS, endpoint=endpoint).observe(size)
+
+    def get_pe_info(self) -> QpeInfoData:
+        """getPEInfo
+
+        Returns:
+            QpeInfoData: the positioning engine info
+        """
+        return QpeInfoData.from_any_dict(self.get(self.urls.peinfo_url)["positioningEngine"])
+
+    def get_tag_data(self, url: str = None) -> list[dict]:
+        """getTagData
+
+        Args:
+            url (str, optional): a getTagData url. Defaults to format ALL_ITEMS.
+
+        Returns:
+            list[dict]: the tags
+        """
+        return self.get(self.urls.get_tag_data_all_items if url is None else url)["tags"]
+
+    def get_gateway_data(self, stream: bool = False, url: str = None) -> list[dict]:
+        """getTagData with format ALL_ITEMS, only the tags with advertising data
+        captured by a gateway locator
+
+        Args:
+            stream (bool, optional): parse the response as it is read, keeping only the
+                keys GatewayTag needs, see iter_gateway_data. Defaults to False.
+            url (str, optional): a getTagData url, see QpeUrlCompendium.tag_data_url.
+                Defaults to format ALL_ITEMS.
+
+        Returns:
+            list[dict]: the tags with gateway data
+        """
+        if stream:
+            return list(self.iter_gateway_data(url))
+        return [tag for tag in self.get_tag_data(url) if tag.get("advertisingDataPayload") is not None]
+
+    def iter_gateway_data(self, url: str = None, chunk_size: int = 64 * 1024) -> Iterator[dict]:
+        """streams getTagData, the tags array is parsed incrementally and tags
+        without gateway data are skipped without being decoded, see sensortags.tagstream
+
+        Args:
+            url (str, optional): a getTagData url. Defaults to format ALL_ITEMS.
+            chunk_size (int, optional): bytes read at a time. Defaults to 64 * 1024.
+
+        Raises:
+            requests.RequestException: if the request failed, timed out or got a non 2xx status
+            ValueError: if the response is not JSON or ends early, e.g. on a dropped connection
+            QpeError: once the response is read, if QPE responded with a code other than 0
+
+        Yields:
+            Iterator[dict]: the tags with gateway data, with the GATEWAY_KEYS only
+        """
+        url = self.urls.get_tag_data_all_items if url is None else url
+        start = time.perf_counter()
+        try:
+            with self.session.get(url, timeout=self.timeout, stream=True) as res:
+                res.raise_for_status()
+                tags = TagStream(res.iter_content(chunk_size))
+                yield from tags
+        except (requests.RequestException, ValueError):
+            self._measure(url, start, None)
+            raise
+        self._measure(url, start, tags.bytes_read)  # the latency includes reading the whole response
+
+        if tags.response.get("code", 0) != 0:
+            raise QpeError(tags.response["code"], tags.response.get("message"))
+
+    def get_locator_info(self) -> list[dict]:
+        """getLocatorInfo
+
+        Returns:
+            list[dict]: the locators
+        """
+        return self.get(self.urls.locator_info_url)["locators"]
+
+    def configure_tag(self, tag_ids: list, config_id: str, channel: str) -> dict:
+        """configureTag, starts configuring tags with a configuration of the project
+
+        Args:
+            tag_ids (list): the tags to configure
+            config_id (str): id of the configuration in the project
+            channel (str): the tags target channel, 37 BLE or 230 QProprietary
+
+        Returns:
+            dict: the QPE response
+        """
+        params = {"tag": ",".join(tag_ids), "channel": channel, "id": config_id}
+        return self.get(self.urls.configure_tag_url, params)
+
+    def set_tag_group(self, tag_ids: list, group: str) -> dict:
+        """setTagGroup
+
+        Args:
+            tag_ids (list): the tags to add to the group
+            group (str): the target group
+
+        Returns:
+            dict: the QPE response
+        """
+        return self.get(self.urls.set_tag_group_url, {"tag": ",".join(tag_ids), "targetGroup": group})
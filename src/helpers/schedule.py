@@ -0,0 +1,150 @@
+"""Drift free poll scheduling on monotonic deadlines
+
+Sleeping poll_interval after every cycle makes the real period the interval
+plus however long the cycle took, and a cycle running longer than the interval
+goes unnoticed. A PollScheduler fires on deadlines exactly interval apart on
+time.monotonic, so the period does not drift, and counts the cycles that
+overran their interval. The deadlines a late cycle missed are handled by the
+overrun policy:
+
+- SKIP: they are skipped, the next cycle waits for the next deadline on the
+  original grid
+- COALESCE: they are merged into one cycle that runs right away, the grid
+  restarts from there
+
+With an adaptive range, adapt tightens or relaxes the interval within it, e.g.
+polling faster while most tags change between polls and slower while few do.
+
+Typical usage:
+
+    scheduler = PollScheduler(15.0, policy=SKIP)
+    for cycle in scheduler:  # waits for every deadline
+        poll()
+"""
+
+import logging
+import time
+from typing import Callable, Iterator
+
+SKIP = "skip"
+COALESCE = "coalesce"
+OVERRUN_POLICIES = (SKIP, COALESCE)
+
+
+class PollScheduler:
+    """Deadlines interval apart on a monotonic clock, with an overrun policy and an adaptive interval"""
+
+    def __init__(
+        self,
+        interval: float,
+        policy: str = SKIP,
+        min_interval: float = None,
+        max_interval: float = None,
+        target: float = None,
+        offset: float = 0.0,
+        clock: Callable = time.monotonic,
+    ):
+        """
+        Args:
+            interval (float): seconds between deadlines, the start value when adaptive
+            policy (str, optional): SKIP or COALESCE the deadlines a late cycle missed. Defaults to SKIP.
+            min_interval (float, optional): the shortest adaptive interval. Defaults to None, interval.
+            max_interval (float, optional): the longest adaptive interval. Defaults to None, interval.
+            target (float, optional): what adapt aims for, e.g. 0.5 for half the tags changed
+                per cycle. Defaults to None, not adaptive.
+            offset (float, optional): seconds until the first deadline. Defaults to 0.0, right away.
+            clock (Callable, optional): Defaults to time.monotonic.
+        """
+        if policy not in OVERRUN_POLICIES:
+            raise ValueError(f"Unknown overrun policy {policy!r}, expected one of {OVERRUN_POLICIES}")
+        self.log = logging.getLogger("PollScheduler")
+        self.policy = policy
+        self.min_interval = interval if min_interval is None else min_interval
+        self.max_interval = interval if max_interval is None else max_interval
+        self.interval = min(self.max_interval, max(self.min_interval, interval))
+        self.target = target
+        self.offset = offset
+        self.clock = clock
+
+        self.deadline = None  # of the current cycle
+        self.cycles = 0  # cycles started
+        self.overruns = 0  # cycles that ran past the next deadline
+        self.skipped = 0  # deadlines skipped or coalesced after overruns
+        self.max_lateness = 0.0  # seconds the worst overrun ran past the next deadline
+
+    @property
+    def adaptive(self) -> bool:
+        return self.target is not None
+
+    def next_delay(self) -> float:
+        """ends the current cycle and starts the next one
+
+        Returns:
+            float: seconds until the next cycle is due, 0.0 if it is due already
+        """
+        now = self.clock()
+        self.cycles += 1
+        if self.deadline is None:
+            self.deadline = now + self.offset
+            return self.offset
+
+        deadline = self.deadline + self.interval
+        if now > deadline:  # the cycle ran past the next deadline
+            lateness = now - deadline
+            missed = int(lateness // self.interval) + 1
+            self.overruns += 1
+            self.max_lateness = max(self.max_lateness, lateness)
+            if self.policy == SKIP:
+                deadline += missed * self.interval
+                self.skipped += missed
+            else:
+                deadline = now
+                self.skipped += missed - 1
+            self.log.warning(
+                f"Cycle {self.cycles - 1} overran the {self.interval:.3g} s interval by {lateness:.3f} s,"
+                f" {self.policy} {missed} deadline(s)"
+            )
+
+        self.deadline = deadline
+        return max(0.0, deadline - now)
+
+    def wait(self) -> None:
+        """sleeps until the next cycle is due"""
+        time.sleep(self.next_delay())
+
+    def __iter__(self) -> Iterator[int]:
+        while True:
+            self.wait()
+            yield self.cycles
+
+    def adapt(self, observed: float) -> float:
+        """scales the interval by target / observed, at most halving or doubling it
+        per call and within the adaptive range. The unit of observed is up to the
+        caller, e.g. the fraction of tags that changed since the last poll, or the
+        QPE packetsPerSecond times the interval for packets per cycle.
+
+        Args:
+            observed (float): what the last cycle saw, in the unit of target
+
+        Returns:
+            float: the new interval, unchanged if not adaptive
+        """
+        if not self.adaptive:
+            return self.interval
+        factor = 2.0 if observed <= 0 else min(2.0, max(0.5, self.target / observed))
+        self.interval = min(self.max_interval, max(self.min_interval, self.interval * factor))
+        return self.interval
+
+    def report(self) -> dict:
+        """the schedule and its overruns so far
+
+        Returns:
+            dict: interval, cycles, overruns, skipped and max_lateness, in seconds
+        """
+        return {
+            "interval": self.interval,
+            "cycles": self.cycles,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "max_lateness": self.max_lateness,
+        }
@@ -0,0 +1,357 @@
+"""A local stand-in for QPE, for load tests without a live positioning engine
+
+A QpeSimulator serves the endpoints of QpeUrlCompendium the scripts use for a
+site of simulated tags: getTagData in every built in format, getPEInfo,
+getLocatorInfo, configureTag, setTagGroup and setQPEMode. Every tag advertises
+on its own interval, and the frames of the tags with gateway data evolve over
+time (see sensortags.synthetic.evolve_frame), so change detection and decoding
+see realistic data. Tags being configured go through the configStatus steps
+of a real configuration, ending in done or, at config_failure_rate, failed.
+
+For failure testing, every response can be delayed by latency plus up to
+jitter seconds, QPE can be put out of track mode, which getTagData answers
+with code 11, and any endpoint can be made to answer with a given code.
+
+Typical usage:
+
+    with QpeSimulator(("127.0.0.1", 0), tags=5_000) as qpe:
+        client = QpeClient(qpe.url)
+        qpe.mode = "stop"  # getTagData answers code 11 from now on
+"""
+
+import json
+import logging
+import random
+import threading
+import time
+import urllib.parse as urlparse
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sensortags.registry import get_registry
+from sensortags.synthetic import SAMPLE_FRAMES, UNPARSEABLE_FRAMES, all_items_tag, evolve_frame, qpe_payload
+
+OK = 0
+ERROR = 1  # any other failure, the simulator does not model every QPE code
+NOT_IN_TRACK_MODE = 11
+
+TRACK_MODE = "track"
+MODES = (TRACK_MODE, "stop", "deployment")
+
+# the steps a configureTag goes through, one config_step apart, before done or failed
+CONFIG_STEPS = ("waitingToCommand1of3", "commanding1of3", "commanding2of3", "commanding3of3")
+
+_LOCATION_KEYS = (
+    "tagId",
+    "tagName",
+    "color",
+    "location",
+    "locationTS",
+    "locationRadius",
+    "locationCoordSysId",
+    "locationZones",
+    "locationMovementStatus",
+)
+_INFO_KEYS = (
+    "tagId",
+    "tagName",
+    "tagGroupName",
+    "color",
+    "battery",
+    "button1State",
+    "lastPacketTS",
+    "configStatus",
+    "rssiLocator",
+    "rssi",
+)
+# getTagData format -> the keys of every tag, None for all of them
+TAG_DATA_FORMATS = {
+    "defaultLocation": _LOCATION_KEYS,
+    "defaultInfo": _INFO_KEYS,
+    "defaultLocationAndInfo": tuple(dict.fromkeys(_LOCATION_KEYS + _INFO_KEYS)),
+    "ALL_ITEMS": None,
+}
+
+
+class SimulatedTag:
+    """A tag of the simulated site and the state that evolves over time"""
+
+    __slots__ = ("data", "layout", "first_frame", "frame", "interval", "next_packet", "config")
+
+    def __init__(self, data: dict, frame: bytes, interval: float, next_packet: float):
+        self.data = data  # in ALL_ITEMS format, kept up to date
+        self.layout = None  # of the frame's packet type, None for frames no parser accepts
+        self.first_frame = frame
+        self.frame = frame  # None for tags without gateway data
+        self.interval = interval  # seconds between packets
+        self.next_packet = next_packet  # time.time()
+        self.config: deque = deque()  # (time.time(), configStatus) steps still to come
+
+
+class QpeSimulator(ThreadingHTTPServer):
+    """Serves the QPE API for a site of simulated tags"""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple = ("127.0.0.1", 8080),
+        tags: int = 1_000,
+        gateway_ratio: float = 0.5,
+        unparseable_ratio: float = 0.05,
+        locators: int = 16,
+        advertising_interval: tuple = (1.0, 10.0),
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        config_step: float = 1.0,
+        config_failure_rate: float = 0.1,
+        configurations: tuple = ("ASSET_TAG",),
+        project_name: str = "simulated",
+        seed: int = 0,
+    ):
+        """
+        Args:
+            address (tuple, optional): (host, port) to serve on, port 0 picks a free one.
+                Defaults to ("127.0.0.1", 8080).
+            tags (int, optional): tags of the site. Defaults to 1_000.
+            gateway_ratio (float, optional): of the tags with advertising data. Defaults to 0.5.
+            unparseable_ratio (float, optional): of the frames no parser accepts. Defaults to 0.05.
+            locators (int, optional): locators of the site. Defaults to 16.
+            advertising_interval (tuple, optional): (min, max) seconds between the packets
+                of a tag, each tag gets its own. Defaults to (1.0, 10.0).
+            latency (float, optional): seconds every response is delayed by. Defaults to 0.0.
+            jitter (float, optional): up to this many seconds more, at random. Defaults to 0.0.
+            config_step (float, optional): seconds per configStatus step. Defaults to 1.0.
+            config_failure_rate (float, optional): of the configurations that fail. Defaults to 0.1.
+            configurations (tuple, optional): configuration ids of the project. Defaults to ("ASSET_TAG",).
+            project_name (str, optional): Defaults to "simulated".
+            seed (int, optional): the same seed simulates the same site. Defaults to 0.
+        """
+        super().__init__(address, SimulatorHandler)
+        self.log = logging.getLogger("QpeSimulator")
+        self.latency = latency
+        self.jitter = jitter
+        self.config_step = config_step
+        self.config_failure_rate = config_failure_rate
+        self.configurations = configurations
+        self.project_name = project_name
+        self.locators = locators
+
+        self.mode = TRACK_MODE  # getTagData answers NOT_IN_TRACK_MODE in any other mode
+        self.errors: dict[str, int] = {}  # endpoint -> code it answers with instead
+        self.requests: dict[str, int] = {}  # endpoint -> requests served
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()  # guards the tags, requests are served concurrently
+        self._started = time.time()
+        self._thread = None
+
+        registry = get_registry()
+        frames = list(SAMPLE_FRAMES.items())
+        self.tags: dict[str, SimulatedTag] = {}
+        for index in range(tags):
+            (packet_type, frame) = (None, None)
+            if self._rng.random() < gateway_ratio:
+                if self._rng.random() < unparseable_ratio:
+                    frame = self._rng.choice(UNPARSEABLE_FRAMES)
+                else:
+                    (packet_type, frame) = self._rng.choice(frames)
+
+            interval = self._rng.uniform(*advertising_interval)
+            timestamp = self._started - self._rng.uniform(0.0, interval)
+            data = all_items_tag(index, frame, int(timestamp * 1000), self._rng.randrange(locators))
+            data["configStatus"] = "notStarted"
+            tag = SimulatedTag(data, bytes.fromhex(frame) if frame else None, interval, timestamp + interval)
+            if packet_type is not None:
+                tag.layout = registry.get(packet_type).layout
+            self.tags[data["tagId"]] = tag
+
+        self.packets_per_second = sum(1.0 / tag.interval for tag in self.tags.values())
+
+    @property
+    def url(self) -> str:
+        """the base url of the simulated QPE, see QpeUrlCompendium"""
+        (host, port) = self.server_address[:2]
+        return f"http://{host}:{port}/qpe"
+
+    def start(self) -> None:
+        """serves on a background thread, returns right away"""
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.05,), name="QpeSimulator", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        """stops serving"""
+        if self._thread is not None:
+            self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def handle_error(self, request, client_address):
+        pass  # e.g. a client that timed out and hung up
+
+    def respond(self, endpoint: str, params: dict) -> dict:
+        """the response of an endpoint
+
+        Args:
+            endpoint (str): e.g. "getTagData"
+            params (dict): the query parameters, name -> value
+
+        Returns:
+            dict: the QPE response, None for an unknown endpoint
+        """
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        handler = getattr(self, f"_{endpoint}", None)
+        if handler is None:
+            return None
+        if (code := self.errors.get(endpoint)) is not None:
+            return {"code": code, "command": endpoint, "message": f"Simulated error {code}"}
+
+        with self._lock:
+            self._advance(time.time())
+            response = handler(params)
+        return {"code": OK, "command": endpoint, **response}
+
+    def _advance(self, now: float) -> None:
+        """lets every tag send the packets due until now"""
+        ms = int(now * 1000)
+        rng = self._rng
+        for tag in self.tags.values():
+            while tag.config and tag.config[0][0] <= now:
+                tag.data["configStatus"] = tag.config.popleft()[1]
+            if tag.next_packet > now:
+                continue
+
+            timestamp = int(tag.next_packet * 1000)
+            missed = int((now - tag.next_packet) // tag.interval)
+            tag.next_packet += (missed + 1) * tag.interval
+            data = tag.data
+            data["locationTS"] = data["lastPacketTS"] = timestamp
+            if tag.frame is None:
+                continue
+
+            if tag.layout is not None:
+                tag.frame = evolve_frame(tag.frame, tag.first_frame, tag.layout, rng)
+            locator = f"0011223344{rng.randrange(self.locators):02x}"
+            data["advertisingDataPayload"] = qpe_payload(tag.frame.hex())
+            data["advertisingDataPayloadTS"] = min(timestamp, ms)
+            data["advertisingDataPayloadSignalStrength"] = float(rng.randint(-90, -50))
+            data["advertisingDataPayloadLocatorId"] = data["rssiLocator"] = locator
+            data["advertisingDataPayloadLocatorName"] = f"locator {int(locator[-2:], 16)}"
+
+    def _selected_tags(self, params: dict) -> list[SimulatedTag]:
+        tags = self.tags.values()
+        if ids := params.get("tag"):
+            tags = [self.tags[tag_id] for tag_id in ids.split(",") if tag_id in self.tags]
+        if groups := params.get("tagGroup"):
+            groups = set(groups.split(","))
+            tags = [tag for tag in tags if tag.data["tagGroupName"] in groups]
+        if max_age := params.get("maxAge"):
+            oldest = int(time.time() * 1000) - int(max_age)
+            tags = [tag for tag in tags if tag.data["lastPacketTS"] >= oldest]
+        return list(tags)
+
+    def _getTagData(self, params: dict) -> dict:
+        if self.mode != TRACK_MODE:
+            return {"code": NOT_IN_TRACK_MODE, "message": "QPE is not in track mode"}
+        tag_format = params.get("format", "defaultInfo")
+        if tag_format not in TAG_DATA_FORMATS:
+            return {"code": ERROR, "message": f"Unknown format {tag_format}"}
+
+        keys = TAG_DATA_FORMATS[tag_format]
+        tags = self._selected_tags(params)
+        if keys is None:
+            return {"responseTS": int(time.time() * 1000), "tags": [dict(tag.data) for tag in tags]}
+        return {"responseTS": int(time.time() * 1000), "tags": [{key: tag.data[key] for key in keys} for tag in tags]}
+
+    def _getPEInfo(self, params: dict) -> dict:
+        tracking = self.mode == TRACK_MODE
+        packets_per_second = self.packets_per_second if tracking else 0.0
+        return {
+            "positioningEngine": {
+                "cpuLoad": round(5.0 + packets_per_second / 100.0 + self._rng.uniform(0.0, 5.0), 1),
+                "issues": [],
+                "memoryAllocated": 2_048_000.0,
+                "memoryFree": 1_024_000.0,
+                "memoryMax": 4_096_000.0,
+                "memoryUsed": 1_024_000.0 + len(self.tags) * 2.0,
+                "packetsPerSecond": round(packets_per_second, 1),
+                "projectName": self.project_name,
+                "running": tracking,
+                "udpRx": round(packets_per_second * 1.1, 1),
+                "udpTx": round(packets_per_second * 0.1, 1),
+                "networkLossRate": 0.0,
+                "qpeLossRate": 0.0,
+                "mode": self.mode,
+                "uptime": int((time.time() - self._started) * 1000),
+            }
+        }
+
+    def _getLocatorInfo(self, params: dict) -> dict:
+        return {
+            "locators": [
+                {
+                    "id": f"0011223344{index:02x}",
+                    "name": f"locator {index}",
+                    "connection": "ok",
+                    "mode": "online",
+                    "location": [index * 2.0, 0.0, 3.0],
+                }
+                for index in range(self.locators)
+            ]
+        }
+
+    def _configureTag(self, params: dict) -> dict:
+        if params.get("id") not in self.configurations:
+            return {"code": ERROR, "message": f"Unknown configuration {params.get('id')}"}
+
+        now = time.time()
+        tags = self._selected_tags({"tag": params.get("tag", "")})
+        for tag in tags:
+            outcome = "failed" if self._rng.random() < self.config_failure_rate else "done"
+            steps = (*CONFIG_STEPS, outcome)
+            tag.data["configStatus"] = steps[0]
+            tag.config = deque((now + step * self.config_step, status) for (step, status) in enumerate(steps))
+        return {"message": f"Configuring {len(tags)} tags with {params['id']}"}
+
+    def _setTagGroup(self, params: dict) -> dict:
+        tags = self._selected_tags({"tag": params.get("tag", "")})
+        for tag in tags:
+            tag.data["tagGroupName"] = params.get("targetGroup")
+        return {"message": f"Added {len(tags)} tags to {params.get('targetGroup')}"}
+
+    def _setQPEMode(self, params: dict) -> dict:
+        if params.get("mode") not in MODES:
+            return {"code": ERROR, "message": f"Unknown mode {params.get('mode')}"}
+        self.mode = params["mode"]
+        return {"message": f"QPE mode set to {self.mode}"}
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep alive
+    disable_nagle_algorithm = True  # headers and body are separate writes
+
+    def do_GET(self):
+        server: QpeSimulator = self.server
+        url = urlparse.urlparse(self.path)
+        endpoint = url.path.rstrip("/").rsplit("/", 1)[-1]
+        params = dict(urlparse.parse_qsl(url.query))
+
+        if server.latency or server.jitter:
+            time.sleep(server.latency + random.uniform(0.0, server.jitter))
+        response = server.respond(endpoint, params)
+
+        body = json.dumps(response if response is not None else {"message": "Not found"}).encode()
+        self.send_response(200 if response is not None else 404)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
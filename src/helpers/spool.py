@@ -0,0 +1,221 @@
+"""An on-disk write-ahead spool for batches influx DB could not take
+
+While influx DB is unreachable, batches of line protocol are appended to the
+current segment file of the spool, sequentially and without parsing anything.
+Segments are rotated at segment_bytes. Once the spool holds more than
+max_bytes, the oldest segments are deleted and their points counted as evicted.
+Segments left over by a previous run are picked up, so nothing spooled is lost
+on a restart.
+
+Each record is a little endian (data length, lines) header followed by the data.
+A record cut short, e.g. by a crash, ends its segment. How far the oldest segment
+has been replayed is kept in a small offset file next to the segments, so records
+replayed already are not posted again after a restart.
+
+Batches can be appended from any thread, peek and consume are meant for the one
+thread that replays the spool. If an append evicts the segment a peek read from
+before the batches are consumed, consume leaves the spool alone, the evicted
+points are counted and the next peek starts at the new oldest segment.
+
+Typical usage, see helpers.influx.InfluxWriter:
+
+    spool = Spool(pathlib.Path("spool"))
+    spool.append(batch, lines)  # the sink is down
+    ...
+    (data, lines, size) = spool.peek(max_lines=5_000)  # the sink is up again
+    if post(data):
+        spool.consume(size, lines)
+"""
+
+import json
+import logging
+import os
+import pathlib
+import struct
+import threading
+
+RECORD_HEADER = struct.Struct("<II")  # data length, lines
+SEGMENT_SUFFIX = ".spool"
+READ_OFFSET_FILE = "read_offset.json"  # replay position in the oldest segment
+
+
+class Spool:
+    """Append-only, segment rotated spool of line protocol batches"""
+
+    def __init__(self, directory: pathlib.Path, segment_bytes: int = 8 << 20, max_bytes: int = 512 << 20):
+        """
+        Args:
+            directory (pathlib.Path): where the segment files are kept, created if needed
+            segment_bytes (int, optional): size at which a segment is rotated. Defaults to 8 MiB.
+            max_bytes (int, optional): disk cap, oldest segments are evicted past it. Defaults to 512 MiB.
+        """
+        self.log = logging.getLogger("Spool")
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+
+        self.evicted_points = 0
+        self._lock = threading.Lock()
+        # oldest first, [path, bytes, lines] of every segment
+        self._segments = []
+        for path in sorted(self.directory.glob(f"*{SEGMENT_SUFFIX}")):
+            if (segment := self._scan(path))[2]:
+                self._segments.append(segment)
+            else:  # nothing complete in it
+                path.unlink()
+        self._read_offset = 0  # bytes of the oldest segment replayed already
+        self._read_lines = 0  # lines of the oldest segment replayed already
+        self._load_read_offset()
+        self._peeked = None  # (segment, read offset) of the last peek, checked by consume
+        self._file = None  # the newest segment, open for appending
+
+    @staticmethod
+    def _scan(path: pathlib.Path) -> list:
+        """counts the complete records of a segment left over from a previous run"""
+        data = path.read_bytes()
+        (offset, lines) = (0, 0)
+        while offset + RECORD_HEADER.size <= len(data):
+            (length, count) = RECORD_HEADER.unpack_from(data, offset)
+            if offset + RECORD_HEADER.size + length > len(data):
+                break
+            offset += RECORD_HEADER.size + length
+            lines += count
+        return [path, offset, lines]
+
+    def _load_read_offset(self) -> None:
+        """resumes the replay where the previous run left the oldest segment"""
+        try:
+            with open(self.directory / READ_OFFSET_FILE) as offset_file:
+                position = json.load(offset_file)
+        except (FileNotFoundError, ValueError):
+            return
+        if self._segments and self._segments[0][0].name == position["segment"]:
+            if position["offset"] <= self._segments[0][1]:
+                self._read_offset = position["offset"]
+                self._read_lines = position["lines"]
+
+    def _save_read_offset(self) -> None:
+        """writes the replay position of the oldest segment, the caller holds the lock"""
+        path = self.directory / READ_OFFSET_FILE
+        if not self._read_offset:
+            path.unlink(missing_ok=True)
+            return
+        position = {"segment": self._segments[0][0].name, "offset": self._read_offset, "lines": self._read_lines}
+        with open(path.with_suffix(".tmp"), "w") as offset_file:
+            json.dump(position, offset_file)
+        os.replace(path.with_suffix(".tmp"), path)  # never half written
+
+    @property
+    def pending_bytes(self) -> int:
+        return sum(size for (_, size, _) in self._segments) - self._read_offset
+
+    @property
+    def pending_points(self) -> int:
+        return sum(lines for (_, _, lines) in self._segments) - self._read_lines
+
+    def __bool__(self) -> bool:
+        return self.pending_points > 0
+
+    def append(self, data: bytes, lines: int) -> None:
+        """appends a batch to the newest segment
+
+        Args:
+            data (bytes): line protocol
+            lines (int): points in the data
+        """
+        with self._lock:
+            if self._file is None or self._segments[-1][1] >= self.segment_bytes:
+                self._rotate()
+
+            self._file.write(RECORD_HEADER.pack(len(data), lines))
+            self._file.write(data)
+            self._file.flush()  # one write to the OS per batch, readable by peek
+            segment = self._segments[-1]
+            segment[1] += RECORD_HEADER.size + len(data)
+            segment[2] += lines
+
+            self._evict()
+
+    def _rotate(self) -> None:
+        """starts a new segment, the caller holds the lock"""
+        if self._file is not None:
+            self._file.close()
+        number = int(self._segments[-1][0].stem) + 1 if self._segments else 0
+        path = self.directory / f"{number:012d}{SEGMENT_SUFFIX}"
+        self._file = open(path, "ab")
+        self._segments.append([path, 0, 0])
+
+    def _evict(self) -> None:
+        """deletes the oldest segments while over max_bytes, the caller holds the lock"""
+        while len(self._segments) > 1 and sum(size for (_, size, _) in self._segments) > self.max_bytes:
+            (path, _, lines) = self._segments.pop(0)
+            evicted = lines - self._read_lines
+            self.evicted_points += evicted
+            self._read_offset = self._read_lines = 0
+            self._save_read_offset()
+            path.unlink(missing_ok=True)
+            self.log.warning(f"Spool is over {self.max_bytes} bytes, evicted {evicted} points")
+
+    def peek(self, max_lines: int) -> tuple:
+        """reads the oldest spooled batches, without removing them
+
+        Args:
+            max_lines (int): stop after this many points, at least one batch is read
+
+        Returns:
+            tuple[bytes, int, int]: the line protocol, its points and the bytes
+                of spool it took, pass the last two to consume once posted
+        """
+        with self._lock:
+            if not self._segments:
+                return (b"", 0, 0)
+
+            (path, size, _) = self._segments[0]
+            self._peeked = (path, self._read_offset)
+            (chunks, offset, lines) = ([], self._read_offset, 0)
+            with open(path, "rb") as segment:  # buffered, records are read sequentially
+                segment.seek(offset)
+                while offset < size and (not lines or lines < max_lines):
+                    (length, count) = RECORD_HEADER.unpack(segment.read(RECORD_HEADER.size))
+                    chunks.append(segment.read(length))
+                    offset += RECORD_HEADER.size + length
+                    lines += count
+            offset -= self._read_offset
+
+        return (b"".join(chunks), lines, offset)
+
+    def consume(self, size: int, lines: int) -> None:
+        """removes batches returned by the last peek, deleting segments replayed in full
+
+        Args:
+            size (int): the bytes of spool returned by peek
+            lines (int): the points returned by peek
+        """
+        with self._lock:
+            if not self._segments or (self._segments[0][0], self._read_offset) != self._peeked:
+                self.log.warning(f"The {lines} points peeked were evicted before they were consumed")
+                return
+            self._peeked = None
+            self._read_offset += size
+            self._read_lines += lines
+
+            (path, segment_size, _) = self._segments[0]
+            if self._read_offset < segment_size:
+                self._save_read_offset()
+                return
+
+            if len(self._segments) == 1 and self._file is not None:  # the one being appended to
+                self._file.close()
+                self._file = None
+            self._segments.pop(0)
+            self._read_offset = self._read_lines = 0
+            self._save_read_offset()
+            path.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        """closes the newest segment, pending batches stay on disk for the next run"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -7,6 +7,12 @@ import logging
 import os
 import pathlib
 import time
+from typing import TYPE_CHECKING
+
+from helpers.schedule import OVERRUN_POLICIES, SKIP, PollScheduler
+
+if TYPE_CHECKING:  # cProfile, pstats and tracemalloc are only imported with --profile
+    from helpers.profiling import CycleProfiler
 
 
 def add_qpe_base_url_arg(parser) -> None:
@@ -18,6 +24,15 @@ def add_qpe_base_url_arg(parser) -> None:
     )
 
 
+def add_qpe_base_urls_arg(parser) -> None:
+    parser.add_argument(
+        "--qpe_addr",
+        action="append",
+        default=None,
+        help="what url to poll QPE data from, repeat for every QPE of the fleet",
+    )
+
+
 def add_poll_interval_arg(parser):
     parser.add_argument(
         "--poll_interval",
@@ -37,6 +52,144 @@ def add_id_arg(parser) -> None:
     )
 
 
+def add_parser_cache_arg(parser) -> None:
+    parser.add_argument(
+        "--parser_cache",
+        action="store",
+        default=None,
+        type=pathlib.Path,
+        help="json file to persist the tag id to parser cache in, so restarts start warm",
+    )
+
+
+def add_spool_arg(parser) -> None:
+    parser.add_argument(
+        "--spool",
+        action="store",
+        default=None,
+        type=pathlib.Path,
+        help="directory to spool points in while influx DB is unreachable, replayed once it is back",
+    )
+
+
+def add_udp_args(parser) -> None:
+    parser.add_argument(
+        "--udp_port",
+        action="store",
+        default=None,
+        type=int,
+        help="receive the tag data QPE pushes over UDP on this port instead of polling getTagData",
+    )
+    parser.add_argument(
+        "--udp_receive_buffer",
+        action="store",
+        default=4 << 20,
+        type=int,
+        help="UDP socket receive buffer in bytes, capped by the OS (net.core.rmem_max on Linux)",
+    )
+
+
+def add_pipeline_args(parser) -> None:
+    parser.add_argument(
+        "--decode_processes",
+        action="store",
+        default=0,
+        type=int,
+        help="processes to decode tags on, 0 decodes on a thread of the main process",
+    )
+    parser.add_argument(
+        "--chunk_size",
+        action="store",
+        default=2_000,
+        type=int,
+        help="tags per batch handed from stage to stage",
+    )
+
+
+def add_schedule_args(parser) -> None:
+    parser.add_argument(
+        "--overrun_policy",
+        action="store",
+        default=SKIP,
+        choices=OVERRUN_POLICIES,
+        help="what to do with the polls missed by a poll that took longer than the interval",
+    )
+    parser.add_argument(
+        "--adaptive_interval",
+        action="store",
+        default=None,
+        nargs=2,
+        type=float,
+        metavar=("MIN", "MAX"),
+        help="adapt the poll interval within MIN and MAX seconds to how much the data changes",
+    )
+
+
+def add_metrics_args(parser) -> None:
+    parser.add_argument(
+        "--metrics_port",
+        action="store",
+        default=None,
+        type=int,
+        help="serve the self metrics on this local port, /metrics for Prometheus and /metrics.json",
+    )
+    parser.add_argument(
+        "--metrics_influx",
+        action="store_true",
+        help="also write the self metrics to influx DB as the monitor_self measurement",
+    )
+
+
+def poll_scheduler(args, target: float = None) -> PollScheduler:
+    """the scheduler for the --poll_interval, --overrun_policy and --adaptive_interval args
+
+    Args:
+        args (argparse.Namespace): the parsed args
+        target (float, optional): see PollScheduler.adapt, used with --adaptive_interval. Defaults to None.
+
+    Returns:
+        PollScheduler: the scheduler
+    """
+    if args.adaptive_interval is None:
+        return PollScheduler(args.poll_interval, args.overrun_policy)
+    (min_interval, max_interval) = args.adaptive_interval
+    return PollScheduler(args.poll_interval, args.overrun_policy, min_interval, max_interval, target)
+
+
+def add_profile_args(parser) -> None:
+    parser.add_argument(
+        "--profile",
+        action="store",
+        default=None,
+        type=int,
+        metavar="N",
+        help="profile every Nth poll cycle, reports rotate into logs/profile-*.txt",
+    )
+    parser.add_argument(
+        "--profile_frames",
+        action="store",
+        default=1,
+        type=int,
+        help="stack frames tracemalloc keeps per allocation with --profile, 0 does not trace memory",
+    )
+
+
+def cycle_profiler(args) -> "CycleProfiler":
+    """the profiler for the --profile and --profile_frames args
+
+    Args:
+        args (argparse.Namespace): the parsed args
+
+    Returns:
+        CycleProfiler: the profiler, None without --profile
+    """
+    if args.profile is None:
+        return None
+    from helpers.profiling import CycleProfiler
+
+    return CycleProfiler(every=args.profile, frames=args.profile_frames)
+
+
 def configure_logging():
     """this function provides a basic logging module initialization"""
 
@@ -1,3 +1,10 @@
+"""Conversions of sensor values
+
+The functions taking ints are written without branches on the value so they
+also work element wise on numpy integer arrays, e.g. for batch decoding.
+"""
+
+
 def float_from_8_8(hex_bytes: str) -> float:
     """converts 2 hex bytes in 8.8 notation to a float
 
@@ -26,14 +33,27 @@ def ruuvi_hex_to_signed_float(msb: str, lsb: str, bits=8) -> float:
     Returns:
         float: the float value
     """
-    msb_int = int(msb, 16)
-    lsb_int = float(int(lsb, 16) / 100.0)
+    return ruuvi_sign_magnitude_to_float(int(msb, 16), int(lsb, 16), bits)
+
+
+def ruuvi_sign_magnitude_to_float(integer, fraction, bits=8):
+    """Converts ruuvi's sign and magnitude integer byte plus a fraction byte in 1/100ths to a float, array-aware
 
-    if msb_int & (1 << (bits - 1)):
-        msb_int &= ~(1 << (bits - 1))
-        return -(float(msb_int) + lsb_int)
+    0x81 0x45 -> ruuvi_sign_magnitude_to_float(129, 69) -> return -1.69
+
+    Args:
+        integer (int): the integer byte, the highest bit is the sign
+        fraction (int): the fraction byte
+        bits (int, optional): how many bits are in use. Defaults to 8.
+
+    Returns:
+        float: the float value
+    """
+    sign_bit = 1 << (bits - 1)
+    magnitude = (integer & (sign_bit - 1)) + fraction / 100.0
+    negative = (integer & sign_bit) >> (bits - 1)  # 1 if negative, 0 otherwise
 
-    return float(msb_int) + lsb_int
+    return magnitude * (1 - 2 * negative)
 
 
 def hex_string_to_2s_comp_signed_int(hexstr: str, bits: int) -> int:
@@ -46,7 +66,17 @@ def hex_string_to_2s_comp_signed_int(hexstr: str, bits: int) -> int:
     Returns:
         int: the int value
     """
-    value = int(hexstr, 16)
-    if value & (1 << (bits - 1)):
-        value -= 1 << bits
-    return value
+    return twos_complement(int(hexstr, 16), bits)
+
+
+def twos_complement(value, bits: int):
+    """interprets an unsigned int as a signed int using 2's complement, array-aware
+
+    Args:
+        value (int): the unsigned value, or an array of them
+        bits (int): number of bits in use
+
+    Returns:
+        int: the signed value
+    """
+    return value - ((value & (1 << (bits - 1))) << 1)
@@ -0,0 +1,118 @@
+"""Push based ingestion of tag data sent by QPE over UDP
+
+Instead of polling getTagData, QPE can be configured to push tag data as
+JSON over UDP as soon as it has it. A UdpTagListener receives those datagrams
+and hands them out in batches, ready for the same decode and write steps as
+polled tags. The socket receive buffer is configurable so bursts are not lost
+while a batch is processed, and datagrams dropped anyway are counted: by the
+kernel for a full buffer (read with SO_RXQ_OVFL on Linux), and by the
+listener for datagrams that were cut short or are not JSON.
+
+A datagram can hold one tag, a list of tags or a getTagData like {"tags": [...]}.
+
+Typical usage:
+
+    listener = UdpTagListener(port=9000, receive_buffer=4 << 20)
+    while True:
+        for tag in listener.receive_batch(timeout=1.0):
+            reading = SensorReading.from_any_dict(tag)
+"""
+
+import json
+import logging
+import select
+import socket
+import struct
+import sys
+import time
+
+# not exposed by the socket module, the value is the same on every Linux architecture
+SO_RXQ_OVFL = getattr(socket, "SO_RXQ_OVFL", 40 if sys.platform.startswith("linux") else None)
+MAX_DATAGRAM = 65_535
+
+
+class UdpTagListener:
+    """Receives tag data pushed by QPE and batches it"""
+
+    def __init__(self, port: int, host: str = "0.0.0.0", receive_buffer: int = None):
+        """
+        Args:
+            port (int): the port QPE pushes to, 0 picks a free one
+            host (str, optional): the address to listen on. Defaults to "0.0.0.0", all.
+            receive_buffer (int, optional): SO_RCVBUF in bytes, capped by the OS
+                (net.core.rmem_max on Linux). Defaults to None, the OS default.
+        """
+        self.log = logging.getLogger("UdpTagListener")
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if receive_buffer:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+        if SO_RXQ_OVFL is not None:
+            self.socket.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+        self.socket.bind((host, port))
+        self.socket.setblocking(False)
+
+        self.address = self.socket.getsockname()
+        self.receive_buffer = self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+
+        self.datagrams = 0  # received
+        self.kernel_dropped = 0  # dropped by the OS, the receive buffer was full
+        self.invalid = 0  # cut short or not JSON, or incomplete tags the caller counts
+
+    @property
+    def dropped(self) -> int:
+        """datagrams lost, either by the OS or as invalid"""
+        return self.kernel_dropped + self.invalid
+
+    def close(self) -> None:
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def receive_batch(self, max_datagrams: int = 10_000, timeout: float = 1.0) -> list[dict]:
+        """waits up to timeout for data, then takes every datagram already received
+
+        Args:
+            max_datagrams (int, optional): datagrams per batch at most. Defaults to 10_000.
+            timeout (float, optional): seconds to wait for the first datagram. Defaults to 1.0.
+
+        Returns:
+            list[dict]: the tags received, empty after a timeout
+        """
+        tags: list[dict] = []
+        deadline = time.monotonic() + timeout
+        while not tags and (remaining := deadline - time.monotonic()) > 0:
+            if not select.select([self.socket], [], [], remaining)[0]:
+                break
+            for _ in range(max_datagrams):
+                try:
+                    (data, ancdata, flags, _) = self.socket.recvmsg(MAX_DATAGRAM, socket.CMSG_SPACE(4))
+                except BlockingIOError:
+                    break
+                self.datagrams += 1
+                for (level, kind, value) in ancdata:
+                    if level == socket.SOL_SOCKET and kind == SO_RXQ_OVFL:
+                        self.kernel_dropped = struct.unpack("I", value[:4])[0]  # cumulative
+                if flags & socket.MSG_TRUNC:
+                    self.invalid += 1
+                    continue
+                self._add_tags(data, tags)
+        return tags
+
+    def _add_tags(self, data: bytes, tags: list) -> None:
+        try:
+            message = json.loads(data)
+        except ValueError:
+            self.invalid += 1
+            self.log.debug(f"Not a JSON datagram: {data[:100]}")
+            return
+
+        if isinstance(message, dict):
+            message = message.get("tags", [message])
+        if isinstance(message, list):
+            tags.extend(tag for tag in message if isinstance(tag, dict))
+        else:
+            self.invalid += 1
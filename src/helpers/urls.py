@@ -31,6 +31,43 @@ class QpeUrlCompendium:
         self.get_tag_data_all_items = "/".join(
             [self.base_url, "getTagData?mode=json&format=ALL_ITEMS"]
         )
+        self.get_tag_data_url = "/".join([self.base_url, "getTagData"])
+        self.configure_tag_url = "/".join([self.base_url, "configureTag"])
+        self.set_tag_group_url = "/".join([self.base_url, "setTagGroup"])
+
+    def tag_data_url(
+        self,
+        format: str = "defaultInfo",
+        tags: list = None,
+        groups: list = None,
+        max_age: float = None,
+        **query_params,
+    ) -> str:
+        """builds a getTagData url that asks QPE for only what is needed, smaller
+        responses are also less serialization work for QPE
+
+        Args:
+            format (str, optional): a built in output format, e.g. "ALL_ITEMS", or one
+                defined in the QPE project with just the fields needed. Defaults to "defaultInfo".
+            tags (list, optional): only these tag ids. Defaults to None, all tags.
+            groups (list, optional): only tags of these tag groups. Defaults to None, all groups.
+            max_age (float, optional): only tags heard from in the last max_age seconds.
+                Defaults to None, however long ago.
+            **query_params: any other getTagData query parameters, as is
+
+        Returns:
+            str: the getTagData url
+        """
+        params = {"mode": "json", "format": format}
+        if tags:
+            params["tag"] = ",".join(tags)
+        if groups:
+            params["tagGroup"] = ",".join(groups)
+        if max_age is not None:
+            params["maxAge"] = str(int(max_age * 1000))  # ms
+        params.update(query_params)
+
+        return self.update_url_query(self.get_tag_data_url, params)
 
     @staticmethod
     def update_url_query(url: str, query_params: dict) -> str:
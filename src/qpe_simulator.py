@@ -0,0 +1,89 @@
+#!/usr/bin/env python3.10
+# Python 3.10.0
+"""
+This script serves a simulated QPE, for load testing the monitors and the
+automatic tag configuration without a live positioning engine. See
+helpers/simulator.py for what is simulated.
+
+The general process is as follows
+
+- Setup
+    - Logging
+    - Handle CL args
+- Simulate a site of --tags tags, their frames evolving over time
+- Serve the QPE API until interrupted
+- Log the requests served every minute
+
+Typical usage:
+
+```bash
+    python src/qpe_simulator.py --port 8080 --tags 5000 --latency 0.05 --jitter 0.2
+    python src/sensor_tag_monitor.py --qpe_addr http://localhost:8080/qpe
+```
+"""
+__author__ = "Quuppa"
+
+import argparse
+import logging
+import time
+
+import helpers.startup as startup
+from helpers.simulator import MODES, TRACK_MODE, QpeSimulator
+
+if __name__ == "__main__":
+    ################# Config and Resource Init #################
+
+    parser = argparse.ArgumentParser(description="Serve a simulated QPE")
+    parser.add_argument("--host", action="store", default="127.0.0.1", help="Address to serve on")
+    parser.add_argument("--port", action="store", default=8080, type=int, help="Port to serve on")
+    parser.add_argument("--tags", action="store", default=1_000, type=int, help="Tags of the simulated site")
+    parser.add_argument(
+        "--gateway_ratio", action="store", default=0.5, type=float, help="Fraction of tags with advertising data"
+    )
+    parser.add_argument("--locators", action="store", default=16, type=int, help="Locators of the simulated site")
+    parser.add_argument(
+        "--advertising_interval",
+        action="store",
+        default=[1.0, 10.0],
+        type=float,
+        nargs=2,
+        metavar=("MIN", "MAX"),
+        help="Range of seconds between the packets of a tag",
+    )
+    parser.add_argument("--latency", action="store", default=0.0, type=float, help="Seconds every response takes")
+    parser.add_argument("--jitter", action="store", default=0.0, type=float, help="Up to this many seconds more")
+    parser.add_argument(
+        "--config_step", action="store", default=1.0, type=float, help="Seconds per tag configuration step"
+    )
+    parser.add_argument(
+        "--config_failure_rate", action="store", default=0.1, type=float, help="Fraction of configurations failing"
+    )
+    parser.add_argument("--mode", action="store", default=TRACK_MODE, choices=MODES, help="QPE mode to start in")
+    parser.add_argument("--seed", action="store", default=0, type=int, help="The same seed simulates the same site")
+    args = parser.parse_args()
+
+    startup.configure_logging()
+    log: logging.Logger = logging.getLogger("QpeSimulator")
+
+    qpe = QpeSimulator(
+        (args.host, args.port),
+        tags=args.tags,
+        gateway_ratio=args.gateway_ratio,
+        locators=args.locators,
+        advertising_interval=tuple(args.advertising_interval),
+        latency=args.latency,
+        jitter=args.jitter,
+        config_step=args.config_step,
+        config_failure_rate=args.config_failure_rate,
+        seed=args.seed,
+    )
+    qpe.mode = args.mode
+    log.info(f"Simulating {args.tags} tags at {qpe.url}, {qpe.packets_per_second:.0f} packets/s")
+
+    try:
+        with qpe:
+            while True:
+                time.sleep(60.0)
+                log.info(f"Requests served: {qpe.requests}")
+    except KeyboardInterrupt:
+        pass
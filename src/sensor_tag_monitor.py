@@ -15,11 +15,15 @@ The general process is as follows
     - URLs
     - Credentials
     - Handle CL args
-- Request data from QPE
+- Request data from QPE, or receive the data QPE pushes over UDP with --udp_port
 - Parse Data
 - Post data to influx_db
     - https://cloud2.influxdata.com/signup
     - There is no particular reason Influx_DB has to be the cloud endpoint
+- Requesting, parsing and posting run concurrently as stages, see helpers.pipeline
+- Measure every stage, see helpers.metrics, served with --metrics_port and
+  written to influx_db with --metrics_influx
+- With --profile N, profile every Nth poll interval, see helpers.profiling
 
 This does not check if collected data is stale before posting
 
@@ -28,90 +32,255 @@ __author__ = "Quuppa"
 
 import argparse
 import logging
-import pprint
 import time
+from functools import partial
+from typing import Callable, Iterator
 
 import requests
-from influxdb_client import InfluxDBClient, Point, WritePrecision
-from influxdb_client.client.write_api import SYNCHRONOUS
-from influxdb_client.rest import ApiException
 
 import helpers.startup as startup
-from helpers.urls import QpeUrlCompendium
-from sensortags.sensordata import GatewayTag, InfluxPoint
+from helpers.influx import InfluxWriter
+from helpers.metrics import Metrics, MetricsServer
+from helpers.pipeline import Pipeline, Stage, batched
+from helpers.qpe import QpeClient, QpeError
+from helpers.schedule import PollScheduler
+from helpers.spool import Spool
+from helpers.udp import UdpTagListener
+from sensortags.changes import ChangeTracker
+from sensortags.lineprotocol import LineProtocolBuffer
+from sensortags.readings import SensorReading
+from sensortags.registry import get_parser_cache
+from sensortags.tagstream import GATEWAY_KEYS
 
+TAG_KEYS = ["tagId", "advertisingDataPayloadLocatorId"]
+# an adaptive poll interval aims for half the tags having a new frame every poll
+TARGET_CHANGED = 0.5
 
-def post_point_to_influx(point: dict):
-    """a function to handle posting point dicts to
-    influx db and potential exceptions. If the post to
-    influx does not work, data is still captured in the log file
 
-    Args:
-        point (dict): The influx point formatted dict to send
-    """
-    log = logging.getLogger("SensorMon")
-
-    ################# setup for influx ##########
-    influx_creds = startup.get_influx_credentials()
-    influx = InfluxDBClient(url=influx_creds["url"], token=influx_creds["token"], org=influx_creds["org"])
-    write_api = influx.write_api(write_options=SYNCHRONOUS)
-
-    ################# post data #################
-    log.info("Writing data to influx cloud...")
-    try:
-        write_api.write(
-            bucket=influx_creds["bucket"],
-            org=influx_creds["org"],
-            record=point,
-        )
-        log.info("...Completed")
-    except ApiException:
-        log.error("Could not post to Influx Cloud!!!!")
-
-
-def get_sensors_values(qpe_base_url: str) -> list[GatewayTag]:
+def get_gateway_data(qpe: QpeClient, changes: ChangeTracker = None, url: str = None) -> list[dict]:
     """uses the getTagData QPE endpoint with format ALL_ITEMS
     to check for tags that have associated advertising data
     captured by a gateway locator
 
     Args:
-        qpe_base_url (str): The QPE instance to poll
+        qpe (QpeClient): The QPE instance to poll
+        changes (ChangeTracker, optional): if given, tags whose advertising
+            frame was already seen are left out. Defaults to None.
+        url (str, optional): the getTagData url, see QpeUrlCompendium.tag_data_url.
+            Defaults to format ALL_ITEMS.
 
     Returns:
-        list[GatewayTag]: the list of GatewayTag class instances representing the
-        sensor tags collected with valid adv data
+        list[dict]: the tags with gateway data as returned by QPE
     """
-    ## init resources ##
     log = logging.getLogger("SensorMon")
-    qpe_urls = QpeUrlCompendium(qpe_base_url)
 
     ## collect data ##
     log.info("Requesting tag data from QPE...")
-    base_res = requests.get(qpe_urls.get_tag_data_all_items)
-    if base_res.status_code == 200:  # check request success
-        qpe_res = base_res.json()
-        if qpe_res["code"] == 0:  # check QPE response
-            gateway_data = [  # filter out tags without gateway data
-                tag for tag in qpe_res["tags"] if tag["advertisingDataPayload"] != None
-            ]
-            # log.info(f"Got data from QPE: {gateway_data}")
-
-        elif qpe_res["code"] == 11:  # qpe not in track mode
+    try:
+        # tags without gateway data are skipped while the response is read, without being decoded
+        gateway_data = qpe.get_gateway_data(stream=True, url=url)
+        # log.info(f"Got data from QPE: {gateway_data}")
+        if changes is not None:  # drop unchanged frames before they are parsed
+            gateway_data = changes.filter_new_frames(gateway_data)
+    except QpeError as error:
+        gateway_data = None
+        if error.code == 11:  # qpe not in track mode
             log.warning("QPE not in track mode, no data acquisition possible")
         else:
-            gateway_data = None
-            log.error(f'Expected QPE code 0, got: {qpe_res["code"]} ... no data received')
-    else:
+            log.error(f"Expected QPE code 0, got: {error.code} ... no data received")
+    except requests.RequestException as error:
+        gateway_data = None
+        log.error(f"Request to QPE failed: {error} ... no data received")
+    except ValueError as error:  # e.g. a QPE error page, or a response cut short
         gateway_data = None
-        log.error(f"Expected response code 200, got: {base_res.code} ... no data received")
+        log.error(f"Unreadable response from QPE: {error} ... no data received")
 
-    if gateway_data:  # if valid data was gathered attempt to convert to GatewayTags
-        gateway_tags = [GatewayTag.from_any_dict(tag) for tag in gateway_data]
-        log.debug(f"GatewayTags: {gateway_tags}")
-        return gateway_tags
-    else:
+    if not gateway_data:
         log.warning("No tags with gateway data were found")
         return []
+    return gateway_data
+
+
+def decode_readings(gateway_data: list[dict], device_types: dict = None, unparsed: dict = None) -> list[SensorReading]:
+    """decodes tags with gateway data into compact readings, tags that could
+    not be parsed are logged and left out
+
+    Args:
+        gateway_data (list[dict]): tags as returned by QPE
+        device_types (dict, optional): tag id -> parser module name. Defaults to None.
+        unparsed (dict, optional): if given, counts the tags left out per packet type,
+            the one in device_types or "unknown". Defaults to None.
+
+    Returns:
+        list[SensorReading]: the decoded readings
+    """
+    log = logging.getLogger("SensorMon")
+    if device_types is None:
+        device_types = {}
+
+    readings = []
+    for tag in gateway_data:
+        device_type = device_types.get(tag["tagId"])
+        if reading := SensorReading.from_any_dict(tag, device_type):
+            readings.append(reading)
+        else:
+            log.warning(f"No parser found for tag: {tag}")
+            if unparsed is not None:
+                packet_type = device_type or "unknown"
+                unparsed[packet_type] = unparsed.get(packet_type, 0) + 1
+    return readings
+
+
+def decode_chunk(gateway_data: list[dict], device_types: dict = None) -> tuple[list[SensorReading], dict]:
+    """decode_readings, returning the count of tags left out along with the readings,
+    so it survives decoding in another process, see count_decoded
+
+    Returns:
+        tuple[list[SensorReading], dict]: the readings, and packet type -> tags left out
+    """
+    unparsed = {}
+    return (decode_readings(gateway_data, device_types, unparsed), unparsed)
+
+
+def count_decoded(batch: tuple, metrics: Metrics) -> list[SensorReading]:
+    """counts the tags of a decode_chunk output in the tags_parsed and tags_no_parser
+    counters, labelled by packet type
+
+    Args:
+        batch (tuple): readings and packet type -> tags left out
+        metrics (Metrics): where to count
+
+    Returns:
+        list[SensorReading]: the readings
+    """
+    (readings, unparsed) = batch
+    parsed = {}
+    for reading in readings:
+        parsed[reading.packet_type] = parsed.get(reading.packet_type, 0) + 1
+    for (packet_type, count) in parsed.items():
+        metrics.counter("tags_parsed", packet_type=packet_type).inc(count)
+    for (packet_type, count) in unparsed.items():
+        metrics.counter("tags_no_parser", packet_type=packet_type).inc(count)
+    return readings
+
+
+def is_gateway_tag(tag: dict) -> bool:
+    """checks that a tag with gateway data has every one of the GATEWAY_KEYS, and
+    a string tagId and payload and an integer timestamp, as ChangeTracker needs them
+
+    Args:
+        tag (dict): a tag with an advertisingDataPayload
+
+    Returns:
+        bool: False if the tag can not be used
+    """
+    return (
+        all(key in tag for key in GATEWAY_KEYS)
+        and isinstance(tag["tagId"], str)
+        and isinstance(tag["advertisingDataPayload"], str)
+        and isinstance(tag["advertisingDataPayloadTS"], int)
+    )
+
+
+def receive_gateway_data(listener: UdpTagListener, changes: ChangeTracker = None, timeout: float = 1.0) -> list[dict]:
+    """receives the tags QPE pushed over UDP and keeps the ones with gateway data,
+    the ones that are incomplete, see is_gateway_tag, are counted in listener.invalid
+
+    Args:
+        listener (UdpTagListener): the socket QPE pushes to
+        changes (ChangeTracker, optional): if given, tags whose advertising
+            frame was already seen are left out. Defaults to None.
+        timeout (float, optional): seconds to wait for data. Defaults to 1.0.
+
+    Returns:
+        list[dict]: the tags with gateway data, empty after a timeout
+    """
+    log = logging.getLogger("SensorMon")
+    gateway_data = []
+    for tag in listener.receive_batch(timeout=timeout):
+        if tag.get("advertisingDataPayload") is None:
+            continue  # no gateway data
+        if is_gateway_tag(tag):
+            gateway_data.append(tag)
+        else:
+            listener.invalid += 1
+            log.debug(f"Incomplete tag with gateway data: {tag}")
+    if changes is not None:
+        gateway_data = changes.filter_new_frames(gateway_data)
+    return gateway_data
+
+
+def poll_gateway_data(
+    qpe: QpeClient,
+    changes: ChangeTracker,
+    url: str,
+    scheduler: PollScheduler,
+    chunk_size: int,
+    fetch: Callable = get_gateway_data,
+) -> Iterator[list[dict]]:
+    """polls the tags with gateway data on the deadlines of scheduler, see get_gateway_data.
+    An adaptive scheduler is adapted to the fraction of tags with a new frame. A poll
+    that fails is logged and skipped, the next one is made on schedule.
+
+    Args:
+        fetch (Callable, optional): polls QPE, e.g. a profiled get_gateway_data. Defaults to get_gateway_data.
+
+    Yields:
+        Iterator[list[dict]]: the new tags, in chunks of at most chunk_size
+    """
+    log = logging.getLogger("SensorMon")
+    for _ in scheduler:
+        try:
+            gateway_data = fetch(qpe, url=url)
+            new_data = changes.filter_new_frames(gateway_data)
+        except Exception:  # the generator must keep running, see helpers.pipeline
+            log.exception("Polling QPE failed, trying again next poll")
+            continue
+        if scheduler.adaptive:
+            scheduler.adapt(len(new_data) / len(gateway_data) if gateway_data else 0.0)
+        yield from batched(new_data, chunk_size)
+
+
+def push_gateway_data(
+    listener: UdpTagListener, changes: ChangeTracker, chunk_size: int, receive: Callable = receive_gateway_data
+) -> Iterator[list[dict]]:
+    """the tags with gateway data QPE pushes over UDP, see receive_gateway_data.
+    A batch that fails is logged and skipped.
+
+    Args:
+        receive (Callable, optional): receives a batch, e.g. a profiled receive_gateway_data.
+            Defaults to receive_gateway_data.
+
+    Yields:
+        Iterator[list[dict]]: the tags, in chunks of at most chunk_size
+    """
+    log = logging.getLogger("SensorMon")
+    while True:
+        try:
+            gateway_data = receive(listener, changes)
+        except Exception:  # the generator must keep running, see helpers.pipeline
+            log.exception("Receiving tag data failed, the batch is skipped")
+            continue
+        yield from batched(gateway_data, chunk_size)
+
+
+def serialize_readings(readings: list[SensorReading], changes: ChangeTracker, tag_keys: list) -> LineProtocolBuffer:
+    """serializes the new readings of a batch as line protocol
+
+    Args:
+        readings (list[SensorReading]): decoded readings
+        changes (ChangeTracker): drops readings whose measurement was already seen,
+            e.g. the same ruuvi measurement via another locator
+        tag_keys (list): keys to use as influx tags
+
+    Returns:
+        LineProtocolBuffer: the points
+    """
+    buffer = LineProtocolBuffer()
+    for reading in readings:
+        if changes.is_new_reading(reading):
+            reading.write_line_protocol(buffer, tag_keys=tag_keys)
+    return buffer
 
 
 if __name__ == "__main__":
@@ -121,39 +290,147 @@ if __name__ == "__main__":
     startup.add_qpe_base_url_arg(parser)
     startup.add_poll_interval_arg(parser)
     startup.add_id_arg(parser)
+    startup.add_parser_cache_arg(parser)
+    startup.add_spool_arg(parser)
+    startup.add_udp_args(parser)
+    startup.add_pipeline_args(parser)
+    startup.add_schedule_args(parser)
+    startup.add_metrics_args(parser)
+    startup.add_profile_args(parser)
     args = parser.parse_args()
 
     startup.configure_logging()
     log: logging.Logger = logging.getLogger("SensorMon")
 
-    log.info(f"Started with QPE base url: {args.qpe_addr} and polling every {args.poll_interval} seconds")
+    parser_cache = get_parser_cache()  # discovers the parsers once, before the first poll
+    if args.parser_cache:
+        parser_cache.load(args.parser_cache)
+        log.info(f"Loaded {len(parser_cache.entries)} cached tag parsers from {args.parser_cache}")
+
+    # cheap counters and histograms of the hot path, see helpers.metrics
+    metrics = Metrics()
+    metrics_server = None
+    if args.metrics_port is not None:
+        metrics_server = MetricsServer(metrics, ("127.0.0.1", args.metrics_port))
+        metrics_server.start()
+        log.info(f"Serving self metrics on {metrics_server.url}")
+
+    # with --profile, every step running in this process is profiled every Nth poll interval
+    profiler = startup.cycle_profiler(args)
+    profiled = profiler.profiled if profiler is not None else lambda function: function
+    if profiler is not None:
+        log.info(f"Profiling every {args.profile}th poll interval into logs/")
+
+    changes = ChangeTracker()
+    if args.udp_port is None:
+        log.info(f"Started with QPE base url: {args.qpe_addr} and polling every {args.poll_interval} seconds")
+        # polls on drift free deadlines, with --adaptive_interval faster while most tags change
+        scheduler = startup.poll_scheduler(args, target=TARGET_CHANGED)
+        qpe = QpeClient(args.qpe_addr, metrics=metrics)  # one keep alive connection, with timeouts
+        # only the tags heard from since the poll before last, older frames were seen already
+        tag_data_url = qpe.urls.tag_data_url("ALL_ITEMS", max_age=2 * scheduler.max_interval)
+        source = poll_gateway_data(
+            qpe, changes, tag_data_url, scheduler, args.chunk_size, fetch=profiled(get_gateway_data)
+        )
+    else:
+        listener = UdpTagListener(args.udp_port, receive_buffer=args.udp_receive_buffer)
+        log.info(
+            f"Started receiving QPE tag data on UDP {listener.address[0]}:{listener.address[1]},"
+            f" receive buffer {listener.receive_buffer} bytes"
+        )
+        source = push_gateway_data(listener, changes, args.chunk_size, receive=profiled(receive_gateway_data))
+        metrics.gauge("udp_datagrams", lambda: listener.datagrams)
+        metrics.gauge("udp_dropped", lambda: listener.kernel_dropped, reason="kernel")
+        metrics.gauge("udp_dropped", lambda: listener.invalid, reason="invalid")
+
+    ################# setup for influx ##########
+    # credentials are loaded once, points are posted in batches on a background thread
+    # and spooled to disk, if a spool directory is given, while influx DB is unreachable
+    spool = Spool(args.spool) if args.spool else None
+    writer = InfluxWriter.from_credentials(startup.get_influx_credentials(), spool=spool, metrics=metrics)
 
     tag_packet_types = {
         "ac233fa29a16": "minew_e6",
         # "ac233fab8231": "minew_s1",
     }
 
-    while True:
-        ################# get data and process it #################
-        tags = get_sensors_values(args.qpe_addr)
-        for tag in tags:
-            if tag.tokenize_data(tag_packet_types.get(tag.tagId)):  # if tag was successfully processed
-                influx_dict = None  # default incase tag is parsed but not posted
-
-                # if tag.device_type == "minew_e6":  # Influx bucket specific formatting
-                influx_dict = tag.as_influx_point_dict(
-                    # make the tagId an Influx tag and do not collect
-                    # little_endian_mac as a field value
-                    tag_keys=["tagId", "advertisingDataPayloadLocatorId"],
-                )
-                # else:#any tags that are not formatted specially
-                #     influx_dict = tag.as_influx_point_dict()
+    ################# get data and process it #################
+    # fetch, decode, serialize and write run concurrently, connected by bounded queues
+    executor = None
+    if args.decode_processes:
+        # multiprocessing is only imported when used, the workers discover the parsers before their first batch
+        from concurrent.futures import ProcessPoolExecutor
 
-                if influx_dict:
-                    log.info(f"Collected sensor data: {influx_dict}")
-                    post_point_to_influx(influx_dict)
+        executor = ProcessPoolExecutor(args.decode_processes, initializer=get_parser_cache)
+    decode = partial(decode_chunk, device_types=tag_packet_types)
+    pipeline = Pipeline(
+        source,
+        [
+            Stage(
+                "decode",
+                decode if executor is not None else profiled(decode),
+                executor=executor,
+                concurrency=2 * args.decode_processes,
+            ),
+            # make the tagId an Influx tag, values beginning with '_' such as
+            # little_endian_mac are not collected as field values
+            Stage(
+                "serialize",
+                profiled(lambda batch: serialize_readings(count_decoded(batch, metrics), changes, TAG_KEYS)),
+                size=lambda batch: len(batch[0]),
+            ),
+            Stage(
+                "write",
+                profiled(lambda buffer: writer.write_lines(buffer.data, buffer.lines)),
+                size=lambda buffer: buffer.lines,
+            ),
+        ],
+        metrics=metrics,
+    )
+    pipeline.start()
 
-            else:
-                log.warning(f"No parser found for tag: {tag}")
-
-        time.sleep(args.poll_interval)
+    try:
+        while not pipeline.join(args.poll_interval):
+            for (stage, report) in pipeline.report().items():
+                log.info(
+                    f"Stage {stage}: {report['items']} items, {report['items_per_second']:.0f}/s,"
+                    f" {report['utilization']:.0%} busy, queue {report['queue_depth']}"
+                    f" (max {report['max_queue_depth']})"
+                )
+            log.info(f"Skipped {changes.unchanged} unchanged frames so far")
+            if args.udp_port is None:
+                schedule = scheduler.report()
+                log.info(
+                    f"Polling every {schedule['interval']:.3g} s, {schedule['overruns']} of {schedule['cycles']}"
+                    f" polls overran, {schedule['skipped']} skipped"
+                )
+            log.info(
+                f"Influx DB points written: {writer.written_points}, failed: {writer.failed_points},"
+                f" dropped: {writer.dropped_points}, spooled: {writer.spooled_points},"
+                f" replayed: {writer.replayed_points}"
+            )
+            if args.udp_port is not None:
+                log.info(
+                    f"UDP datagrams received: {listener.datagrams}, dropped by the OS: {listener.kernel_dropped},"
+                    f" invalid: {listener.invalid}"
+                )
+            if args.metrics_influx:
+                for point in metrics.influx_points(tags={"script": "sensor_tag_monitor"}):
+                    writer.write(point)
+            if args.parser_cache and parser_cache.dirty:
+                parser_cache.save(args.parser_cache)
+            if profiler is not None:
+                profiler.cycle()
+        if pipeline.error is not None:  # the source itself failed, not one poll
+            raise RuntimeError("The tag data source failed, stopping") from pipeline.error
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipeline.close(timeout=args.poll_interval)
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        writer.close()
+        if metrics_server is not None:
+            metrics_server.close()
+        if profiler is not None:
+            profiler.close()
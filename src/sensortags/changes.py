@@ -0,0 +1,79 @@
+"""Change detection of the advertising data reported by QPE
+
+QPE keeps reporting the last advertising frame of a tag until a new one is
+received, so slow advertising tags show up with the same frame poll after poll.
+A ChangeTracker remembers the last frame of every tag so unchanged frames can be
+dropped before they are parsed and posted to influx DB.
+"""
+
+from dataclasses import dataclass
+
+
+@dataclass
+class ChangeTracker:
+    """Per tagId index of the last frame and reading seen
+
+    A frame is unchanged if both its advertisingDataPayloadTS and its payload are
+    the same as last time. Decoded readings that carry a measurement_sequence_number,
+    like ruuvi data format 5, are additionally unchanged if the sequence number is,
+    e.g. when the same measurement was received again by a different locator.
+    """
+
+    def __post_init__(self):
+        self.frames: dict[str, tuple[int, int]] = {}  # tagId -> (advertisingDataPayloadTS, payload hash)
+        self.sequences: dict[str, int] = {}  # tagId -> measurement_sequence_number
+        self.unchanged = 0  # frames and readings dropped so far
+
+    def is_new_frame(self, tag_id: str, timestamp: int, payload: str) -> bool:
+        """checks the frame of a tag against the last one and remembers it
+
+        Args:
+            tag_id (str): the tag id
+            timestamp (int): the advertisingDataPayloadTS
+            payload (str): the advertisingDataPayload
+
+        Returns:
+            bool: False if the frame was already seen
+        """
+        frame = (timestamp, hash(payload))
+        if self.frames.get(tag_id) == frame:
+            self.unchanged += 1
+            return False
+
+        self.frames[tag_id] = frame
+        return True
+
+    def filter_new_frames(self, tags: list) -> list:
+        """drops the tags of a getTagData response whose frame was already seen
+
+        Args:
+            tags (list[dict]): tags with gateway data as returned by QPE
+
+        Returns:
+            list[dict]: the tags with a new frame
+        """
+        return [
+            tag
+            for tag in tags
+            if self.is_new_frame(tag["tagId"], tag["advertisingDataPayloadTS"], tag["advertisingDataPayload"])
+        ]
+
+    def is_new_reading(self, tag) -> bool:
+        """checks the measurement_sequence_number of a decoded tag, if it has one
+
+        Args:
+            tag (GatewayTag): a tokenized tag
+
+        Returns:
+            bool: False if the measurement was already seen
+        """
+        sequence = getattr(tag, "measurement_sequence_number", None)
+        if sequence is None:
+            return True
+
+        if self.sequences.get(tag.tagId) == sequence:
+            self.unchanged += 1
+            return False
+
+        self.sequences[tag.tagId] = sequence
+        return True
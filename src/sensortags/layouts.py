@@ -0,0 +1,159 @@
+"""Declarative binary layouts of advertising data frames
+
+Instead of tokenizing the hex string of a frame with a regex and converting
+every group with int(x, 16), a parser can declare where its fields are:
+
+    layout = FrameLayout(
+        (
+            Field("temperature", offset=8, width=2, signed=True, scale=0.005),
+            Field("pressure", offset=12, width=2, add=50000),
+        )
+    )
+
+The layout is compiled into a single struct.Struct, so decoding a frame is one
+unpack_from call on the raw bytes followed by the scaling of each value:
+
+    value = ((raw >> shift) & mask) * scale + add
+
+What the tokens_reg_ex of a parser checks beyond its fields is declared on the
+layout too, so frames of other formats are still rejected without the regex:
+bytes every frame carries as constants, e.g. the AD flags "020106", and bytes
+that may only take a few values as choices, e.g. the BINARY_DIGIT_BYTES a
+regex group ([0-1]{2}) allows. See FrameLayout.fits.
+"""
+
+import struct
+from dataclasses import dataclass
+from typing import Callable, NamedTuple
+
+# struct format characters of unsigned integers by width in bytes
+INTEGER_FORMATS = {1: "B", 2: "H", 4: "I", 8: "Q"}
+# the bytes whose hex digits are both 0 or 1, what ([0-1]{2}) matches in a tokens_reg_ex
+BINARY_DIGIT_BYTES = bytes((0x00, 0x01, 0x10, 0x11))
+
+
+class Field(NamedTuple):
+    """A value in a frame, fields beginning with '_' are ignored when sending to influx DB"""
+
+    name: str
+    offset: int  # bytes into the advertising data
+    width: int = 1  # bytes
+    signed: bool = False  # 2's complement
+    scale: float = 1
+    add: float = 0
+    shift: int = 0  # for bit fields, the value is shifted right ...
+    mask: int = None  # ... and then masked
+    raw: bool = False  # keep the bytes as a hex string instead, e.g. MAC addresses
+
+    @property
+    def format(self) -> str:
+        """struct format character(s) of the field"""
+        if self.raw:
+            return f"{self.width}s"
+        try:
+            fmt = INTEGER_FORMATS[self.width]
+        except KeyError as e:
+            raise ValueError(f"{self.name}: integers must be 1, 2, 4 or 8 bytes wide, not {self.width}") from e
+        return fmt.lower() if self.signed else fmt
+
+
+@dataclass
+class FrameLayout:
+    """The fields of a frame and how they are converted
+
+    Args:
+        fields (tuple[Field]): the fields, several fields may share the same bytes
+        byte_order (str, optional): struct byte order. Defaults to ">" big endian.
+        length (int, optional): minimum frame length in bytes. Defaults to the end of the last field,
+            or of the last constant or choice.
+        post_process (Callable, optional): receives the decoded dict for any conversion
+            that does not fit a field, returns the final dict. Defaults to None.
+        constants (tuple, optional): (offset, hex string) of the bytes every frame carries. Defaults to ().
+        choices (tuple, optional): (offset, bytes) of the single bytes that may only take one of
+            the given values. Defaults to ().
+    """
+
+    fields: tuple
+    byte_order: str = ">"
+    length: int = None
+    post_process: Callable[[dict], dict] = None
+    constants: tuple = ()
+    choices: tuple = ()
+
+    def __post_init__(self):
+        # fields sharing the same bytes are unpacked once
+        slots = sorted({(field.offset, field.format) for field in self.fields})
+
+        fmt = self.byte_order
+        position = 0
+        for (offset, slot_format) in slots:
+            if offset < position:
+                raise ValueError(f"the field at byte {offset} overlaps the previous field")
+            fmt += f"{offset - position}x" if offset > position else ""
+            fmt += slot_format
+            position = offset + struct.calcsize(self.byte_order + slot_format)
+
+        self.struct = struct.Struct(fmt)
+        # (start, end, bytes) of every constant
+        self.constant_slices = tuple(
+            (offset, offset + len(constant) // 2, bytes.fromhex(constant)) for (offset, constant) in self.constants
+        )
+        end = max(
+            [self.struct.size]
+            + [end for (_, end, _) in self.constant_slices]
+            + [offset + 1 for (offset, _) in self.choices]
+        )
+        if self.length is None:
+            self.length = end
+        elif self.length < end:
+            raise ValueError(f"a length of {self.length} does not fit the layout, which ends at byte {end}")
+
+        slot_indexes = {slot: index for (index, slot) in enumerate(slots)}
+        self.converters = tuple(
+            (field.name, slot_indexes[(field.offset, field.format)], _converter(field)) for field in self.fields
+        )
+
+    def fits(self, data: bytes) -> bool:
+        """checks a frame is long enough and carries the constants and choices of the layout
+
+        Args:
+            data (bytes): the advertising data
+
+        Returns:
+            bool: True if the frame has the format of the layout
+        """
+        return (
+            len(data) >= self.length
+            and all(data[start:end] == constant for (start, end, constant) in self.constant_slices)
+            and all(data[offset] in values for (offset, values) in self.choices)
+        )
+
+    def decode(self, data: bytes) -> dict:
+        """decodes the fields of a frame
+
+        Args:
+            data (bytes): the advertising data, bytes, bytearray or memoryview
+
+        Returns:
+            dict: field name -> value, None if the frame is too short
+        """
+        if len(data) < self.length:
+            return None
+
+        raw = self.struct.unpack_from(data)
+        values = {name: convert(raw[index]) for (name, index, convert) in self.converters}
+
+        if self.post_process:
+            values = self.post_process(values)
+        return values
+
+
+def _converter(field: Field) -> Callable:
+    """builds the conversion of a single unpacked value, integers
+    stay integers as long as scale and add are integers
+    """
+    if field.raw:
+        return bytes.hex
+
+    mask = -1 if field.mask is None else field.mask  # -1 has every bit set
+    return lambda value: ((value >> field.shift) & mask) * field.scale + field.add
@@ -0,0 +1,224 @@
+"""Serialization of points straight into influx DB line protocol
+
+The influxdb_client library turns every point dict into a Point and only then
+into a line of line protocol. A LineProtocolBuffer skips both steps: points are
+formatted as text and appended to one bytearray that is reused for a whole
+batch and posted as is, e.g. to the influx DB /api/v2/write endpoint.
+
+Values are formatted the way influxdb_client formats them: floats without a
+trailing ".0", ints with an "i" suffix, bools as true/false, strings quoted.
+None and non finite floats are left out.
+
+Typical usage:
+
+    buffer = LineProtocolBuffer()
+    for reading in readings:
+        reading.write_line_protocol(buffer, tag_keys=["tagId"])
+    post(buffer.getvalue())  # timestamps are in ms, see PRECISION
+    buffer.clear()
+"""
+
+import math
+from numbers import Integral, Real
+from typing import Callable, Iterable
+
+PRECISION = "ms"  # advertisingDataPayloadTS is in ms
+
+_ESCAPE_MEASUREMENT = str.maketrans({",": r"\,", " ": r"\ ", "\n": r"\n", "\t": r"\t", "\r": r"\r"})
+_ESCAPE_KEY = str.maketrans({",": r"\,", "=": r"\=", " ": r"\ ", "\n": r"\n", "\t": r"\t", "\r": r"\r"})
+_ESCAPE_STRING = str.maketrans({'"': r"\"", "\\": r"\\"})
+
+# keys repeat point after point, so they are escaped once
+_escaped_keys: dict[str, str] = {}
+
+
+def escape_measurement(measurement: str) -> str:
+    """escapes commas, spaces and line breaks in a measurement name
+
+    Args:
+        measurement (str): the measurement
+
+    Returns:
+        str: the escaped measurement
+    """
+    return str(measurement).translate(_ESCAPE_MEASUREMENT)
+
+
+def escape_key(key: str) -> str:
+    """escapes commas, equal signs, spaces and line breaks in a tag or field key
+
+    Args:
+        key (str): the key
+
+    Returns:
+        str: the escaped key
+    """
+    if (escaped := _escaped_keys.get(key)) is None:
+        escaped = _escaped_keys[key] = str(key).translate(_ESCAPE_KEY)
+    return escaped
+
+
+def escape_tag_value(value) -> str:
+    """escapes a tag value like a key, a trailing backslash gets a space
+    so it does not escape the separator after it
+
+    Args:
+        value (Any): the tag value
+
+    Returns:
+        str: the escaped value
+    """
+    escaped = str(value).translate(_ESCAPE_KEY)
+    return escaped + " " if escaped.endswith("\\") else escaped
+
+
+def _format_float(value) -> str:
+    if not math.isfinite(value):
+        return None
+    text = repr(float(value))
+    return text[:-2] if text.endswith(".0") else text
+
+
+def _format_int(value) -> str:
+    return f"{int(value)}i"
+
+
+def _format_bool(value) -> str:
+    return "true" if value else "false"
+
+
+def _format_str(value) -> str:
+    return f'"{value.translate(_ESCAPE_STRING)}"'
+
+
+# value type -> formatter, resolved on first use for types not listed here
+_formatters: dict[type, Callable] = {
+    float: _format_float,
+    int: _format_int,
+    bool: _format_bool,
+    str: _format_str,
+}
+
+
+def _formatter_for(value_type: type) -> Callable:
+    if issubclass(value_type, bool):
+        formatter = _format_bool
+    elif issubclass(value_type, Integral):  # e.g. numpy.int16
+        formatter = _format_int
+    elif issubclass(value_type, Real):  # e.g. numpy.float32
+        formatter = _format_float
+    elif issubclass(value_type, str):
+        formatter = _format_str
+    else:
+        raise ValueError(f'Type: "{value_type}" is not supported as a field value.')
+
+    _formatters[value_type] = formatter
+    return formatter
+
+
+def format_field_value(value) -> str:
+    """formats a field value
+
+    Args:
+        value (Any): a float, int, bool or str, numpy scalars work too
+
+    Raises:
+        ValueError: for values of other types, e.g. lists
+
+    Returns:
+        str: the formatted value, None if the value is left out
+    """
+    if value is None:
+        return None
+    value_type = type(value)
+    return (_formatters.get(value_type) or _formatter_for(value_type))(value)
+
+
+class LineProtocolBuffer:
+    """Lines of line protocol appended into one reusable bytearray"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.lines = 0
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def append(self, measurement: str, tags: Iterable[tuple], fields: Iterable[tuple], timestamp: int = None) -> bool:
+        """formats one point and appends it as a line
+
+        Args:
+            measurement (str): the measurement
+            tags (Iterable[tuple]): (key, value) pairs, sorted by key for best
+                influx DB performance. None values are left out.
+            fields (Iterable[tuple]): (key, value) pairs
+            timestamp (int, optional): in ms. Defaults to the time the server receives it.
+
+        Raises:
+            ValueError: for field values of unsupported types, nothing is appended then
+
+        Returns:
+            bool: False if there were no fields to write and nothing was appended
+        """
+        formatters = _formatters
+        escaped_keys = _escaped_keys
+        parts = []
+        for (key, value) in fields:  # format_field_value and escape_key, inlined
+            if value is None:
+                continue
+            text = (formatters.get(type(value)) or _formatter_for(type(value)))(value)
+            if text is not None:
+                parts.append(f"{escaped_keys.get(key) or escape_key(key)}={text}")
+        if not parts:
+            return False
+
+        line = escape_measurement(measurement)
+        for (key, value) in tags:
+            if value is not None and value != "":
+                line += f",{escape_key(key)}={escape_tag_value(value)}"
+        fields = ",".join(parts)
+        line += f" {fields}\n" if timestamp is None else f" {fields} {int(timestamp)}\n"
+
+        self.data += line.encode()
+        self.lines += 1
+        return True
+
+    def append_point(self, point: dict, timestamp: int = None) -> bool:
+        """appends a point in the format of as_influx_point_dict
+
+        Args:
+            point (dict): {"measurement": ..., "tags": {...}, "fields": {...}}
+            timestamp (int, optional): in ms. Defaults to point["time"] if present.
+
+        Returns:
+            bool: False if there were no fields to write
+        """
+        return self.append(
+            point["measurement"],
+            sorted(point.get("tags", {}).items()),
+            point["fields"].items(),
+            point.get("time") if timestamp is None else timestamp,
+        )
+
+    def extend(self, data: bytes, lines: int) -> None:
+        """appends lines that were formatted already, e.g. by another buffer
+
+        Args:
+            data (bytes): line protocol, ending with a newline
+            lines (int): the number of lines in data
+        """
+        self.data += data
+        self.lines += lines
+
+    def getvalue(self) -> bytes:
+        """the lines appended so far
+
+        Returns:
+            bytes: the line protocol, one point per line
+        """
+        return bytes(self.data)
+
+    def clear(self) -> None:
+        """empties the buffer for the next batch"""
+        self.data.clear()
+        self.lines = 0
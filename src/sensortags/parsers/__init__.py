@@ -0,0 +1,8 @@
+"""Sensor tag parsers, one module per device type
+
+PARSERS lists the modules, the parser registry imports them from it without
+scanning this directory. A new parser must be added to it, tests/registry_test.py
+checks that none is missing.
+"""
+
+PARSERS = ("minew_e6", "minew_s1", "minew_s4_alarm", "ruuvi_raw_v1", "ruuvi_raw_v2_f5")
@@ -9,6 +9,11 @@ Sample Advertising Data: 0x02 0x01 0x06 0x03 0x03 0xe1 0xff 0x0d 0x16 0xe1 0xff
 
 import re
 
+from sensortags.layouts import BINARY_DIGIT_BYTES, Field, FrameLayout
+
+# discriminating bytes used by the registry to route payloads to this parser
+header_offset = 8  # bytes into the advertising data
+header = "16e1ffa102"  # service data: e1ff UUID, a1 frame, 02 light sensor
 
 tokens_reg_ex = r"""0201060303e1ff[0-9a-z]{2}16e1ffa10264
                 ([0-1]{2}) # detected light value
@@ -22,3 +27,16 @@ def process_adv_data(result: re.Match) -> dict:
         "light_sensor_value": int(result.group(1), 16),
         "_little_endian_mac": str(result.group(2)),
     }
+
+
+# same fields as process_adv_data, decoded from the raw bytes
+layout = FrameLayout(
+    (
+        Field("light_sensor_value", offset=14),
+        Field("_little_endian_mac", offset=15, width=6, raw=True),
+    ),
+    # what tokens_reg_ex checks besides the header: the AD flags and service UUID list,
+    # the battery byte 64 and the light value of binary digits
+    constants=((0, "0201060303e1ff"), (13, "64")),
+    choices=((14, BINARY_DIGIT_BYTES),),
+)
@@ -16,6 +16,11 @@ parsed or discarded....
 import re
 
 import helpers.tools as tools
+from sensortags.layouts import Field, FrameLayout
+
+# discriminating bytes used by the registry to route payloads to this parser
+header_offset = 8  # bytes into the advertising data
+header = "16e1ffa101"  # service data: e1ff UUID, a1 frame, 01 temperature and humidity
 
 tokens_reg_ex = r"""0201060303e1ff[0-9a-z]{2}16e1ffa101
                 ([0-9a-z]{2})   # Battery level 0x64 Battery level is 100%
@@ -33,3 +38,15 @@ def process_adv_data(result: re.Match) -> dict:
         "humidity": tools.float_from_8_8(result.group(3)),
         "_little_endian_mac": str(result.group(4)),
     }
+
+
+# same fields as process_adv_data, decoded from the raw bytes
+layout = FrameLayout(
+    (
+        Field("battery_level", offset=13),
+        Field("temperature", offset=14, width=2, scale=1 / 256),  # 8.8 fixed-point
+        Field("humidity", offset=16, width=2, scale=1 / 256),  # 8.8 fixed-point
+        Field("_little_endian_mac", offset=18, width=6, raw=True),
+    ),
+    constants=((0, "0201060303e1ff"),),  # the AD flags and service UUID list tokens_reg_ex checks
+)
@@ -12,6 +12,12 @@ FIXME: This qpe output is not recognized by the parser because it is a status fr
 
 import re
 
+from sensortags.layouts import BINARY_DIGIT_BYTES, Field, FrameLayout
+
+# discriminating bytes used by the registry to route payloads to this parser
+header_offset = 4  # bytes into the advertising data
+header = "ff3906a401"  # manufacturer data: 0639 company id, a4 frame, 01 alarm
+
 tokens_reg_ex = r"""02010612ff3906a401
 ([0-9a-z]{2})   # Battery level 0x64 Battery level is 100%
 ([0-1]{2})      # Door magnets alarm status 0x00: off status; 0x01: on status
@@ -29,6 +35,23 @@ def process_adv_data(result: re.Match) -> dict:
         "battery_level": int(result.group(1), 16),
         "alarm_status": int(result.group(2)),
         "anti_tamper": int(result.group(3)),
-        "history": int(result.group(3)),
+        "history": int(result.group(4)),
         "_little_endian_mac": str(result.group(5)),
     }
+
+
+# same fields as process_adv_data, decoded from the raw bytes
+layout = FrameLayout(
+    (
+        Field("battery_level", offset=9),
+        Field("alarm_status", offset=10),
+        Field("anti_tamper", offset=11),
+        Field("history", offset=12),
+        Field("_little_endian_mac", offset=14, width=6, raw=True),
+    ),
+    length=22,  # 2 random bytes after the MAC address
+    # what tokens_reg_ex checks besides the header: the AD flags and length,
+    # the ff after the alarm flags and the flags of binary digits
+    constants=((0, "02010612"), (13, "ff")),
+    choices=((10, BINARY_DIGIT_BYTES), (11, BINARY_DIGIT_BYTES), (12, BINARY_DIGIT_BYTES)),
+)
@@ -12,6 +12,11 @@ https://github.com/ruuvi/ruuvi-sensor-protocols/blob/master/dataformat_03.md
 import re
 
 import helpers.tools as tools
+from sensortags.layouts import Field, FrameLayout
+
+# discriminating bytes used by the registry to route payloads to this parser
+header_offset = 4  # bytes into the advertising data
+header = "ff990403"  # manufacturer data: 0499 company id, 03 data format
 
 tokens_reg_ex = r"""0201[0-9a-z]{2}[0-9a-z]{2}ff990403
 ([0-9a-z]{2}) # Humidity
@@ -36,3 +41,27 @@ def process_adv_data(result: re.Match) -> dict:
         "acceleration_z": tools.hex_string_to_2s_comp_signed_int(result.group(7), 16),
         "battery": int(result.group(8), 16) * 0.001,
     }
+
+
+def _temperature_from_sign_magnitude(values: dict) -> dict:
+    values["temperature"] = tools.ruuvi_sign_magnitude_to_float(
+        values.pop("_temperature_integer"), values.pop("_temperature_fraction")
+    )
+    return values
+
+
+# same fields as process_adv_data, decoded from the raw bytes
+layout = FrameLayout(
+    (
+        Field("humidity", offset=8, scale=0.5),
+        Field("_temperature_integer", offset=9),
+        Field("_temperature_fraction", offset=10),
+        Field("pressure", offset=11, width=2, add=50000),
+        Field("acceleration_x", offset=13, width=2, signed=True),
+        Field("acceleration_y", offset=15, width=2, signed=True),
+        Field("acceleration_z", offset=17, width=2, signed=True),
+        Field("battery", offset=19, width=2, scale=0.001),
+    ),
+    post_process=_temperature_from_sign_magnitude,
+    constants=((0, "0201"),),  # the AD flags type tokens_reg_ex checks
+)
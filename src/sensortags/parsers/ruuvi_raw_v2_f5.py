@@ -13,6 +13,11 @@ https://github.com/ruuvi/ruuvi-sensor-protocols/blob/master/dataformat_05.md
 import re
 
 import helpers.tools as tools
+from sensortags.layouts import Field, FrameLayout
+
+# discriminating bytes used by the registry to route payloads to this parser
+header_offset = 4  # bytes into the advertising data
+header = "ff990405"  # manufacturer data: 0499 company id, 05 data format
 
 tokens_reg_ex = r"""0201[0-9a-z]{2}[0-9a-z]{2}ff990405
 ([0-9a-z]{4}) # Temperature in 0.005 degrees
@@ -42,3 +47,22 @@ def process_adv_data(result: re.Match) -> dict:
         "movement_counter": int(result.group(8), 16),
         "measurement_sequence_number": int(result.group(9), 16),
     }
+
+
+# same fields as process_adv_data, decoded from the raw bytes
+layout = FrameLayout(
+    (
+        Field("temperature", offset=8, width=2, signed=True, scale=0.005),
+        Field("humidity", offset=10, width=2, scale=0.0025),
+        Field("pressure", offset=12, width=2, add=50000),
+        Field("acceleration_x", offset=14, width=2, signed=True),
+        Field("acceleration_y", offset=16, width=2, signed=True),
+        Field("acceleration_z", offset=18, width=2, signed=True),
+        Field("battery", offset=20, width=2, shift=5, scale=0.001, add=1.6),  # first 11 bits
+        Field("tx_power", offset=20, width=2, mask=0b11111, scale=2, add=-40),  # last 5 bits
+        Field("movement_counter", offset=22),
+        Field("measurement_sequence_number", offset=23, width=2),
+    ),
+    length=31,  # the MAC address ends the frame
+    constants=((0, "0201"),),  # the AD flags type tokens_reg_ex checks
+)
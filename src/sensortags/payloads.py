@@ -0,0 +1,64 @@
+"""Normalization of the advertisingDataPayload strings reported by QPE
+
+QPE reports advertising data as "0x02 0x01 0x06 ...". Parsers work on the raw
+bytes, so the string is converted once, in C, instead of splitting it and
+slicing every byte into a new string.
+"""
+
+from array import array
+
+
+def payload_to_bytes(payload: str) -> bytes:
+    """converts a QPE advertising data string to bytes
+
+    "0x02 0x01 0x06" -> b"\\x02\\x01\\x06"
+
+    Args:
+        payload (str): the advertisingDataPayload, a plain hex string "020106" works too
+
+    Returns:
+        bytes: the advertising data
+    """
+    return bytes.fromhex(payload.replace("0x", ""))  # fromhex skips the spaces
+
+
+def payloads_to_bytes(payloads: list) -> list:
+    """converts the advertising data strings of a whole poll response
+
+    Args:
+        payloads (list[str]): the advertisingDataPayloads
+
+    Returns:
+        list[bytes]: the advertising data of each payload
+    """
+    fromhex = bytes.fromhex
+    return [fromhex(payload.replace("0x", "")) for payload in payloads]
+
+
+def payloads_to_buffer(payloads: list) -> tuple:
+    """converts the advertising data strings of a whole poll response into
+    one contiguous buffer, without creating a bytes object per payload
+
+    Args:
+        payloads (list[str]): the advertisingDataPayloads, "0x02 0x01 ..." formatted
+
+    Returns:
+        tuple[bytes, array]: the buffer and the len(payloads) + 1 offsets of
+            the payloads in it, payload i is buffer[offsets[i]:offsets[i + 1]]
+    """
+    offsets = array("Q", [0])
+    total = 0
+    for payload in payloads:
+        total += payload.count("0x")
+        offsets.append(total)
+
+    buffer = bytes.fromhex(" ".join(payloads).replace("0x", ""))
+
+    if len(buffer) != total:  # not every byte is 0x prefixed, count them one by one
+        data = payloads_to_bytes(payloads)
+        offsets = array("Q", [0])
+        for payload in data:
+            offsets.append(offsets[-1] + len(payload))
+        buffer = b"".join(data)
+
+    return (buffer, offsets)
@@ -0,0 +1,187 @@
+"""A compact representation of decoded sensor tag readings
+
+A GatewayTag keeps every key of the QPE response, the raw payload string, a
+reference to its parser and the decoded values as dynamic instance attributes,
+which is convenient but costs around a kilobyte per tag. A SensorReading keeps
+only what is posted to influx DB in __slots__, with the tag and locator ids
+interned, and the decoded values in a slotted record class that is generated
+once per packet type and set of fields.
+"""
+
+import sys
+from dataclasses import make_dataclass
+
+from sensortags.lineprotocol import LineProtocolBuffer
+from sensortags.payloads import payload_to_bytes
+from sensortags.registry import ParserCache, device_type_of, get_parser_cache
+from sensortags.sensordata import InfluxPoint
+
+# (packet type, field names) -> record class
+_record_types: dict[tuple, type] = {}
+
+
+def record_type(packet_type: str, values: dict) -> type:
+    """gets the record class for decoded values of a packet type, the class
+    is created on first use with the field types of those values
+
+    Args:
+        packet_type (str): the parser module name, e.g. "ruuvi_raw_v2_f5"
+        values (dict): decoded values as returned by a parser
+
+    Returns:
+        type: a slotted dataclass with one field per value
+    """
+    key = (packet_type, tuple(values))
+    if (record := _record_types.get(key)) is None:
+        record = make_dataclass(
+            f"{packet_type}_record",
+            [(name, type(val)) for (name, val) in values.items()],
+            slots=True,
+        )
+        _record_types[key] = record
+    return record
+
+
+class SensorReading:
+    """One decoded advertising frame of a sensor tag
+
+    Decoded values are available as attributes, e.g. reading.temperature
+    """
+
+    __slots__ = (
+        "tagId",
+        "advertisingDataPayloadLocatorId",
+        "advertisingDataPayloadTS",
+        "advertisingDataPayloadSignalStrength",
+        "packet_type",
+        "values",
+    )
+
+    def __init__(
+        self,
+        tagId: str,
+        advertisingDataPayloadLocatorId: str,
+        advertisingDataPayloadTS: int,
+        advertisingDataPayloadSignalStrength: float,
+        packet_type: str,
+        values: object,
+    ):
+        self.tagId = sys.intern(tagId)
+        self.advertisingDataPayloadLocatorId = sys.intern(advertisingDataPayloadLocatorId)
+        self.advertisingDataPayloadTS = advertisingDataPayloadTS
+        self.advertisingDataPayloadSignalStrength = advertisingDataPayloadSignalStrength
+        self.packet_type = packet_type
+        self.values = values  # record of the packet type, see record_type
+
+    def __getattr__(self, name: str):
+        # only called for names that are not slots, i.e. decoded values
+        if name == "values":  # not set yet, e.g. while copying
+            raise AttributeError(name)
+        return getattr(self.values, name)
+
+    def __repr__(self) -> str:
+        return f"SensorReading({self.tagId}, {self.packet_type}, {self.values})"
+
+    def __reduce__(self):
+        # record classes are created at runtime and can't be pickled by name,
+        # the values are sent as a dict instead, e.g. back from a decode process
+        values = self.values
+        return (
+            _rebuild_reading,
+            (
+                self.tagId,
+                self.advertisingDataPayloadLocatorId,
+                self.advertisingDataPayloadTS,
+                self.advertisingDataPayloadSignalStrength,
+                self.packet_type,
+                {name: getattr(values, name) for name in values.__slots__},
+            ),
+        )
+
+    @classmethod
+    def from_any_dict(cls, raw_data: dict, device_type: str = None, parser_cache: ParserCache = None):
+        """decodes a tag of a getTagData response without creating a GatewayTag
+
+        Args:
+            raw_data (dict): a tag with gateway data as returned by QPE
+            device_type (str, optional): parser module name to use. Defaults to None.
+            parser_cache (ParserCache, optional): Defaults to the shared cache.
+
+        Returns:
+            SensorReading: the reading, None if the payload could not be parsed
+        """
+        if parser_cache is None:
+            parser_cache = get_parser_cache()
+        registry = parser_cache.registry
+
+        payload = payload_to_bytes(raw_data["advertisingDataPayload"])
+        parser = registry.get(device_type) if device_type else None
+        if parser is None:
+            parser = parser_cache.resolve(raw_data["tagId"], payload)
+        if parser is None or (values := registry.decode(parser, payload)) is None:
+            return None
+
+        packet_type = device_type_of(parser)
+        return cls(
+            raw_data["tagId"],
+            raw_data["advertisingDataPayloadLocatorId"],
+            raw_data["advertisingDataPayloadTS"],
+            raw_data["advertisingDataPayloadSignalStrength"],
+            packet_type,
+            record_type(packet_type, values)(**values),
+        )
+
+    def as_influx_point_dict(self, tag_keys: list = None) -> dict:
+        """the same point GatewayTag.as_influx_point_dict gives for the tag:
+        the packet type is the measurement and decoded values beginning with '_'
+        are ignored
+
+        Args:
+            tag_keys (list, optional): keys to use as tags. Defaults to tagId and locator id.
+
+        Returns:
+            dict: in the format of an influx_db point
+        """
+        if tag_keys is None:
+            tag_keys = ["tagId", "advertisingDataPayloadLocatorId"]
+
+        data = {key: getattr(self, key) for key in tag_keys}
+        data.update((name, getattr(self.values, name)) for name in self.values.__slots__ if name[0] != "_")
+
+        return InfluxPoint.dict_to_influx_point_dict(data, self.packet_type, tag_keys)
+
+    def write_line_protocol(self, buffer: LineProtocolBuffer, tag_keys: list = None, tags: dict = None) -> bool:
+        """appends the point as_influx_point_dict gives to a line protocol buffer,
+        timestamped with advertisingDataPayloadTS
+
+        Args:
+            buffer (LineProtocolBuffer): the buffer of the batch
+            tag_keys (list, optional): keys to use as tags. Defaults to tagId and locator id.
+            tags (dict, optional): additional tags, e.g. the QPE the reading came from. Defaults to None.
+
+        Returns:
+            bool: False if there were no fields to write
+        """
+        if tag_keys is None:
+            tag_keys = ["tagId", "advertisingDataPayloadLocatorId"]
+
+        point_tags = [(key, getattr(self, key)) for key in tag_keys]
+        if tags:
+            point_tags.extend(tags.items())
+
+        values = self.values
+        return buffer.append(
+            self.packet_type,
+            sorted(point_tags),
+            ((name, getattr(values, name)) for name in values.__slots__ if name[0] != "_" and name not in tag_keys),
+            self.advertisingDataPayloadTS,
+        )
+
+
+def _rebuild_reading(
+    tag_id: str, locator_id: str, timestamp: int, signal_strength: float, packet_type: str, values: dict
+) -> SensorReading:
+    """unpickles a SensorReading, see SensorReading.__reduce__"""
+    return SensorReading(
+        tag_id, locator_id, timestamp, signal_strength, packet_type, record_type(packet_type, values)(**values)
+    )
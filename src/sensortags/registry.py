@@ -0,0 +1,355 @@
+"""A registry of the available sensor tag parsers
+
+Parser modules in sensortags/parsers/ are imported once, from the precomputed
+PARSERS list of the package if it has one and by scanning the package directory
+otherwise, and can then be looked up by device type (the parser module name,
+e.g. "minew_s1") without touching the file system again. Discovery is done
+relative to the parsers package, not the working directory. A tokens_reg_ex is
+compiled on first use, parsers with a header and a layout never need it to
+match or decode, so startup does not pay for compiling them.
+
+Parsers may declare the discriminating bytes of their frames as `header` (hex string)
+and `header_offset` (bytes into the advertising data). Headers are kept in a hash
+index keyed by their position so a payload is only matched against the one parser
+its header routes to, no matter how many parsers there are. Parsers without a header
+are tried one by one after the index.
+
+Payloads are the raw advertising data bytes, see sensortags.payloads. Parsers with
+a header and a layout (see sensortags.layouts) accept a payload if it carries their
+header and fits the layout, its length, constant bytes and choices, which check
+what their tokens_reg_ex does. The payload is only converted back to a hex string
+for the tokens_reg_ex of other parsers.
+
+Resolved parsers are remembered per tagId by a ParserCache, including tags
+that no parser understands, so a tag is only matched against the registry
+when its payload stops fitting the cached result.
+"""
+
+import importlib
+import json
+import pkgutil
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from functools import cache
+from pathlib import Path
+from types import ModuleType
+
+PARSERS_PACKAGE = "sensortags.parsers"
+
+
+@dataclass
+class ParserRegistry:
+    """Holds every parser module of a package keyed by device type
+    along with its compiled tokens_reg_ex
+    """
+
+    package: str = PARSERS_PACKAGE
+
+    def __post_init__(self):
+        self.parsers: dict[str, ModuleType] = {}  # device type -> parser module
+        self.patterns: dict[str, re.Pattern] = {}  # device type -> compiled tokens_reg_ex, on first use
+        self.index: dict[tuple[int, int], dict[bytes, str]] = {}  # header slice -> {header: device type}
+        self.headers: dict[str, tuple[int, bytes]] = {}  # device type -> (header offset, header)
+        self.unindexed: list[str] = []  # device types without a header
+        self.discover()
+
+    def discover(self) -> None:
+        """imports every module of the parsers package and registers it, the ones
+        in its PARSERS list if it has one, else every module in its directory
+
+        Raises:
+            ImportError: if a module in the package can not be imported
+        """
+        package = importlib.import_module(self.package)
+
+        names = getattr(package, "PARSERS", None)
+        if names is None:
+            names = [info.name for info in pkgutil.iter_modules(package.__path__) if not info.ispkg]
+        for name in names:
+            try:
+                parser = importlib.import_module(f"{self.package}.{name}")
+            except ImportError as e:
+                # if a post proc module could not be found this is
+                # almost 100% a critical error
+                raise ImportError(f"{name} should be an importable module but is not") from e
+
+            self.register(name, parser)
+
+    def register(self, device_type: str, parser: ModuleType) -> None:
+        """adds a parser to the registry, its tokens_reg_ex is compiled on first use
+
+        Args:
+            device_type (str): name to look the parser up with
+            parser (ModuleType): a module implementing tokens_reg_ex and process_adv_data
+
+        Raises:
+            ValueError: if the parser's header is already routed to another parser
+        """
+        self.parsers[device_type] = parser
+        self.patterns.pop(device_type, None)
+
+        header = getattr(parser, "header", None)
+        if header is None:
+            self.unindexed.append(device_type)
+            return
+
+        header = bytes.fromhex(header)
+        start = getattr(parser, "header_offset", 0)
+        headers = self.index.setdefault((start, start + len(header)), {})
+        if headers.get(header, device_type) != device_type:
+            raise ValueError(f"{device_type} declares the same header as {headers[header]}: {header.hex()}")
+        headers[header] = device_type
+        self.headers[device_type] = (start, header)
+
+    def get(self, device_type: str) -> ModuleType:
+        """O(1) lookup of a parser by its device type
+
+        Args:
+            device_type (str): the parser module name, e.g. "minew_e6"
+
+        Returns:
+            ModuleType: the parser, None if there is no such device type
+        """
+        return self.parsers.get(device_type)
+
+    def pattern(self, parser: ModuleType) -> re.Pattern:
+        """gets the compiled tokens_reg_ex of a parser, compiled on first use and
+        kept for the parsers in the registry
+
+        Args:
+            parser (ModuleType): the parser module
+
+        Returns:
+            re.Pattern: the compiled tokens_reg_ex
+        """
+        device_type = device_type_of(parser)
+        pattern = self.patterns.get(device_type)
+        if pattern is None or pattern.pattern != parser.tokens_reg_ex:
+            pattern = re.compile(parser.tokens_reg_ex, re.VERBOSE)
+            if self.parsers.get(device_type) is parser:
+                self.patterns[device_type] = pattern
+        return pattern
+
+    def candidates(self, payload: bytes) -> list[str]:
+        """routes a payload by its header, without checking the full format
+
+        Args:
+            payload (bytes): the advertising data
+
+        Returns:
+            list[str]: device types whose header the payload carries,
+                usually exactly one
+        """
+        return [
+            headers[header]
+            for ((start, end), headers) in self.index.items()
+            if (header := payload[start:end]) in headers
+        ]
+
+    def accepts(self, parser: ModuleType, payload: bytes) -> bool:
+        """checks if a payload has the format of a parser
+
+        Args:
+            parser (ModuleType): the parser module
+            payload (bytes): the advertising data
+
+        Returns:
+            bool: True if the parser can decode the payload
+        """
+        layout = getattr(parser, "layout", None)
+        device_type = device_type_of(parser)
+
+        if layout is not None and self.parsers.get(device_type) is parser and device_type in self.headers:
+            (start, header) = self.headers[device_type]
+            return payload[start : start + len(header)] == header and layout.fits(payload)
+
+        return self.pattern(parser).match(payload.hex()) is not None
+
+    def decode(self, parser: ModuleType, payload: bytes) -> dict:
+        """checks the payload has the format of the parser and decodes it, with
+        the parser's layout if it has one and process_adv_data otherwise
+
+        Args:
+            parser (ModuleType): the parser module
+            payload (bytes): the advertising data
+
+        Returns:
+            dict: the decoded values, None if the payload does not fit the parser
+        """
+        if (layout := getattr(parser, "layout", None)) is not None:
+            return layout.decode(payload) if self.accepts(parser, payload) else None
+
+        if result := self.pattern(parser).match(payload.hex()):
+            # every post proc module must implement this function
+            return parser.process_adv_data(result)
+        return None
+
+    def match(self, payload: bytes) -> ModuleType:
+        """finds the parser for a payload, parsers are picked via the
+        header index first and tried one by one otherwise
+
+        Args:
+            payload (bytes): the advertising data
+
+        Returns:
+            ModuleType: the parser, None if no parser matches
+        """
+        for device_type in self.candidates(payload) + self.unindexed:
+            if self.accepts(self.parsers[device_type], payload):
+                return self.parsers[device_type]
+        return None
+
+
+@dataclass
+class ParserCache:
+    """A bounded LRU cache of tagId -> resolved parser
+
+    Tags without a parser are cached too, until negative_ttl seconds have passed
+    or their payload is routed to a different header. A cached parser is dropped
+    as soon as a payload of its tag stops matching it.
+
+    A lock guards the entries, so the cache can be saved by another thread
+    than the one resolving parsers.
+    """
+
+    registry: ParserRegistry = None
+    max_size: int = 100_000
+    negative_ttl: float = 300.0
+
+    def __post_init__(self):
+        if self.registry is None:
+            self.registry = get_registry()
+        # tagId -> device type, or (expiry, header candidates) if there is no parser.
+        # dicts keep insertion order, the least recently used tag is the first one
+        self.entries: dict[str, str | tuple] = {}
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False  # True if parsers changed since the last save/load
+        self._lock = threading.Lock()  # resolve reorders the entries on every hit
+
+    def resolve(self, tag_id: str, payload: bytes) -> ModuleType:
+        """gets the parser for a tag, from the cache if possible
+
+        Args:
+            tag_id (str): the tag id
+            payload (bytes): the advertising data
+
+        Returns:
+            ModuleType: the parser, None if no parser matches
+        """
+        with self._lock:
+            return self._resolve(tag_id, payload)
+
+    def _resolve(self, tag_id: str, payload: bytes) -> ModuleType:
+        """resolve, the caller holds the lock"""
+        if (entry := self.entries.pop(tag_id, None)) is not None:
+            if isinstance(entry, str):
+                if self.registry.accepts(parser := self.registry.parsers[entry], payload):
+                    self.entries[tag_id] = entry  # most recently used again
+                    self.hits += 1
+                    return parser
+                self.dirty = True
+            elif time.monotonic() < entry[0] and self.registry.candidates(payload) == entry[1]:
+                self.entries[tag_id] = entry
+                self.hits += 1
+                return None
+
+        self.misses += 1
+        parser = self.registry.match(payload)
+        if parser is None:
+            self._put(tag_id, (time.monotonic() + self.negative_ttl, self.registry.candidates(payload)))
+        else:
+            self._put(tag_id, device_type_of(parser))
+            self.dirty = True
+        return parser
+
+    def invalidate(self, tag_id: str) -> None:
+        """forgets the parser of a tag
+
+        Args:
+            tag_id (str): the tag id
+        """
+        with self._lock:
+            if isinstance(self.entries.pop(tag_id, None), str):
+                self.dirty = True
+
+    def parsers(self) -> dict:
+        """a snapshot of the resolved parsers, without the negative results
+
+        Returns:
+            dict: tagId -> device type
+        """
+        with self._lock:
+            return {tag_id: entry for (tag_id, entry) in self.entries.items() if isinstance(entry, str)}
+
+    def _put(self, tag_id: str, entry: str | tuple) -> None:
+        """adds an entry and evicts the least recently used ones, the caller holds the lock"""
+        self.entries.pop(tag_id, None)
+        self.entries[tag_id] = entry
+        while len(self.entries) > self.max_size:
+            del self.entries[next(iter(self.entries))]
+
+    def save(self, path: Path) -> None:
+        """writes the resolved parsers, not the negative results, to a json file
+
+        Args:
+            path (Path): the file to write
+        """
+        parsers = self.parsers()
+        with open(path, "w") as json_file:
+            json.dump(parsers, json_file)
+        self.dirty = False
+
+    def load(self, path: Path) -> None:
+        """warms the cache from a file written by save, unknown device
+        types are skipped and a missing file is not an error
+
+        Args:
+            path (Path): the file to read
+        """
+        try:
+            with open(path) as json_file:
+                parsers = json.load(json_file)
+        except FileNotFoundError:
+            return
+
+        with self._lock:
+            for (tag_id, device_type) in parsers.items():
+                if device_type in self.registry.parsers:
+                    self._put(tag_id, device_type_of(self.registry.parsers[device_type]))
+            self.dirty = False
+
+
+def device_type_of(parser: ModuleType) -> str:
+    """the device type of a parser is the last part of its module name
+
+    Args:
+        parser (ModuleType): the parser module
+
+    Returns:
+        str: the device type, e.g. "sensortags.parsers.minew_s1" -> "minew_s1"
+    """
+    return sys.intern(parser.__name__.rsplit(".", 1)[-1])  # one shared string per device type
+
+
+@cache
+def get_registry() -> ParserRegistry:
+    """the registry of the default parsers package, created on first use
+
+    Returns:
+        ParserRegistry: the shared registry
+    """
+    return ParserRegistry()
+
+
+@cache
+def get_parser_cache() -> ParserCache:
+    """the tagId -> parser cache of the shared registry, created on first use
+
+    Returns:
+        ParserCache: the shared cache
+    """
+    return ParserCache(get_registry())
@@ -5,15 +5,15 @@
     data to an influx db instance.
 """
 
-import importlib
-import json
 import warnings
-from ast import Raise
-from dataclasses import dataclass, fields
+from dataclasses import dataclass, field, fields
 from functools import cache
-from pathlib import Path
-from re import VERBOSE, Match, compile, match
 from types import ModuleType
+from typing import Callable
+
+from sensortags.lineprotocol import LineProtocolBuffer
+from sensortags.payloads import payload_to_bytes
+from sensortags.registry import device_type_of, get_parser_cache, get_registry
 
 
 @dataclass
@@ -47,20 +47,55 @@ class InfluxPoint:
                     "fields": {"water_level": 1.0},
                 }
         """
-        if tag_keys is None:
-            tag_keys = []
-        if fields_to_ignore is None:
-            fields_to_ignore = []
-
-        return {
-            "measurement": measurement_key,
-            "tags": {key: val for (key, val) in data.items() if key in tag_keys},
-            "fields": {
-                key: val
-                for (key, val) in data.items()
-                if (key not in tag_keys and key != measurement_key and key not in fields_to_ignore)
-            },
-        }
+        return InfluxPoint.point_converter(
+            measurement_key,
+            tuple(tag_keys or ()),
+            frozenset(fields_to_ignore or ()),
+        )(data)
+
+    @staticmethod
+    @cache
+    def point_converter(
+        measurement_key: str,
+        tag_keys: tuple = (),
+        fields_to_ignore: frozenset = frozenset(),
+        ignore_non_public: bool = False,
+    ) -> Callable[[dict], dict]:
+        """builds, once per configuration, the function that turns a dict into
+        an influx point dict. Keys are looked up in sets instead of lists.
+
+        Args:
+            measurement_key (str): the key to group by
+            tag_keys (tuple, optional): the tag keys. Defaults to ().
+            fields_to_ignore (frozenset, optional): fields not to use. Defaults to frozenset().
+            ignore_non_public (bool, optional): also ignore fields beginning with '_'. Defaults to False.
+
+        Returns:
+            Callable[[dict], dict]: the converter, see dict_to_influx_point_dict
+        """
+        not_fields = frozenset(tag_keys) | fields_to_ignore | {measurement_key}
+
+        if ignore_non_public:
+
+            def convert(data: dict) -> dict:
+                return {
+                    "measurement": measurement_key,
+                    "tags": {key: data[key] for key in tag_keys if key in data},
+                    "fields": {
+                        key: val for (key, val) in data.items() if key not in not_fields and key[0] != "_"
+                    },
+                }
+
+        else:
+
+            def convert(data: dict) -> dict:
+                return {
+                    "measurement": measurement_key,
+                    "tags": {key: data[key] for key in tag_keys if key in data},
+                    "fields": {key: val for (key, val) in data.items() if key not in not_fields},
+                }
+
+        return convert
 
     @classmethod
     def from_any_dict(cls, raw_data: dict):
@@ -77,15 +112,18 @@ class InfluxPoint:
         Returns:
             InfluxPoint (InfluxPoint): class instance of the caller
         """
-        # get the field names
-        class_fields = list(cls.__dict__["__dataclass_fields__"].keys())
-
-        # drop the leading '_'
-        class_fields = list(map(lambda x: x[1::] if x[0] == "_" else x, class_fields))
+        return cls(**{name: raw_data[key] for (key, name) in cls._input_keys() if key in raw_data})
 
-        attr_values = {key: val for (key, val) in raw_data.items() if key in class_fields}
+    @classmethod
+    @cache
+    def _input_keys(cls) -> tuple:
+        """the (input dict key, field name) pairs of a class, built once per class
 
-        return cls(**attr_values)
+        Returns:
+            tuple: the init field names with the leading '_' dropped from the dict keys
+        """
+        names = [f.name for f in fields(cls) if f.init]
+        return tuple((name[1::] if name[0] == "_" else name, name) for name in names)
 
     def _get_non_public_attrs(self) -> list:
         """nonpublic function returning all attributes beggining with '_'
@@ -112,24 +150,64 @@ class InfluxPoint:
                 for fields in the returned dict. Defaults to all public attributes.
             measurement_key (str, optional): Defaults to Class Name.
             tag_keys (list, optional): keys to look up as tags. Defaults to None.
-            fields_to_ignore (list, optional): Keys that will not be aggregated.
-                Defaults to nonpublic attribute names.
+            fields_to_ignore (list, optional): Keys that will not be aggregated,
+                in addition to nonpublic attribute names. Defaults to None.
 
         Returns:
             dict: in the format of an influx_db point
         """
-        if fields_to_ignore is None:
-            fields_to_ignore = self._get_non_public_attrs()
-        else:
-            fields_to_ignore += self._get_non_public_attrs()
+        converter = self.point_converter(
+            "GatewayTags" if measurement_key is None else measurement_key,
+            tuple(tag_keys or ()),
+            frozenset(fields_to_ignore or ()),
+            ignore_non_public=True,
+        )
+        return converter(self.__dict__ if instance_attrs is None else instance_attrs)
+
+    @staticmethod
+    @cache
+    def _line_protocol_keys(measurement_key: str, tag_keys: tuple, fields_to_ignore: frozenset) -> tuple:
+        """the sorted tag keys and the keys that are not fields, built once per configuration"""
+        return (tuple(sorted(tag_keys)), frozenset(tag_keys) | fields_to_ignore | {measurement_key})
+
+    def write_line_protocol(
+        self,
+        buffer: LineProtocolBuffer,
+        instance_attrs: dict = None,
+        measurement_key: str = None,
+        tag_keys: list = None,
+        fields_to_ignore: list = None,
+        timestamp: int = None,
+    ) -> bool:
+        """appends the point as_influx_point_dict would give to a line protocol
+        buffer, without creating the point dict
 
-        if instance_attrs is None:
-            instance_attrs = self.__dict__
+        Args:
+            buffer (LineProtocolBuffer): the buffer of the batch
+            instance_attrs (dict, optional): see as_influx_point_dict
+            measurement_key (str, optional): see as_influx_point_dict
+            tag_keys (list, optional): see as_influx_point_dict
+            fields_to_ignore (list, optional): see as_influx_point_dict
+            timestamp (int, optional): in ms. Defaults to None, the time influx DB receives it.
 
+        Returns:
+            bool: False if there were no fields to write
+        """
         if measurement_key is None:
             measurement_key = "GatewayTags"
+        (tag_keys, not_fields) = self._line_protocol_keys(
+            measurement_key,
+            tuple(tag_keys or ()),
+            frozenset(fields_to_ignore or ()),
+        )
+        data = self.__dict__ if instance_attrs is None else instance_attrs
 
-        return self.dict_to_influx_point_dict(instance_attrs, measurement_key, tag_keys, fields_to_ignore)
+        return buffer.append(
+            measurement_key,
+            ((key, data.get(key)) for key in tag_keys),
+            ((key, val) for (key, val) in data.items() if key not in not_fields and key[0] != "_"),
+            timestamp,
+        )
 
 
 @dataclass
@@ -177,6 +255,18 @@ class QpeInfoData(InfluxPoint):
             data = self.__dict__
         return super().as_influx_point_dict(data, measurement_key, tag_keys, fields_to_ignore)
 
+    def write_line_protocol(
+        self,
+        buffer: LineProtocolBuffer,
+        data: dict = None,
+        measurement_key: str = "projectName",
+        tag_keys: list = None,
+        fields_to_ignore: list = None,
+        timestamp: int = None,
+    ) -> bool:
+        """line protocol counterpart of as_influx_point_dict, see InfluxPoint.write_line_protocol"""
+        return super().write_line_protocol(buffer, data, measurement_key, tag_keys, fields_to_ignore, timestamp)
+
 
 @dataclass
 class GatewayTag(InfluxPoint):
@@ -184,8 +274,8 @@ class GatewayTag(InfluxPoint):
     class field values and finding a parser for
     the data given. Finding the correct parser is done after
     creation, but could be done before hand to aid in extension
-    via inheritance. The module function: get_parser_for_tag_id
-    is external and cached for this purpose...
+    via inheritance. The static method: get_parser_for_tag_id
+    is backed by the shared registry and a per tagId cache for this purpose...
     """
 
     tagId: str
@@ -195,6 +285,28 @@ class GatewayTag(InfluxPoint):
     advertisingDataPayloadLocatorId: str
     advertisingDataPayloadLocatorName: str
     _packet_type: str = None
+    # a cache of payload_bytes(), not an input, so not in from_any_dict, repr or eq
+    _payload_bytes: bytes = field(default=None, init=False, repr=False, compare=False)
+
+    # raw data that is not posted to influx DB (not a field, no annotation)
+    _influx_fields_to_ignore = frozenset(
+        [
+            "advertisingDataPayload",
+            "advertisingDataPayloadTS",
+            "advertisingDataPayloadSignalStrength",
+            "advertisingDataPayloadLocatorName",
+        ]
+    )
+
+    def payload_bytes(self) -> bytes:
+        """the advertisingDataPayload as bytes, converted on first use and cached
+
+        Returns:
+            bytes: the advertising data
+        """
+        if self._payload_bytes is None:
+            self._payload_bytes = payload_to_bytes(self.advertisingDataPayload)
+        return self._payload_bytes
 
     def tokenize_data(self, device_type: str = None, parser: ModuleType = None) -> bool:
         """attempts to load a parser if none is provided and then
@@ -208,7 +320,7 @@ class GatewayTag(InfluxPoint):
             bool: False on failure to parse, True on success
         """
 
-        adv_data = "".join([byte[2::] for byte in self.advertisingDataPayload.split(" ")])  # 0xbe 0xac ... -> beac...
+        adv_data = self.payload_bytes()  # 0xbe 0xac ... -> b"\xbe\xac..."
 
         if not parser:
             parser = self.get_parser_for_tag_id(self.tagId, adv_data, device_type)
@@ -216,67 +328,48 @@ class GatewayTag(InfluxPoint):
         if not parser:  # if a parser could not me identified
             return False
 
-        if result := match(parser.tokens_reg_ex, adv_data, VERBOSE):
-            setattr(self, "_parser", parser)  # store token to instance attributes
-            self._packet_type = parser.__name__.split(".")[2]
+        values: dict = get_registry().decode(parser, adv_data)
 
-            # every post proc module must implement this function
-            values: dict = parser.process_adv_data(result)
+        if values is None:  # adv data did not match the format expected by parser
+            return False
 
-            for (name, val) in values.items():
-                setattr(self, name, val)  # store values as attributes pm this class instance
+        setattr(self, "_parser", parser)  # store token to instance attributes
+        self._packet_type = device_type_of(parser)
 
-            return True
+        for (name, val) in values.items():
+            setattr(self, name, val)  # store values as attributes pm this class instance
 
-        else:  # adv data did not match the format expected by parser
-            return False
+        return True
 
     @staticmethod
-    def get_parser_for_tag_id(id: str, payload: str, device_type: str = None) -> ModuleType:
-        """parses files in parsers/ dir until tag id
-        that is associated with a parser is found. Alternatively
-        if and ID based match isn't made an attempt to match based
-        on the packet format is also made.
+    def get_parser_for_tag_id(id: str, payload: bytes, device_type: str = None) -> ModuleType:
+        """looks up the parser registered for the device type. Alternatively
+        if a device type isn't given or known an attempt to match based
+        on the packet format is also made, the result of which is cached per tag id.
 
         Args:
             id (str): tag id to be found
+            payload (bytes): advertising data, QPE's "0x02 0x01 ..." strings are converted
+            device_type (str, optional): parser module name. Defaults to None.
 
         Returns:
-            dict: parser if found, empty dict otherwise
+            ModuleType: parser if found, None otherwise
         """
+        registry = get_registry()
+        if isinstance(payload, str):
+            payload = payload_to_bytes(payload)
 
-        for fp in Path("src/sensortags/parsers").iterdir():
-            if device_type == fp.stem:
-                try:
-                    parser_mod = importlib.import_module(f"sensortags.parsers.{fp.stem}")
-
-                    return parser_mod
+        if device_type:
+            if parser := registry.get(device_type):
+                return parser
 
-                except ImportError:
-                    warnings.warn(
-                        f"""A device type was specified for device id: {id} 
-                        but a parser could not be found. 
-                        Maybe the type name was misspelled...""",
-                    )
-                    return None
+            warnings.warn(
+                f"""A device type was specified for device id: {id}
+                but a parser could not be found.
+                Maybe the type name was misspelled...""",
+            )
 
-            elif fp.suffix == ".py":
-                try:
-                    if "init" not in fp.stem:
-                        parser_mod = importlib.import_module(f"sensortags.parsers.{fp.stem}")
-
-                    else:
-                        continue
-
-                    if match(parser_mod.tokens_reg_ex, payload, VERBOSE):
-                        return parser_mod
-
-                except ImportError as e:
-                    # if a post proc module could not be found this is
-                    # almost 100% a critical error
-                    raise ImportError(f"{fp.name} should be an importable module but is not") from e
-
-        return None
+        return get_parser_cache().resolve(id, payload)
 
     def as_influx_point_dict(
         self,
@@ -286,20 +379,10 @@ class GatewayTag(InfluxPoint):
         fields_to_ignore: list = None,
     ) -> dict:
         """formatting override to base class method"""
-        if not fields_to_ignore:
-            fields_to_ignore = [
-                "advertisingDataPayload",
-                "advertisingDataPayloadTS",
-                "advertisingDataPayloadSignalStrength",
-                "advertisingDataPayloadLocatorName",
-            ]
+        if fields_to_ignore:
+            fields_to_ignore = self._influx_fields_to_ignore.union(fields_to_ignore)
         else:
-            fields_to_ignore += [
-                "advertisingDataPayload",
-                "advertisingDataPayloadTS",
-                "advertisingDataPayloadSignalStrength",
-                "advertisingDataPayloadLocatorName",
-            ]
+            fields_to_ignore = self._influx_fields_to_ignore
 
         return super().as_influx_point_dict(
             fields,
@@ -307,3 +390,28 @@ class GatewayTag(InfluxPoint):
             tag_keys,
             fields_to_ignore,
         )
+
+    def write_line_protocol(
+        self,
+        buffer: LineProtocolBuffer,
+        fields: dict = None,
+        measurement_key: str = None,
+        tag_keys: list = None,
+        fields_to_ignore: list = None,
+        timestamp: int = None,
+    ) -> bool:
+        """line protocol counterpart of as_influx_point_dict, timestamped
+        with advertisingDataPayloadTS unless a timestamp is given"""
+        if fields_to_ignore:
+            fields_to_ignore = self._influx_fields_to_ignore.union(fields_to_ignore)
+        else:
+            fields_to_ignore = self._influx_fields_to_ignore
+
+        return super().write_line_protocol(
+            buffer,
+            fields,
+            self._packet_type,
+            tag_keys,
+            fields_to_ignore,
+            self.advertisingDataPayloadTS if timestamp is None else timestamp,
+        )
@@ -0,0 +1,188 @@
+"""Synthetic getTagData data, for benchmarks and load tests
+
+Generates tags in the shape of a getTagData ALL_ITEMS response, mixing the
+advertising frames of every supported packet type with frames no parser
+accepts and with tags that have no gateway data at all. The output is
+deterministic for a given seed so runs can be compared.
+
+evolve_frame gives the next frame of a tag, with the measurements drifting
+around those of its first frame and the counters counting up, as a real
+sensor would report them over time.
+
+Typical usage:
+
+    tags = synthetic_tags(10_000, seed=1)
+    body = tag_data_response(tags)  # bytes, as QPE would send them
+"""
+
+import json
+import random
+import struct
+
+from sensortags.layouts import FrameLayout
+
+# one frame of every supported packet type, see tests/layouts_test.py
+SAMPLE_FRAMES = {
+    "minew_e6": "0201060303e1ff0d16e1ffa10264016b9aa23f23ac",
+    "minew_s1": "0201060303e1ff1016e1ffa101640a304c593182ab3f23ac",
+    "minew_s4_alarm": "02010612ff3906a40164010101ff0677aa3f23ac3b5a",
+    "ruuvi_raw_v1": "02010611ff990403658145c71effcafff404050b71",
+    "ruuvi_raw_v2_f5": "02010611ff99040512fc5394c37c0004fffc040cac364200cdcbb8334c884f",
+}
+# frames of other devices, or cut short, that no parser accepts
+UNPARSEABLE_FRAMES = [
+    "0201061aff4c000215e2c56db5dffb48d2b060d0f5a71096e000010002c5",  # an iBeacon
+    "02010611ff9904",  # a ruuvi frame cut short
+    "0201060303aafe",
+]
+TIMESTAMP = 1_650_000_000_000  # ms
+
+# measurements that drift from frame to frame, field name -> largest raw step per frame
+DRIFTING_FIELDS = {
+    "temperature": 8,
+    "humidity": 8,
+    "pressure": 4,
+    "acceleration_x": 16,
+    "acceleration_y": 16,
+    "acceleration_z": 16,
+    "_temperature_fraction": 4,
+}
+# counters that count up by one every frame
+COUNTING_FIELDS = ("measurement_sequence_number",)
+# flags that are 0 or 1, a random one every frame
+FLAG_FIELDS = ("light_sensor_value",)
+
+
+def qpe_payload(frame: str) -> str:
+    """formats a hex frame the way QPE reports advertisingDataPayload
+
+    Args:
+        frame (str): e.g. "020106"
+
+    Returns:
+        str: e.g. "0x02 0x01 0x06"
+    """
+    return " ".join(f"0x{frame[i:i + 2]}" for i in range(0, len(frame), 2))
+
+
+def all_items_tag(index: int, frame: str = None, timestamp: int = TIMESTAMP, locator: int = 0) -> dict:
+    """a tag as getTagData with format ALL_ITEMS reports it
+
+    Args:
+        index (int): numbers the tag, its tagId is derived from it
+        frame (str, optional): hex advertising frame. Defaults to None, no gateway data.
+        timestamp (int, optional): ms of the location and frame. Defaults to TIMESTAMP.
+        locator (int, optional): numbers the locator that heard the frame. Defaults to 0.
+
+    Returns:
+        dict: the tag
+    """
+    gateway = frame is not None
+    return {
+        "tagId": f"a4da22{index:06x}",
+        "tagName": f"tag {index}",
+        "tagGroupName": None,
+        "color": "#FF0000",
+        "location": [round(index % 100 * 0.5, 2), round(index // 100 % 100 * 0.5, 2), 1.2],
+        "locationTS": timestamp,
+        "locationCoordSysId": "coordsys",
+        "locationZones": [{"id": "zone", "name": "Zone"}],
+        "locationRadius": 0.5,
+        "locationMovementStatus": "stationary",
+        "rssiLocator": f"0011223344{locator % 256:02x}",
+        "rssi": -60.0,
+        "battery": 3.0,
+        "button1State": "notPushed",
+        "configStatus": "done",
+        "lastPacketTS": timestamp,
+        "advertisingDataPayload": qpe_payload(frame) if gateway else None,
+        "advertisingDataPayloadTS": timestamp if gateway else None,
+        "advertisingDataPayloadSignalStrength": -60.0 if gateway else None,
+        "advertisingDataPayloadLocatorId": f"0011223344{locator % 256:02x}" if gateway else None,
+        "advertisingDataPayloadLocatorName": f"locator {locator}" if gateway else None,
+    }
+
+
+def synthetic_tags(
+    count: int,
+    gateway_ratio: float = 0.5,
+    unparseable_ratio: float = 0.05,
+    locators: int = 16,
+    seed: int = 0,
+) -> list[dict]:
+    """tags of every supported packet type, evenly mixed
+
+    Args:
+        count (int): the number of tags
+        gateway_ratio (float, optional): of the tags with an advertising frame. Defaults to 0.5.
+        unparseable_ratio (float, optional): of the frames no parser accepts. Defaults to 0.05.
+        locators (int, optional): locators the frames were heard by. Defaults to 16.
+        seed (int, optional): the same seed gives the same tags. Defaults to 0.
+
+    Returns:
+        list[dict]: the tags, in ALL_ITEMS format
+    """
+    rng = random.Random(seed)
+    frames = list(SAMPLE_FRAMES.values())
+    tags = []
+    for index in range(count):
+        frame = None
+        if rng.random() < gateway_ratio:
+            frame = rng.choice(UNPARSEABLE_FRAMES if rng.random() < unparseable_ratio else frames)
+        tags.append(all_items_tag(index, frame, TIMESTAMP + index, rng.randrange(locators)))
+    return tags
+
+
+def tag_data_response(tags: list[dict], **top_level) -> bytes:
+    """the body of a getTagData response
+
+    Args:
+        tags (list[dict]): the tags
+        **top_level: other keys of the response, e.g. code=11
+
+    Returns:
+        bytes: the json body
+    """
+    response = {"code": 0, "command": "getTagData", "responseTS": TIMESTAMP, "tags": tags}
+    response.update(top_level)
+    return json.dumps(response).encode()
+
+
+def evolve_frame(frame: bytes, first_frame: bytes, layout: FrameLayout, rng: random.Random) -> bytes:
+    """the next frame of a tag: every drifting measurement takes a random step,
+    pulled back towards its value in the first frame so it stays realistic,
+    the counters count up and the flags are flipped at random
+
+    Args:
+        frame (bytes): the current frame
+        first_frame (bytes): the frame the tag started with
+        layout (FrameLayout): the layout of the frame's packet type
+        rng (random.Random): the source of the steps
+
+    Returns:
+        bytes: the next frame
+    """
+    data = bytearray(frame)
+    for field in layout.fields:
+        if field.raw or field.shift or field.mask is not None:
+            continue
+        counting = field.name in COUNTING_FIELDS
+        flag = field.name in FLAG_FIELDS
+        if not counting and not flag and field.name not in DRIFTING_FIELDS:
+            continue
+
+        fmt = layout.byte_order + field.format
+        (raw,) = struct.unpack_from(fmt, data, field.offset)
+        bits = 8 * field.width
+        if flag:
+            raw = rng.randint(0, 1)
+        elif counting:
+            raw = (raw + 1) % (1 << bits)
+        else:
+            (start,) = struct.unpack_from(fmt, first_frame, field.offset)
+            step = DRIFTING_FIELDS[field.name]
+            raw += rng.randint(-step, step) - (raw - start) // 8
+            (low, high) = (-(1 << bits - 1), (1 << bits - 1) - 1) if field.signed else (0, (1 << bits) - 1)
+            raw = min(high, max(low, raw))
+        struct.pack_into(fmt, data, field.offset, raw)
+    return bytes(data)
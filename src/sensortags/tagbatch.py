@@ -0,0 +1,146 @@
+"""A columnar container for one getTagData poll
+
+Instead of one GatewayTag per tag, a TagBatch holds the tags of a poll as
+parallel columns: python lists for the (interned) ids, arrays for the numbers
+and a single buffer holding every payload. Filtering, slicing and grouping
+only gather row indexes, the payload buffer is shared and never copied.
+
+Typical usage:
+
+    batch = TagBatch.from_tags(qpe_response["tags"])
+    for (packet_type, tags) in batch.group_by_packet_type().items():
+        ...
+    decoded = sensortags.vectorized.decode_batch(batch)  # column wise, with numpy
+"""
+
+import sys
+from array import array
+from dataclasses import dataclass
+from typing import Iterable
+
+from sensortags.payloads import payloads_to_buffer
+from sensortags.registry import ParserCache, device_type_of, get_parser_cache
+
+
+@dataclass
+class TagBatch:
+    """Parallel columns of the tags of a poll, row i of every column is the same tag"""
+
+    tag_ids: list  # str
+    locator_ids: list  # str, advertisingDataPayloadLocatorId
+    timestamps: array  # "q", advertisingDataPayloadTS in ms
+    signal_strengths: array  # "d", advertisingDataPayloadSignalStrength
+    payload_data: bytes  # every payload back to back, shared between batches
+    payload_starts: array  # "Q", where each row's payload starts in payload_data
+    payload_ends: array  # "Q", where each row's payload ends in payload_data
+
+    @classmethod
+    def from_tags(cls, tags: list):
+        """builds a batch from the tags of a getTagData response, tags
+        without gateway data are left out
+
+        Args:
+            tags (list[dict]): the "tags" of the response
+
+        Returns:
+            TagBatch: the batch
+        """
+        tags = [tag for tag in tags if tag["advertisingDataPayload"] is not None]
+        (payload_data, offsets) = payloads_to_buffer([tag["advertisingDataPayload"] for tag in tags])
+
+        return cls(
+            [sys.intern(tag["tagId"]) for tag in tags],
+            [sys.intern(tag["advertisingDataPayloadLocatorId"]) for tag in tags],
+            array("q", [tag["advertisingDataPayloadTS"] for tag in tags]),
+            array("d", [tag["advertisingDataPayloadSignalStrength"] for tag in tags]),
+            payload_data,
+            offsets[:-1],
+            offsets[1:],
+        )
+
+    def __len__(self) -> int:
+        return len(self.tag_ids)
+
+    def __getitem__(self, rows: slice):
+        """a slice of the batch, e.g. batch[:100]
+
+        Args:
+            rows (slice): the rows to keep
+
+        Returns:
+            TagBatch: the rows, sharing the payload buffer
+        """
+        if not isinstance(rows, slice):
+            raise TypeError("TagBatch can only be sliced, use payload(row) or take([row]) for single rows")
+
+        return TagBatch(
+            self.tag_ids[rows],
+            self.locator_ids[rows],
+            self.timestamps[rows],
+            self.signal_strengths[rows],
+            self.payload_data,
+            self.payload_starts[rows],
+            self.payload_ends[rows],
+        )
+
+    def payload(self, row: int) -> bytes:
+        """the advertising data of a row
+
+        Args:
+            row (int): the row
+
+        Returns:
+            bytes: the advertising data
+        """
+        return self.payload_data[self.payload_starts[row] : self.payload_ends[row]]
+
+    def take(self, rows: Iterable[int]):
+        """gathers rows in the given order
+
+        Args:
+            rows (Iterable[int]): row indexes, e.g. a list or numpy array
+
+        Returns:
+            TagBatch: the rows, sharing the payload buffer
+        """
+        rows = list(rows)
+        return TagBatch(
+            [self.tag_ids[row] for row in rows],
+            [self.locator_ids[row] for row in rows],
+            array("q", [self.timestamps[row] for row in rows]),
+            array("d", [self.signal_strengths[row] for row in rows]),
+            self.payload_data,
+            array("Q", [self.payload_starts[row] for row in rows]),
+            array("Q", [self.payload_ends[row] for row in rows]),
+        )
+
+    def filter(self, keep: Iterable[bool]):
+        """keeps the rows for which keep is True
+
+        Args:
+            keep (Iterable[bool]): one flag per row, e.g. a numpy boolean array
+
+        Returns:
+            TagBatch: the kept rows
+        """
+        return self.take(row for (row, flag) in enumerate(keep) if flag)
+
+    def group_by_packet_type(self, parser_cache: ParserCache = None) -> dict:
+        """splits the batch by the parser of each row, rows without a parser
+        are grouped under None
+
+        Args:
+            parser_cache (ParserCache, optional): Defaults to the shared cache.
+
+        Returns:
+            dict: packet type -> TagBatch
+        """
+        if parser_cache is None:
+            parser_cache = get_parser_cache()
+
+        groups: dict[str, list] = {}
+        for (row, tag_id) in enumerate(self.tag_ids):
+            parser = parser_cache.resolve(tag_id, self.payload(row))
+            groups.setdefault(device_type_of(parser) if parser else None, []).append(row)
+
+        return {packet_type: self.take(rows) for (packet_type, rows) in groups.items()}
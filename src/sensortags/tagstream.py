@@ -0,0 +1,221 @@
+"""Streaming ingestion of getTagData responses
+
+A getTagData response with format ALL_ITEMS holds every key of every tag, tens
+of MB on a large site, while only the tags with gateway data and a handful of
+their keys are used. Instead of parsing the whole response, iter_gateway_tags
+reads it chunk by chunk and walks the "tags" array one tag object at a time.
+The extent of a tag is found by a regex scan that skips over strings, tags
+without an advertisingDataPayload are dropped without being decoded, and only
+the keys GatewayTag needs are kept of the others. Memory use stays at one
+chunk plus one tag, whatever the number of tags.
+
+Typical usage:
+
+    res = session.get(qpe_urls.get_tag_data_all_items, stream=True)
+    stream = TagStream(res.iter_content(64 * 1024))
+    for tag in stream:
+        ...
+    if stream.response["code"] != 0:
+        ...
+"""
+
+import codecs
+import json
+from re import compile
+from typing import Iterable, Iterator
+
+# the getTagData keys GatewayTag.from_any_dict uses
+GATEWAY_KEYS = (
+    "tagId",
+    "advertisingDataPayload",
+    "advertisingDataPayloadTS",
+    "advertisingDataPayloadSignalStrength",
+    "advertisingDataPayloadLocatorId",
+    "advertisingDataPayloadLocatorName",
+)
+
+# skips everything up to the next brace that is not in a string, unrolled so it never backtracks
+_SKIP_TO_BRACE = compile(r'[^"{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"{}]*)*')
+_WHITESPACE = compile(r"[ \t\n\r]*")
+# the value after a key, to tell a string from null
+_KEY_VALUE = compile(r'\s*:\s*(.)')
+_PAYLOAD_KEY = '"advertisingDataPayload"'
+
+
+def has_payload(text: str, start: int, end: int) -> bool:
+    """checks if the tag object text[start:end] has a non null advertisingDataPayload
+
+    Args:
+        text (str): json text
+        start (int): the index of the tag's "{"
+        end (int): the index after its "}"
+
+    Returns:
+        bool: True if the advertisingDataPayload is a string
+    """
+    key = text.find(_PAYLOAD_KEY, start, end)  # str.find, much faster than a regex search
+    if key == -1:
+        return False
+    value = _KEY_VALUE.match(text, key + len(_PAYLOAD_KEY), end)
+    return value is not None and value.group(1) == '"'
+
+
+def object_end(text: str, start: int) -> int:
+    """finds the end of the json object starting at text[start]
+
+    Args:
+        text (str): json text
+        start (int): the index of a "{"
+
+    Returns:
+        int: the index after its closing "}", None if text ends before it
+    """
+    depth = 0
+    position = start
+    length = len(text)
+    while True:
+        position = _SKIP_TO_BRACE.match(text, position).end()
+        if position >= length or text[position] == '"':  # cut short, in a string or before the brace
+            return None
+        depth += 1 if text[position] == "{" else -1
+        position += 1
+        if depth == 0:
+            return position
+
+
+class TagStream:
+    """Iterates the gateway tags of a getTagData response read in chunks
+
+    The other top level keys of the response, e.g. "code", are collected in
+    self.response while iterating, and are complete once iteration ends.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], keys: tuple = GATEWAY_KEYS, gateway_only: bool = True):
+        """
+        Args:
+            chunks (Iterable[bytes]): the response body, e.g. Response.iter_content(64 * 1024)
+            keys (tuple, optional): the keys kept of each tag. Defaults to GATEWAY_KEYS.
+            gateway_only (bool, optional): drop tags without an advertisingDataPayload
+                without decoding them. Defaults to True.
+        """
+        self.chunks = iter(chunks)
+        self.keys = keys
+        self.gateway_only = gateway_only
+        self.response: dict = {}  # top level keys other than "tags"
+        self.skipped = 0  # tags dropped without being decoded
+        self.bytes_read = 0  # of the response body
+
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._text = ""
+        self._position = 0
+        self._eof = False
+
+    def _read(self) -> bool:
+        """appends the next chunk to the text, dropping what was consumed
+
+        Returns:
+            bool: False at the end of the response
+        """
+        if self._eof:
+            return False
+        self._text = self._text[self._position :]
+        self._position = 0
+        try:
+            chunk = next(self.chunks)
+            self.bytes_read += len(chunk)
+            self._text += self._decoder.decode(chunk)
+        except StopIteration:
+            self._text += self._decoder.decode(b"", final=True)
+            self._eof = True
+        return True
+
+    def _next_char(self) -> str:
+        """skips whitespace, reading more if needed
+
+        Returns:
+            str: the next character, not consumed, "" at the end of the response
+        """
+        while True:
+            self._position = _WHITESPACE.match(self._text, self._position).end()
+            if self._position < len(self._text):
+                return self._text[self._position]
+            if not self._read():
+                return ""
+
+    def _expect(self, chars: str) -> str:
+        char = self._next_char()
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at {self._position} of the response, got {char!r}")
+        self._position += 1
+        return char
+
+    def _value(self):
+        """decodes the next json value, reading more until it is complete"""
+        self._next_char()
+        while True:
+            try:
+                (value, end) = self._json.raw_decode(self._text, self._position)
+                # a number at the very end of the text might continue in the next chunk
+                if end < len(self._text) or self._eof:
+                    self._position = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._read()
+
+    def __iter__(self) -> Iterator[dict]:
+        self._expect("{")
+        if self._next_char() == "}":
+            self._position += 1
+            return
+
+        while True:
+            key = self._value()
+            self._expect(":")
+            if key == "tags" and self._next_char() == "[":
+                self._position += 1
+                yield from self._tags()
+            else:
+                self.response[key] = self._value()
+
+            if self._expect(",}") == "}":
+                return
+
+    def _tags(self) -> Iterator[dict]:
+        """walks the tags array, the opening "[" is consumed already"""
+        if self._next_char() == "]":
+            self._position += 1
+            return
+
+        while True:
+            if self._next_char() != "{":  # not a tag object, decoded and ignored
+                self._value()
+            else:
+                while (end := object_end(self._text, self._position)) is None:
+                    if not self._read():
+                        raise ValueError("The response ended inside a tag")
+
+                if self.gateway_only and not has_payload(self._text, self._position, end):
+                    self.skipped += 1
+                else:
+                    tag = json.loads(self._text[self._position : end])
+                    yield {key: tag[key] for key in self.keys if key in tag}
+                self._position = end
+
+            if self._expect(",]") == "]":
+                return
+
+
+def iter_gateway_tags(chunks: Iterable[bytes], keys: tuple = GATEWAY_KEYS) -> Iterator[dict]:
+    """the gateway tags of a getTagData response, see TagStream
+
+    Args:
+        chunks (Iterable[bytes]): the response body
+        keys (tuple, optional): the keys kept of each tag. Defaults to GATEWAY_KEYS.
+
+    Returns:
+        Iterator[dict]: the tags with an advertisingDataPayload
+    """
+    return iter(TagStream(chunks, keys))
@@ -0,0 +1,217 @@
+"""Column wise decoding of many advertising data frames at once with numpy
+
+The frames of a poll are stacked into a 2D uint8 array (one row per frame),
+routed to their parser by comparing the header columns of every row at once
+and then decoded field by field over whole columns with the parser's
+sensortags.layouts.FrameLayout, e.g. temperature of ruuvi data format 5 is
+
+    frames[:, 8:10] viewed as big endian int16 * 0.005
+
+for every ruuvi frame in one operation.
+
+Typical usage:
+
+    frames, lengths = stack_frames(payloads_to_bytes(advertising_data_payloads))
+    for (packet_type, decoded) in decode_frames(frames, lengths).items():
+        decoded.rows  # which frames are of this packet type
+        decoded.columns["temperature"]  # array of the temperature of each of those frames
+
+or, for a sensortags.tagbatch.TagBatch, without any per tag python objects:
+
+    decoded = decode_batch(batch)  # rows are rows of the batch
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+from sensortags.layouts import Field, FrameLayout
+from sensortags.registry import ParserRegistry, get_registry
+from sensortags.tagbatch import TagBatch
+
+
+class DecodedColumns(NamedTuple):
+    """The decoded frames of one packet type"""
+
+    rows: np.ndarray  # indexes of the decoded frames in the stacked frames
+    columns: dict  # field name -> array with one value per row, raw fields are 2D uint8 arrays
+
+
+def stack_frames(payloads: list) -> tuple:
+    """stacks frames of different lengths into one array, padded with zeros
+
+    Args:
+        payloads (list[bytes]): the advertising data of each frame
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: the (n, longest frame) uint8 array and the length of each frame
+    """
+    lengths = np.fromiter(map(len, payloads), dtype=np.int64, count=len(payloads))
+    width = int(lengths.max()) if len(payloads) else 0
+    frames = np.frombuffer(b"".join(payload.ljust(width, b"\0") for payload in payloads), dtype=np.uint8)
+
+    return (frames.reshape(len(payloads), width), lengths)
+
+
+def batch_frames(batch: TagBatch) -> tuple:
+    """gathers the payloads of a batch into one array, padded with zeros,
+    straight from the batch's payload buffer
+
+    Args:
+        batch (TagBatch): the batch
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: the (n, longest frame) uint8 array and the length of each frame
+    """
+    data = np.frombuffer(batch.payload_data, dtype=np.uint8)
+    starts = np.frombuffer(batch.payload_starts, dtype=np.uint64).astype(np.int64)
+    lengths = np.frombuffer(batch.payload_ends, dtype=np.uint64).astype(np.int64) - starts
+    width = int(lengths.max()) if len(batch) else 0
+
+    # frames of the same length are gathered together, there are only a few lengths
+    frames = np.zeros((len(batch), width), dtype=np.uint8)
+    for length in np.unique(lengths):
+        rows = np.flatnonzero(lengths == length)
+        frames[rows, :length] = data[starts[rows, None] + np.arange(length)]
+
+    return (frames, lengths)
+
+
+def decode_batch(batch: TagBatch, registry: ParserRegistry = None) -> dict:
+    """decodes every row of a batch that has a parser with a layout, see decode_frames
+
+    Args:
+        batch (TagBatch): the batch
+        registry (ParserRegistry, optional): Defaults to the shared registry.
+
+    Returns:
+        dict: packet type -> DecodedColumns, the rows are rows of the batch
+    """
+    (frames, lengths) = batch_frames(batch)
+    return decode_frames(frames, lengths, registry)
+
+
+def decode_frames(frames: np.ndarray, lengths: np.ndarray, registry: ParserRegistry = None) -> dict:
+    """routes every frame to a parser by its header and decodes the frames
+    of each parser with its layout. Frames whose parser has no layout, that
+    match no header or do not fit the layout are left out and have to be
+    tokenized one by one.
+
+    Args:
+        frames (np.ndarray): (n, width) uint8 array, see stack_frames
+        lengths (np.ndarray): the real length of each frame
+        registry (ParserRegistry, optional): Defaults to the shared registry.
+
+    Returns:
+        dict: packet type -> DecodedColumns
+    """
+    if registry is None:
+        registry = get_registry()
+
+    decoded = {}
+    unrouted = np.ones(len(frames), dtype=bool)
+
+    for ((start, end), headers) in registry.index.items():
+        if end > frames.shape[1]:
+            continue
+        keys = np.ascontiguousarray(frames[:, start:end]).view(f"V{end - start}").ravel()
+
+        for (header, device_type) in headers.items():
+            layout = getattr(registry.parsers[device_type], "layout", None)
+            if layout is None:
+                continue
+
+            selected = unrouted & (keys == np.void(header)) & (lengths >= layout.length)
+            if not selected.any():
+                continue
+            selected[selected] = fits_columns(layout, frames[selected])
+            if not selected.any():
+                continue
+
+            unrouted &= ~selected
+            rows = np.flatnonzero(selected)
+            decoded[device_type] = DecodedColumns(rows, decode_columns(layout, frames[rows]))
+
+    return decoded
+
+
+def fits_columns(layout: FrameLayout, frames: np.ndarray) -> np.ndarray:
+    """FrameLayout.fits of every frame at once, for frames at least layout.length long
+
+    Args:
+        layout (FrameLayout): the layout
+        frames (np.ndarray): (n, width) uint8 array of frames
+
+    Returns:
+        np.ndarray: True for every frame that carries the constants and choices of the layout
+    """
+    fits = np.ones(len(frames), dtype=bool)
+    for (start, end, constant) in layout.constant_slices:
+        fits &= (frames[:, start:end] == np.frombuffer(constant, dtype=np.uint8)).all(axis=1)
+    for (offset, values) in layout.choices:
+        fits &= np.isin(frames[:, offset], np.frombuffer(values, dtype=np.uint8))
+    return fits
+
+
+def decode_columns(layout: FrameLayout, frames: np.ndarray) -> dict:
+    """decodes every field of a layout over all frames at once
+
+    Args:
+        layout (FrameLayout): the layout of the frames
+        frames (np.ndarray): (n, width) uint8 array of frames of this layout
+
+    Returns:
+        dict: field name -> array of values
+    """
+    # like the layout's struct.Struct, every row is viewed as a record
+    # with one member per slot of bytes, no bytes are copied for this
+    records = np.ascontiguousarray(frames).view(frame_dtype(layout, frames.shape[1])).ravel()
+    columns = {field.name: _convert_column(field, records[_slot_name(field)]) for field in layout.fields}
+
+    if layout.post_process:  # the post processing must be array-aware, see helpers.tools
+        columns = layout.post_process(columns)
+    return columns
+
+
+def frame_dtype(layout: FrameLayout, width: int) -> np.dtype:
+    """the numpy record type of a layout, for frames padded to width bytes
+
+    Args:
+        layout (FrameLayout): the layout
+        width (int): bytes per row, at least layout.length
+
+    Returns:
+        np.dtype: the record type
+    """
+    slots = {_slot_name(field): field for field in layout.fields}  # fields sharing bytes share a slot
+    return np.dtype(
+        {
+            "names": list(slots),
+            "formats": [
+                (np.uint8, (field.width,)) if field.raw else layout.byte_order + field.format
+                for field in slots.values()
+            ],
+            "offsets": [field.offset for field in slots.values()],
+            "itemsize": width,
+        }
+    )
+
+
+def _slot_name(field: Field) -> str:
+    return f"{field.offset}:{field.format}"
+
+
+def _convert_column(field: Field, column: np.ndarray) -> np.ndarray:
+    if field.raw:
+        return column
+
+    values = column.astype(np.int64)
+    if field.shift:
+        values >>= field.shift
+    if field.mask is not None:
+        values &= field.mask
+    if field.scale != 1:
+        values = values * field.scale
+    if field.add != 0:
+        values = values + field.add
+    return values
@@ -18,15 +18,21 @@ The general process is as follows:
 - If configuration is successful, add the tags to a group that denotes that
 - Sleep and Repeat
 
+The script does not depend on other files of this repository, its self metrics
+are a small inline version of helpers.metrics.
+
 """
 
 
 __author__ = "Quuppa"
 
 
-from pprint import pprint
+import json
+import threading
 import time
 import urllib.parse as urlparse
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pprint import pprint
 
 import requests
 
@@ -34,8 +40,10 @@ import requests
 ################# url strings #################
 QPE_SERVER = "http://localhost:8080"
 # for this script, the getTagData format will not change. Query parameters can be hardcoded
+# maxAge (ms) leaves out tags that have not been heard from in a minute,
+# they could not be configured anyway, keeping the response small on large sites
 tag_data_url = urlparse.urljoin(
-    QPE_SERVER, "qpe/getTagData?mode=json&format=defaultInfo"
+    QPE_SERVER, "qpe/getTagData?mode=json&format=defaultInfo&maxAge=60000"
 )
 config_url = urlparse.urljoin(QPE_SERVER, "qpe/configureTag")
 group_url = urlparse.urljoin(QPE_SERVER, "/qpe/setTagGroup")
@@ -46,6 +54,19 @@ CONFIG_ID = "ASSET_TAG"
 CHANNEL = "37"  # options are 37 BLE or 230 QProprietary
 TARGET_GROUP_NAME = "AutoConfiguredTags"
 
+################# Connection #################
+# one session keeps the connection to QPE alive between requests,
+# the timeouts keep a QPE that does not answer from blocking forever
+session = requests.Session()
+TIMEOUT = (3.05, 10.0)  # connect, read timeouts in seconds
+POLL_INTERVAL = 3.0  # seconds between polls
+
+################# Self Metrics #################
+# counts, sums and maxima of what every poll measures, printed every poll
+# set a port, e.g. 9102, to also serve them as json on http://localhost:9102/
+METRICS_PORT = None
+self_metrics = {}  # name -> {"count": ..., "sum": ..., "max": ...}
+
 
 def update_url_query(url: str, query_params: dict) -> str:
     """takes a url and query string params and returns a new url with those query parameters in it
@@ -68,6 +89,89 @@ def update_url_query(url: str, query_params: dict) -> str:
     return new_url
 
 
+def observe(name: str, value: float = 0.0) -> None:
+    """counts an observation of name in self_metrics, value is summed up and its maximum kept"""
+    stats = self_metrics.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+    stats["count"] += 1
+    stats["sum"] += value
+    stats["max"] = max(stats["max"], value)
+
+
+class SelfMetricsHandler(BaseHTTPRequestHandler):
+    """answers every GET with self_metrics as json"""
+
+    def do_GET(self):
+        body = json.dumps(self_metrics).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_self_metrics(port: int) -> HTTPServer:
+    """serves self_metrics on localhost on a background thread"""
+    server = HTTPServer(("127.0.0.1", port), SelfMetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def wait_for_next_poll(deadline: float, interval: float) -> float:
+    """sleeps until the poll after the one due at deadline. Deadlines are on the
+    monotonic clock, interval apart, so the period does not drift by the time a poll
+    takes. Polls missed by a poll that took longer than interval are skipped.
+
+    Args:
+        deadline (float): time.monotonic() the last poll was due
+        interval (float): seconds between polls
+
+    Returns:
+        float: time.monotonic() the poll now starting was due
+    """
+    deadline += interval
+    now = time.monotonic()
+    if now > deadline:
+        missed = int((now - deadline) // interval) + 1
+        print(f"Poll overran the {interval}s interval by {now - deadline:.2f}s, skipping {missed} poll(s)")
+        deadline += missed * interval
+    time.sleep(deadline - now)
+    return deadline
+
+
+def request_qpe(url: str, metric: str) -> requests.Response:
+    """requests QPE, a failed request is printed and counted instead of raised
+
+    Args:
+        url (str): the request
+        metric (str): where the seconds it took are observed
+
+    Returns:
+        requests.Response: the response, None if the request failed or timed out
+    """
+    start = time.perf_counter()
+    try:
+        res = session.get(url, timeout=TIMEOUT)
+    except requests.RequestException as error:
+        print(f"Request to QPE failed: {error}")
+        observe("qpe_request_errors")
+        return None
+    observe(metric, time.perf_counter() - start)
+    return res
+
+
+def print_response(res: requests.Response) -> None:
+    """prints the QPE response, if there is one and it is json"""
+    if res is None:
+        return
+    try:
+        pprint(res.json())
+    except ValueError:
+        print(f"Unexpected response from QPE: {res.status_code} {res.text[:100]}")
+
+
 def main():
     """Main entry point of the app"""
 
@@ -76,18 +180,30 @@ def main():
     config_process_tags = []
     ungrouped_tags = []
 
+    if METRICS_PORT is not None:
+        serve_self_metrics(METRICS_PORT)
+
+    deadline = time.monotonic()
     while True:
         # poll QPE for data
-        res = requests.get(tag_data_url)
+        start = time.perf_counter()
+        try:
+            res = session.get(tag_data_url, timeout=TIMEOUT)
+            observe("qpe_request_seconds", time.perf_counter() - start)
+            observe("qpe_response_bytes", len(res.content))
+        except requests.RequestException:
+            res = None
+            observe("qpe_request_errors")
         # make sure response is ok if not sleep and try again
         # it is best to wait some time incase the response did not go through
         # due to network congestion
-        if res.status_code != 200:
-            time.sleep(3)
+        if res is None or res.status_code != 200:
+            deadline = wait_for_next_poll(deadline, POLL_INTERVAL)
             continue
 
         # this response contains a json array of all tags
         tag_data = res.json()["tags"]
+        observe("tags_per_poll", len(tag_data))
 
         for tag in tag_data:
             # if tag does not have a group name, it has not been configured,
@@ -110,9 +226,11 @@ def main():
                     # configuration failed, drop from id from list to initiate another attempt
                     unconfigured_tag.append(tag["tagId"])
                     config_process_tags.remove(tag["tagId"])
+                    observe("configurations_failed")
                 elif tag["configStatus"] == "done":
                     ungrouped_tags.append(tag["tagId"])
                     config_process_tags.remove(tag["tagId"])
+                    observe("configurations_done")
 
         print()
         print("Unconfigured IDs:")
@@ -131,15 +249,16 @@ def main():
                 "id": CONFIG_ID,  # id of the configuration in the project
             }
             conf_req = update_url_query(config_url, query_parameters)
-            res = requests.get(conf_req)
+            res = request_qpe(conf_req, "configure_request_seconds")
 
-            if res.status_code == 200:
+            if res is not None and res.status_code == 200:
                 # configuration request was successful
                 config_process_tags += unconfigured_tag
 
+            # tags whose request failed are still unconfigured next poll and requested again
             unconfigured_tag = []
 
-            pprint(res.json())
+            print_response(res)
 
         ################# Request tags to be added to group #################
         if len(ungrouped_tags) > 0:
@@ -148,15 +267,17 @@ def main():
                 "targetGroup": TARGET_GROUP_NAME,  # the tags target group
             }
             group_req = update_url_query(group_url, query_parameters)
-            res = requests.get(group_req)
+            res = request_qpe(group_req, "group_request_seconds")
 
-            if res.status_code == 200:
-                # add to group request was successful
+            if res is not None and res.status_code == 200:
+                # add to group request was successful, else it is requested again next poll
                 ungrouped_tags = []
 
-            pprint(res.json())
+            print_response(res)
 
-        time.sleep(3)
+        print("Self metrics:")
+        pprint(self_metrics)
+        deadline = wait_for_next_poll(deadline, POLL_INTERVAL)
 
 
 if __name__ == "__main__":
@@ -18,6 +18,10 @@ The general process is as follows:
     - https://cloud2.influxdata.com/signup
     - There is no particular reason Influx_DB has to be the cloud endpoint
 
+The script does not depend on other files of this repository. Its poll
+scheduling, self metrics and spool are small inline versions of
+helpers.schedule, helpers.metrics and helpers.spool.
+
 Typical usage:
 
 ```bash
@@ -32,6 +36,11 @@ Typical usage:
   -h, --help            show this help message and exit
   --qpe_addr QPE_ADDR   what base url to poll QPE data from
   --poll_interval POLL_INTERVAL
+  --self_metrics        also write the request latency and size of every poll to
+                        influx DB as the monitor_self measurement
+  --spool_file SPOOL_FILE
+                        where points influx DB did not take, once the retries ran out,
+                        are kept until they can be posted again
 ```
 
 """
@@ -43,12 +52,111 @@ import json
 import logging
 import os
 import pathlib
+import threading
 import time
 
-import influxdb_client
 import requests
-from influxdb_client import InfluxDBClient, Point, WritePrecision
-from influxdb_client.client.write_api import SYNCHRONOUS
+
+QPE_TIMEOUT = (3.05, 10.0)  # connect, read timeouts in seconds
+
+
+def wait_for_next_poll(deadline: float, interval: float, log: logging.Logger) -> float:
+    """sleeps until the poll after the one due at deadline. Deadlines are on the
+    monotonic clock, interval apart, so the period does not drift by the time a poll
+    takes. Polls missed by a poll that took longer than interval are skipped and logged
+
+    Args:
+        deadline (float): time.monotonic() the last poll was due
+        interval (float): seconds between polls
+        log (logging.Logger): where overruns are logged
+
+    Returns:
+        float: time.monotonic() the poll now starting was due
+    """
+    deadline += interval
+    now = time.monotonic()
+    if now > deadline:
+        missed = int((now - deadline) // interval) + 1
+        log.warning(f"Poll overran the {interval}s interval by {now - deadline:.2f}s, skipping {missed} poll(s)")
+        deadline += missed * interval
+    log.info(f"Sleeping for {deadline - now:.2f}s")
+    time.sleep(deadline - now)
+    return deadline
+
+
+class SelfMetrics:
+    """counts, sums and maxima of what the polls measure, written to influx DB as
+    the monitor_self measurement"""
+
+    def __init__(self):
+        self.values = {}  # name -> [count, sum, max]
+
+    def observe(self, name: str, value: float = 0.0) -> None:
+        """counts an observation of name, value is summed up and its maximum kept"""
+        stats = self.values.setdefault(name, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += value
+        stats[2] = max(stats[2], value)
+
+    def point(self, project: str) -> dict:
+        """the monitor_self point, in the dict structure of influxdb_client Point.from_dict"""
+        fields = {}
+        for (name, (count, total, maximum)) in self.values.items():
+            fields[f"{name}_count"] = count
+            fields[f"{name}_sum"] = float(total)
+            fields[f"{name}_max"] = float(maximum)
+        tags = {"script": "qpe_sys_monitor"}
+        if project is not None:
+            tags["project"] = project
+        return {"measurement": "monitor_self", "tags": tags, "fields": fields}
+
+
+class LineSpool:
+    """a file of the line protocol influx DB did not take once the retries ran out,
+    replayed once a post goes through again. Points past max_bytes are dropped and
+    counted. The file is kept between runs, nothing spooled is lost on a restart.
+    """
+
+    def __init__(self, path: pathlib.Path, max_bytes: int = 64 << 20):
+        """
+        Args:
+            path (pathlib.Path): the spool file, its directory is created if needed
+            max_bytes (int, optional): disk cap, points past it are dropped. Defaults to 64 MiB.
+        """
+        self.log = logging.getLogger("qpe_mon")
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.dropped_points = 0
+        # appended to by the influxdb_client write thread, taken by the poll loop
+        self._lock = threading.Lock()
+
+    @property
+    def pending_bytes(self) -> int:
+        return self.path.stat().st_size if self.path.exists() else 0
+
+    def append(self, data: bytes) -> None:
+        """appends line protocol, one point per line"""
+        if isinstance(data, str):
+            data = data.encode()
+        data = data.rstrip(b"\n") + b"\n"
+        with self._lock:
+            if self.pending_bytes + len(data) > self.max_bytes:
+                points = data.count(b"\n")
+                self.dropped_points += points
+                self.log.error(f"Spool is over {self.max_bytes} bytes, dropped {points} points")
+                return
+            with open(self.path, "ab") as spool:
+                spool.write(data)
+
+    def take(self) -> bytes:
+        """removes and returns everything spooled, b"" if nothing is"""
+        with self._lock:
+            if not self.path.exists():
+                return b""
+            data = self.path.read_bytes()
+            self.path.unlink()
+        return data
 
 
 def main():
@@ -110,6 +218,17 @@ def main():
         type=float,
         help="Time in seconds between polling calls to QPE (minimum 3 sec)",
     )
+    parser.add_argument(
+        "--self_metrics",
+        action="store_true",
+        help="also write the request latency and size of every poll to influx DB as the monitor_self measurement",
+    )
+    parser.add_argument(
+        "--spool_file",
+        action="store",
+        default="spool/qpe_sys_monitor.lp",
+        help="where points influx DB did not take, once the retries ran out, are kept until they can be posted again",
+    )
 
     args = parser.parse_args()
     args.poll_interval = max(3.0, args.poll_interval)  # poll no faster than 3 seconds
@@ -117,6 +236,8 @@ def main():
 
     ## init resources ##
     qpeinfo_url = "/".join([args.qpe_addr, "getPEInfo"])
+    # one session keeps the connection to QPE alive between polls
+    qpe_session = requests.Session()
 
     # get credentials for influx_db
     ##keys.json looks like:
@@ -136,17 +257,66 @@ def main():
         log.info(f'org: {influx_creds["org"]}')
         log.info(f'bucket: {influx_creds["bucket"]}')
 
-    influx = influxdb_client.InfluxDBClient(
-        url=influx_creds["url"], token=influx_creds["token"], org=influx_creds["org"]
+    # one client for the life of the script, points are batched, gzipped and
+    # retried with backoff on a background thread.
+    # influxdb_client is imported here, it is slow to import and --help does not need it
+    from influxdb_client import InfluxDBClient, Point
+    from influxdb_client.client.write_api import WriteOptions
+
+    influx = InfluxDBClient(
+        url=influx_creds["url"],
+        token=influx_creds["token"],
+        org=influx_creds["org"],
+        enable_gzip=True,
+        timeout=10_000,  # ms
+    )
+    # points still failing after the retries are spooled, and replayed by the poll
+    # loop once a post goes through again
+    spool = LineSpool(args.spool_file)
+    influx_up = threading.Event()
+    if spool.pending_bytes:
+        log.info(f"{spool.pending_bytes} bytes left in the spool by the last run")
+
+    def on_write_success(conf: tuple, data: bytes) -> None:
+        influx_up.set()
+
+    def on_write_error(conf: tuple, data: bytes, error: Exception) -> None:
+        influx_up.clear()
+        log.error(f"Posting to influx DB failed: {error} ... spooling the points")
+        spool.append(data)
+
+    write_api = influx.write_api(
+        success_callback=on_write_success,
+        error_callback=on_write_error,
+        write_options=WriteOptions(
+            batch_size=100,
+            flush_interval=args.poll_interval * 1000.0 * 4,  # ms, post at least every 4 polls
+            retry_interval=500,  # ms, doubled every retry
+            max_retries=5,
+            max_retry_delay=30_000,  # ms
+        )
     )
-    write_api = influx.write_api(write_options=SYNCHRONOUS)
 
     ################# long term actions #################
+    self_metrics = SelfMetrics()
+    project = None  # tags the self metrics once known
+    deadline = time.monotonic()
     while True:
         ## collect data ##
         log.info("Requesting info from QPE...")
-        res = requests.get(qpeinfo_url)
-        if res.status_code == 200:  # check request success 200: Success
+        start = time.perf_counter()
+        try:
+            res = qpe_session.get(qpeinfo_url, timeout=QPE_TIMEOUT)
+            self_metrics.observe("qpe_request_seconds", time.perf_counter() - start)
+            self_metrics.observe("qpe_response_bytes", len(res.content))
+        except requests.RequestException as error:
+            res = None
+            self_metrics.observe("qpe_request_errors")
+            log.error(f"Request to QPE failed: {error} ... no data received")
+
+        if res is None:
+            data = None
+        elif res.status_code == 200:  # check request success 200: Success
             raw_data = res.json()
             if raw_data["code"] == 0:  # check QPE response 0: Ok
                 log.debug(raw_data)
@@ -156,10 +326,10 @@ def main():
                 log.info(f"Got data from QPE: {data}")
             else:
                 data = None
-                log.error(f'Expected QPE code 0, got: {data["code"]} ... no data received')
+                log.error(f'Expected QPE code 0, got: {raw_data["code"]} ... no data received')
         else:
             data = None
-            log.error(f"Expected response code 200, got: {res.code} ... no data received")
+            log.error(f"Expected response code 200, got: {res.status_code} ... no data received")
 
         if data:
             influx_point = Point.from_dict(  # this dict structure can be found in the influx_db docs
@@ -184,20 +354,31 @@ def main():
                 }
             )
             ################# post data #################
-            log.info("Writing data to influx cloud...")
-            try:
-                write_api.write(
-                    bucket=influx_creds["bucket"],
-                    org=influx_creds["org"],
-                    record=influx_point,
-                )
-                log.info("Writing data to influx cloud: Completed")
-            except influxdb_client.rest.ApiException:
-                log.error("Could not post to Influx Cloud!!!!")
+            # queued and posted in the background, failed posts are spooled by on_write_error
+            log.info("Queueing data for influx cloud...")
+            start = time.perf_counter()
+            write_api.write(
+                bucket=influx_creds["bucket"],
+                org=influx_creds["org"],
+                record=influx_point,
+            )
+            self_metrics.observe("write_queue_seconds", time.perf_counter() - start)
+            project = data["projectName"]
+
+        if influx_up.is_set() and (spooled := spool.take()):
+            log.info(f"Replaying {len(spooled.splitlines())} spooled points")
+            write_api.write(bucket=influx_creds["bucket"], org=influx_creds["org"], record=spooled)
+
+        if args.self_metrics:
+            self_metrics.observe("spool_bytes", spool.pending_bytes)
+            write_api.write(
+                bucket=influx_creds["bucket"],
+                org=influx_creds["org"],
+                record=Point.from_dict(self_metrics.point(project)),
+            )
 
         ################# end loop #################
-        log.info(f"Sleeping for {args.poll_interval}s")
-        time.sleep(args.poll_interval)
+        deadline = wait_for_next_poll(deadline, args.poll_interval, log)
 
     ################# clean up #################
 
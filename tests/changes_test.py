@@ -0,0 +1,45 @@
+import src.sensortags.sensordata as sensor
+from src.sensortags.changes import ChangeTracker
+
+
+def raw_tag(tag_id: str, timestamp: int, payload: str) -> dict:
+    return {"tagId": tag_id, "advertisingDataPayloadTS": timestamp, "advertisingDataPayload": payload}
+
+
+def test_unchanged_frames_dropped():
+    changes = ChangeTracker()
+    poll = [raw_tag("a", 1, "0x01"), raw_tag("b", 1, "0x02")]
+
+    assert changes.filter_new_frames(poll) == poll
+    assert changes.filter_new_frames(poll) == []
+    assert changes.unchanged == 2
+
+
+def test_new_timestamp_or_payload_kept():
+    changes = ChangeTracker()
+    changes.filter_new_frames([raw_tag("a", 1, "0x01"), raw_tag("b", 1, "0x02")])
+
+    assert changes.filter_new_frames([raw_tag("a", 2, "0x01"), raw_tag("b", 1, "0x03")]) == [
+        raw_tag("a", 2, "0x01"),
+        raw_tag("b", 1, "0x03"),
+    ]
+
+
+def test_ruuvi_sequence_number_dedup():
+    changes = ChangeTracker()
+    payload = "02010611ff99040512fc5394c37c0004fffc040cac364200cdcbb8334c884f"
+    payload = " ".join(f"0x{payload[i:i + 2]}" for i in range(0, len(payload), 2))
+    first = sensor.GatewayTag("ruuvi", payload, 1, -60, "loc1", "locator 1")
+    again = sensor.GatewayTag("ruuvi", payload, 2, -70, "loc2", "locator 2")
+
+    assert first.tokenize_data() and again.tokenize_data()
+    assert changes.is_new_reading(first)
+    assert not changes.is_new_reading(again)
+
+
+def test_reading_without_sequence_number_kept():
+    changes = ChangeTracker()
+    tag = sensor.GatewayTag("tag_id", "0xff 0x12", 5, 10, "locid", "somelocator")
+
+    assert changes.is_new_reading(tag)
+    assert changes.is_new_reading(tag)
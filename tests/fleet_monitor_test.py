@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import pytest
+from src.fleet_monitor import FleetPipeline
+from src.helpers.fleet import TAG_DATA, FleetPoller, PollResult, QpeInstance
+
+from tests.qpe_test import StandInQpe
+from tests.readings_test import raw_tag
+
+MINEW_S1 = "0201060303e1ff1016e1ffa101640a304c593182ab3f23ac"
+
+
+class SlowWriter:
+    """takes seconds per point, like decoding and writing a large response"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.points = []
+
+    def write(self, point, **kwargs) -> None:
+        time.sleep(self.seconds)
+        self.points.append(point)
+
+
+@pytest.fixture
+def fleet():
+    servers = [StandInQpe() for _ in range(2)]
+    yield servers
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_slow_handling_does_not_delay_other_qpes(fleet):
+    fleet[0].responses["/qpe/getTagData"] = {"code": 0, "tags": [raw_tag(MINEW_S1, str(i)) for i in range(2)]}
+    fleet[1].responses["/qpe/getTagData"] = {"code": 0, "tags": [raw_tag("ffffffff")]}  # no parser, nothing written
+    instances = [
+        QpeInstance(server.url, pe_info_interval=None, tag_data_interval=0.05, name=name)
+        for (server, name) in zip(fleet, ["large", "small"])
+    ]
+    poller = FleetPoller(instances)
+    pipeline = FleetPipeline(SlowWriter(0.3), poller, workers=2)
+    polled = []
+
+    async def handle(result):
+        if result.qpe == "small":
+            polled.append(time.monotonic())
+        await pipeline.handle(result)
+
+    asyncio.run(poller.poll(handle, duration=0.8))
+    poller.close()
+    pipeline.close()
+
+    assert len(pipeline.writer.points) == 2
+    assert len(polled) >= 8
+    assert max(later - earlier for (earlier, later) in zip(polled, polled[1:])) < 0.3
+
+
+def test_parser_caches_per_qpe(tmp_path):
+    pipeline = FleetPipeline(SlowWriter(0.0))
+    for (qpe, tag_id) in [("site-1", "a"), ("site-2", "b")]:
+        pipeline.process(PollResult(qpe, TAG_DATA, [raw_tag(MINEW_S1, tag_id)], 0.0))
+    pipeline.save_parser_caches(tmp_path / "parsers.json")
+    pipeline.close()
+
+    assert set(pipeline.parser_caches["site-1"].entries) == {"a"}
+    warm = FleetPipeline(SlowWriter(0.0))
+    warm.load_parser_caches(tmp_path / "parsers.json")
+    assert set(warm._parser_cache("site-3").entries) == {"a", "b"}
+    warm.close()
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import pytest
+from src.helpers.fleet import PE_INFO, TAG_DATA, FleetPoller, QpeInstance
+
+from tests.qpe_test import StandInQpe
+
+
+@pytest.fixture
+def fleet():
+    servers = [StandInQpe() for _ in range(3)]
+    yield servers
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_poll_once_tags_source(fleet):
+    poller = FleetPoller([QpeInstance(server.url, name=f"site-{index}") for (index, server) in enumerate(fleet)])
+    results = asyncio.run(poller.poll_once())
+    poller.close()
+
+    assert [(result.qpe, result.endpoint) for result in results] == [
+        (f"site-{index}", endpoint) for index in range(3) for endpoint in (PE_INFO, TAG_DATA)
+    ]
+    assert all(result.error is None for result in results)
+    assert set(poller.latency_report()) == {"site-0", "site-1", "site-2"}
+
+
+def test_polled_concurrently(fleet):
+    for server in fleet:
+        server.delay = 0.2
+    poller = FleetPoller([QpeInstance(server.url) for server in fleet])
+
+    start = time.perf_counter()
+    asyncio.run(poller.poll_once())
+    poller.close()
+
+    assert time.perf_counter() - start < 0.2 * len(fleet)
+
+
+def test_per_instance_schedules(fleet):
+    instances = [
+        QpeInstance(fleet[0].url, pe_info_interval=None, tag_data_interval=0.05, name="fast"),
+        QpeInstance(fleet[1].url, pe_info_interval=None, tag_data_interval=1.0, name="slow"),
+    ]
+    poller = FleetPoller(instances)
+    results = []
+    asyncio.run(poller.poll(results.append, duration=0.8))
+    poller.close()
+
+    fast = [result for result in results if result.qpe == "fast"]
+    slow = [result for result in results if result.qpe == "slow"]
+    assert len(fast) >= 8
+    assert len(slow) == 1  # the first poll of slow is staggered by half its interval, then 1 s
+    assert {result.endpoint for result in results} == {TAG_DATA}
+
+
+def test_unreachable_instance_reported(fleet):
+    fleet[0].responses["/qpe/getTagData"] = {"code": 11}
+    poller = FleetPoller([QpeInstance(fleet[0].url, pe_info_interval=None, name="down")])
+    (result,) = asyncio.run(poller.poll_once())
+    poller.close()
+
+    assert result.data is None
+    assert result.error.code == 11
+    assert poller.latency_report()["down"][TAG_DATA]["errors"] == 1
+
+
+def test_adaptive_tag_data_interval(fleet):
+    instances = [QpeInstance(fleet[0].url, pe_info_interval=1.0, tag_data_interval=0.4, name="site")]
+    poller = FleetPoller(instances, adaptive_interval=(0.05, 1.0))
+
+    results = []
+
+    def handle(result):
+        results.append(result)
+        poller.adapt(result.qpe, 1.0)  # every tag changed, poll faster
+
+    asyncio.run(poller.poll(handle, duration=0.6))
+    poller.close()
+
+    report = poller.latency_report()["site"]
+    assert report[TAG_DATA]["interval"] == 0.05
+    assert report[PE_INFO]["interval"] == 1.0  # only tag data is adaptive
+    assert len([result for result in results if result.endpoint == TAG_DATA]) >= 5
@@ -0,0 +1,192 @@
+import gzip
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from src.helpers.influx import InfluxWriter
+from src.helpers.metrics import Metrics
+from src.helpers.spool import Spool
+
+
+class StandInInflux(ThreadingHTTPServer):
+    """records the writes posted to it, responds with the queued status codes first"""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.writes = []
+        self.status_codes = []
+        self.thread = threading.Thread(target=self.serve_forever, args=(0.01,), daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def lines(self) -> list:
+        return [line for (_, _, body) in self.writes for line in body.decode().splitlines()]
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep alive
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+
+        status = self.server.status_codes.pop(0) if self.server.status_codes else 204
+        if status == 204:
+            self.server.writes.append((self.path, dict(self.headers), body))
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def influx():
+    server = StandInInflux()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def point(value: int) -> dict:
+    return {"measurement": "m", "tags": {"tagId": "a"}, "fields": {"value": value}, "time": value}
+
+
+def test_batches_by_size(influx):
+    with InfluxWriter(influx.url, "token", "org", "bucket", batch_size=10, flush_interval=60) as writer:
+        for value in range(25):
+            writer.write(point(value))
+
+    assert [len(body.splitlines()) for (_, _, body) in influx.writes] == [10, 10, 5]
+    assert influx.lines()[0] == "m,tagId=a value=0i 0"
+    assert writer.written_points == 25
+
+    (path, headers, _) = influx.writes[0]
+    assert path.startswith("/api/v2/write?")
+    assert "bucket=bucket" in path and "precision=ms" in path
+    assert headers["Authorization"] == "Token token"
+
+
+def test_serialized_lines_batched_with_points(influx):
+    with InfluxWriter(influx.url, "token", "org", "bucket", batch_size=4, flush_interval=60) as writer:
+        writer.write(point(0))
+        writer.write_lines(b"m,tagId=a value=1i 1\nm,tagId=a value=2i 2\n", 2)
+        writer.write_lines(b"", 0)
+        writer.write(point(3))
+
+    assert [len(body.splitlines()) for (_, _, body) in influx.writes] == [4]
+    assert influx.lines()[1] == "m,tagId=a value=1i 1"
+    assert writer.written_points == 4
+
+
+def test_writes_measured(influx):
+    metrics = Metrics()
+    with InfluxWriter(influx.url, "token", "org", "bucket", batch_size=10, metrics=metrics) as writer:
+        for value in range(25):
+            writer.write(point(value))
+
+    report = metrics.report()
+    assert report["influx_write_seconds"]["count"] == 3
+    assert report["influx_batch_points"]["sum"] == 25.0
+    assert report["influx_points{state=written}"] == 25
+    assert report["influx_queued_batches"] == 0
+
+
+def test_flushes_by_time(influx):
+    writer = InfluxWriter(influx.url, "token", "org", "bucket", flush_interval=0.05, compress=False)
+    writer.write(point(1))
+
+    deadline = time.monotonic() + 1.0
+    while not influx.writes and time.monotonic() < deadline:  # the background thread flushes
+        time.sleep(0.01)
+    assert influx.lines() == ["m,tagId=a value=1i 1"]
+    writer.close()
+
+
+def test_retries_with_backoff(influx):
+    influx.status_codes = [503, 500]
+    with InfluxWriter(influx.url, "token", "org", "bucket", backoff=0.01) as writer:
+        writer.write(point(1))
+
+    assert influx.lines() == ["m,tagId=a value=1i 1"]
+    assert writer.written_points == 1
+
+
+def test_rejected_batch_not_retried(influx):
+    influx.status_codes = [400]
+    with InfluxWriter(influx.url, "token", "org", "bucket", backoff=0.01) as writer:
+        writer.write(point(1))
+
+    assert influx.writes == []
+    assert writer.failed_points == 1
+
+
+def test_full_queue_drops_oldest(influx):
+    writer = InfluxWriter(influx.url, "token", "org", "bucket", batch_size=1, max_queued_batches=2)
+    writer.close()  # nothing takes batches off the queue anymore
+
+    for value in range(3):
+        writer.write(point(value))
+
+    assert writer.dropped_points == 1
+    assert [writer._batches.get_nowait() for _ in range(2)] == [
+        (b"m,tagId=a value=1i 1\n", 1),
+        (b"m,tagId=a value=2i 2\n", 1),
+    ]
+
+
+def wait_for(condition, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_spooled_while_down_and_replayed(influx, tmp_path):
+    influx.status_codes = [503]
+    spool = Spool(tmp_path)
+    writer = InfluxWriter(influx.url, "token", "org", "bucket", retries=0, max_backoff=0.2, spool=spool)
+    writer.write(point(1))
+    writer.flush()
+    assert wait_for(lambda: writer.spooled_points == 1)
+
+    writer.write(point(2))  # influx DB is considered down, straight to the spool
+    writer.flush()
+    assert wait_for(lambda: writer.spooled_points == 2)
+
+    assert wait_for(lambda: writer.replayed_points == 2)  # replayed once it is back up
+    assert influx.lines() == ["m,tagId=a value=1i 1", "m,tagId=a value=2i 2"]
+    assert not spool
+    writer.close()
+
+
+def test_rejected_spool_record_dropped(influx, tmp_path):
+    spool = Spool(tmp_path)
+    for value in range(3):
+        spool.append(b"m,tagId=a value=%di %d\n" % (value, value), 1)
+    influx.status_codes = [400, 400]  # the replay of all three, then the head record alone
+    writer = InfluxWriter(influx.url, "token", "org", "bucket", spool=spool)
+
+    assert wait_for(lambda: writer.replayed_points == 2)
+    assert influx.lines() == ["m,tagId=a value=1i 1", "m,tagId=a value=2i 2"]
+    assert writer.failed_points == 1
+    assert not spool
+    writer.close()
+
+
+def test_rejected_batch_not_spooled(influx, tmp_path):
+    influx.status_codes = [400]
+    with InfluxWriter(influx.url, "token", "org", "bucket", spool=Spool(tmp_path)) as writer:
+        writer.write(point(1))
+        writer.flush()
+        assert wait_for(lambda: writer.failed_points == 1)
+        writer.write(point(2))  # not considered down
+
+    assert influx.lines() == ["m,tagId=a value=2i 2"]
+    assert writer.spooled_points == 0
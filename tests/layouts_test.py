@@ -0,0 +1,74 @@
+import re
+
+import pytest
+import src.sensortags.parsers.minew_e6 as minew_e6
+import src.sensortags.parsers.minew_s1 as minew_s1
+import src.sensortags.parsers.minew_s4_alarm as minew_s4
+import src.sensortags.parsers.ruuvi_raw_v1 as ruuvi_v1
+import src.sensortags.parsers.ruuvi_raw_v2_f5 as ruuvi_v2
+from src.sensortags.layouts import Field, FrameLayout
+
+# advertising data used by the parser tests
+PARSER_TEST_DATA = [
+    (minew_e6, "0201060303e1ff0d16e1ffa10264016b9aa23f23ac"),
+    (minew_e6, "0201060303e1ff0d16e1ffa10264006b9aa23f23ac"),
+    (minew_s1, "0201060303e1ff1016e1ffa101640a304c593182ab3f23ac"),
+    (minew_s4, "02010612ff3906a40164010101ff0677aa3f23ac3b5a"),
+    (minew_s4, "02010612ff3906a40132000000ff0677aa3f23ac3b5a"),
+    (minew_s4, "02010612ff3906a40164000001ff0677aa3f23ac3b5a"),
+    (ruuvi_v1, "02010611ff990403658001c71effcafff404050b71"),
+    (ruuvi_v1, "02010611ff990403658145c71effcafff404050b71"),
+    (ruuvi_v1, "02010611ff990403651a1ec71effcafff404050b71"),
+    (ruuvi_v2, "02010611ff99040512fc5394c37c0004fffc040cac364200cdcbb8334c884f"),
+    (ruuvi_v2, "02010611ff9904057ffffffefffe7fff7fff7fffffdefefffecbb8334c884f"),
+    (ruuvi_v2, "02010611ff9904058001000000008001800180010000000000cbb8334c884f"),
+]
+
+
+@pytest.mark.parametrize("parser, adv_data", PARSER_TEST_DATA)
+def test_layout_matches_regex_parser(parser, adv_data):
+    result = re.match(parser.tokens_reg_ex, adv_data, re.VERBOSE)
+    assert result, "Reg Ex did not match on adv_data"
+
+    expected = parser.process_adv_data(result)
+    values = parser.layout.decode(bytes.fromhex(adv_data))
+
+    assert values == expected
+    assert {key: type(val) for (key, val) in values.items()} == {key: type(val) for (key, val) in expected.items()}
+
+
+def test_short_frame():
+    assert ruuvi_v2.layout.decode(bytes.fromhex("02010611ff99040512fc")) is None
+
+
+@pytest.mark.parametrize("parser, adv_data", PARSER_TEST_DATA)
+def test_layout_fits_what_the_regex_matches(parser, adv_data):
+    assert parser.layout.fits(bytes.fromhex(adv_data))
+
+
+def test_constants_and_choices():
+    layout = FrameLayout((Field("flag", offset=2),), constants=((0, "0201"),), choices=((2, b"\x00\x01"),))
+
+    assert layout.length == 3
+    assert layout.fits(bytes.fromhex("020101ff"))
+    assert not layout.fits(bytes.fromhex("020102"))
+    assert not layout.fits(bytes.fromhex("030101"))
+    assert not layout.fits(bytes.fromhex("0201"))
+
+
+def test_little_endian_and_bit_fields():
+    layout = FrameLayout(
+        (
+            Field("word", offset=1, width=2),
+            Field("high", offset=3, shift=4),
+            Field("low", offset=3, mask=0x0F, scale=0.5),
+        ),
+        byte_order="<",
+    )
+
+    assert layout.decode(bytes.fromhex("ff3412a5")) == {"word": 0x1234, "high": 0xA, "low": 2.5}
+
+
+def test_overlapping_fields_rejected():
+    with pytest.raises(ValueError):
+        FrameLayout((Field("a", offset=0, width=2), Field("b", offset=1)))
@@ -0,0 +1,113 @@
+import math
+
+import numpy as np
+import pytest
+import src.sensortags.sensordata as sensor
+from influxdb_client import Point
+from src.sensortags.lineprotocol import LineProtocolBuffer, escape_tag_value, format_field_value
+from src.sensortags.readings import SensorReading
+
+from tests.layouts_test import PARSER_TEST_DATA
+from tests.readings_test import raw_tag
+
+
+def influx_client_line(point: dict, timestamp: int) -> str:
+    """the line influxdb_client writes for a point, fields sorted"""
+    point = dict(point, time=timestamp)
+    return Point.from_dict(point, write_precision="ms").to_line_protocol()
+
+
+def sorted_fields(line: str) -> str:
+    """the same line with its fields sorted, as influxdb_client sorts them"""
+    (series, fields, timestamp) = line.split(" ")
+    return " ".join([series, ",".join(sorted(fields.split(","))), timestamp])
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (1.5, "1.5"),
+        (2.0, "2"),
+        (np.float32(0.25), "0.25"),
+        (3, "3i"),
+        (np.int16(-3), "-3i"),
+        (True, "true"),
+        ("a \"b\" \\c", '"a \\"b\\" \\\\c"'),
+        (None, None),
+        (math.nan, None),
+    ],
+)
+def test_format_field_value(value, expected):
+    assert format_field_value(value) == expected
+
+
+def test_format_field_value_unsupported():
+    with pytest.raises(ValueError):
+        format_field_value([1, 2])
+
+
+def test_escaping():
+    buffer = LineProtocolBuffer()
+    assert buffer.append("my measurement,1", [("tag key", "a=b,c"), ("none", None)], [("field=1", 1.0)], 5)
+
+    assert buffer.getvalue() == b"my\\ measurement\\,1,tag\\ key=a\\=b\\,c field\\=1=1 5\n"
+    assert escape_tag_value("ends\\") == "ends\\ "
+
+
+def test_no_fields_no_line():
+    buffer = LineProtocolBuffer()
+
+    assert not buffer.append("m", [("tag", "a")], [("field", None)])
+    assert len(buffer) == 0
+    assert buffer.lines == 0
+
+
+def test_buffer_reused():
+    buffer = LineProtocolBuffer()
+    buffer.append_point({"measurement": "m", "tags": {"b": 2, "a": 1}, "fields": {"f": 1}}, 10)
+    buffer.append_point({"measurement": "m", "fields": {"f": 2}})
+
+    assert buffer.getvalue() == b"m,a=1,b=2 f=1i 10\nm f=2i\n"
+    assert buffer.lines == 2
+
+    buffer.clear()
+    assert buffer.getvalue() == b""
+    assert buffer.lines == 0
+
+
+@pytest.mark.parametrize("parser, adv_data", PARSER_TEST_DATA)
+def test_same_line_as_influx_client(parser, adv_data):
+    tag_keys = ["tagId", "advertisingDataPayloadLocatorId"]
+    tag = sensor.GatewayTag.from_any_dict(raw_tag(adv_data))
+    assert tag.tokenize_data()
+    expected = influx_client_line(tag.as_influx_point_dict(tag_keys=tag_keys), tag.advertisingDataPayloadTS)
+
+    buffer = LineProtocolBuffer()
+    assert tag.write_line_protocol(buffer, tag_keys=tag_keys)
+    assert SensorReading.from_any_dict(raw_tag(adv_data)).write_line_protocol(buffer, tag_keys)
+
+    (tag_line, reading_line) = buffer.getvalue().decode().splitlines()
+    assert sorted_fields(tag_line) == expected
+    assert sorted_fields(reading_line) == expected
+
+
+def test_qpe_info_line():
+    info = sensor.QpeInfoData.from_any_dict(
+        {
+            "cpuLoad": 5.0,
+            "issues": 0,
+            "memoryAllocated": 6.0,
+            "memoryFree": 7.0,
+            "memoryMax": 8.0,
+            "memoryUsed": 9.1,
+            "packetsPerSecond": 10.2,
+            "projectName": "projname",
+            "running": True,
+            "udpRx": 11.2,
+            "udpTx": 15.6,
+        }
+    )
+    buffer = LineProtocolBuffer()
+    assert info.write_line_protocol(buffer, timestamp=1)
+
+    assert sorted_fields(buffer.getvalue().decode().strip()) == influx_client_line(info.as_influx_point_dict(), 1)
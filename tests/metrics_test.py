@@ -0,0 +1,103 @@
+import json
+import urllib.request
+
+import pytest
+from src.helpers.metrics import SIZE_BUCKETS, Histogram, Metrics, MetricsServer
+from src.sensortags.lineprotocol import LineProtocolBuffer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def metrics():
+    return Metrics()
+
+
+def test_counters_by_name_and_labels(metrics):
+    metrics.counter("tags_parsed", packet_type="minew_s1").inc(3)
+    metrics.counter("tags_parsed", packet_type="minew_s1").inc()
+    metrics.counter("tags_parsed", packet_type="minew_e6").inc()
+
+    assert metrics.counter("tags_parsed", packet_type="minew_s1").value == 4
+    assert metrics.report() == {"tags_parsed{packet_type=minew_s1}": 4, "tags_parsed{packet_type=minew_e6}": 1}
+
+
+def test_histogram_quantiles():
+    histogram = Histogram((1, 10, 100))
+    for value in [0.5] * 50 + [5] * 40 + [50] * 9 + [500]:
+        histogram.observe(value)
+
+    summary = histogram.summary()
+    assert summary["count"] == 100
+    assert summary["max"] == 500.0
+    assert (summary["p50"], summary["p90"], summary["p99"]) == (1.0, 10.0, 100.0)
+    assert histogram.quantile(1.0) == 500.0  # the overflow bucket
+    assert Histogram().summary()["p99"] == 0.0
+
+
+def test_timed():
+    clock = FakeClock()
+    metrics = Metrics(clock=clock)
+    histogram = metrics.histogram("decode_seconds")
+    with pytest.raises(ValueError), metrics.time(histogram):
+        clock.now += 0.02
+        raise ValueError()
+
+    assert histogram.count == 1
+    assert histogram.sum == pytest.approx(0.02)
+
+
+def test_gauges_sampled_on_export(metrics):
+    depth = [3]
+    metrics.gauge("stage_queue_depth", lambda: depth[0], stage="decode")
+    assert metrics.report()["stage_queue_depth{stage=decode}"] == 3
+    depth[0] = 1
+    assert metrics.report()["stage_queue_depth{stage=decode}"] == 1
+
+    metrics.gauge("broken", lambda: 1 / 0)
+    assert "broken" not in metrics.report()
+
+
+def test_influx_points(metrics):
+    metrics.counter("tags_no_parser", packet_type="unknown").inc(2)
+    metrics.histogram("stage_batch_items", SIZE_BUCKETS, stage="decode").observe(2_000)
+
+    points = metrics.influx_points(tags={"script": "test"}, timestamp=1_000)
+    buffer = LineProtocolBuffer()
+    for point in points:
+        assert buffer.append_point(point)
+
+    lines = buffer.getvalue().decode().splitlines()
+    assert lines[0] == "monitor_self,metric=tags_no_parser,packet_type=unknown,script=test value=2i 1000"
+    assert lines[1].startswith("monitor_self,metric=stage_batch_items,script=test,stage=decode count=1i,sum=2000,")
+
+
+def test_prometheus_text(metrics):
+    metrics.counter("qpe_request_errors", endpoint="getTagData").inc()
+    histogram = metrics.histogram("qpe_request_seconds", (0.1, 1.0), endpoint="getTagData")
+    histogram.observe(0.05)
+    histogram.observe(5.0)
+
+    assert metrics.prometheus().splitlines() == [
+        'qpe_request_errors_total{endpoint="getTagData"} 1',
+        'qpe_request_seconds_bucket{endpoint="getTagData",le="0.1"} 1',
+        'qpe_request_seconds_bucket{endpoint="getTagData",le="1.0"} 1',
+        'qpe_request_seconds_bucket{endpoint="getTagData",le="+Inf"} 2',
+        'qpe_request_seconds_sum{endpoint="getTagData"} 5.05',
+        'qpe_request_seconds_count{endpoint="getTagData"} 2',
+    ]
+
+
+def test_served_locally(metrics):
+    metrics.counter("tags_parsed", packet_type="minew_s1").inc(7)
+    with MetricsServer(metrics, ("127.0.0.1", 0)) as server:
+        with urllib.request.urlopen(server.url, timeout=2.0) as res:
+            assert res.read().decode() == 'tags_parsed_total{packet_type="minew_s1"} 7\n'
+        with urllib.request.urlopen(f"{server.url}.json", timeout=2.0) as res:
+            assert json.load(res) == {"tags_parsed{packet_type=minew_s1}": 7}
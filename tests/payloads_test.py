@@ -0,0 +1,34 @@
+import src.sensortags.sensordata as sensor
+from src.sensortags.payloads import payload_to_bytes, payloads_to_bytes
+
+
+def test_payload_to_bytes():
+    assert payload_to_bytes("0x02 0x01 0x06 0xff") == b"\x02\x01\x06\xff"
+    assert payload_to_bytes("020106ff") == b"\x02\x01\x06\xff"
+    assert payload_to_bytes("") == b""
+
+
+def test_payloads_to_bytes():
+    assert payloads_to_bytes(["0x02 0x01", "0xbe 0xac 0x00"]) == [b"\x02\x01", b"\xbe\xac\x00"]
+
+
+def test_payload_bytes_cached_on_tag():
+    tag = sensor.GatewayTag("tag_id", "0xff 0x12", 5, 10, "locid", "somelocator")
+
+    assert tag.payload_bytes() == b"\xff\x12"
+    assert tag.payload_bytes() is tag.payload_bytes()
+    assert "_payload_bytes" not in tag.as_influx_point_dict()["fields"]
+
+
+def test_payload_bytes_not_an_input():
+    raw = {"tagId": "tag_id", "advertisingDataPayload": "0xff 0x12", "advertisingDataPayloadTS": 5}
+    raw.update(advertisingDataPayloadSignalStrength=10, advertisingDataPayloadLocatorId="locid")
+    raw.update(advertisingDataPayloadLocatorName="somelocator", payload_bytes=b"\x00")
+    tag = sensor.GatewayTag.from_any_dict(raw)
+    same = sensor.GatewayTag.from_any_dict(raw)
+    same.payload_bytes()
+
+    assert tag == same  # only same has its payload bytes cached
+    assert tag.payload_bytes() == b"\xff\x12"
+    assert "payload_bytes" not in repr(tag)
+    assert ("payload_bytes", "_payload_bytes") not in sensor.GatewayTag._input_keys()
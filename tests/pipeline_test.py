@@ -0,0 +1,139 @@
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from src.helpers.metrics import Metrics
+from src.helpers.pipeline import Pipeline, Stage, batched
+from src.sensortags.readings import SensorReading
+
+from tests.layouts_test import PARSER_TEST_DATA
+from tests.readings_test import raw_tag
+
+
+def double(batch: list) -> list:
+    return [item * 2 for item in batch]
+
+
+def decode(tags: list) -> list:
+    return [SensorReading.from_any_dict(tag) for tag in tags]
+
+
+def test_batched():
+    assert list(batched(list(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(batched([], 2)) == []
+
+
+def test_stages_in_order():
+    results = []
+    with Pipeline(batched(list(range(100)), 7), [Stage("double", double), Stage("sink", results.extend)]) as pipeline:
+        assert pipeline.join(timeout=5.0)
+
+    assert results == [item * 2 for item in range(100)]
+    report = pipeline.report()
+    assert list(report) == ["fetch", "double", "sink"]
+    assert report["fetch"]["items"] == report["double"]["items"] == report["sink"]["items"] == 100
+    assert report["double"]["batches"] == 15
+
+
+def test_executor_keeps_order():
+    def slow_first(batch: list) -> list:
+        time.sleep(0.05 if batch[0] == 0 else 0.0)
+        return batch
+
+    results = []
+    with ThreadPoolExecutor(4) as executor:
+        stages = [Stage("slow", slow_first, executor=executor, concurrency=4), Stage("sink", results.extend)]
+        with Pipeline(batched(list(range(20)), 2), stages) as pipeline:
+            assert pipeline.join(timeout=5.0)
+
+    assert results == list(range(20))
+
+
+def test_decoded_in_processes():
+    tags = [raw_tag(adv_data, str(index)) for (index, (_, adv_data)) in enumerate(PARSER_TEST_DATA)]
+    results = []
+    with ProcessPoolExecutor(2) as executor:
+        stages = [Stage("decode", decode, executor=executor, concurrency=4), Stage("sink", results.extend)]
+        with Pipeline(batched(tags, 3), stages) as pipeline:
+            assert pipeline.join(timeout=30.0)
+
+    assert [reading.as_influx_point_dict() for reading in results] == [
+        reading.as_influx_point_dict() for reading in decode(tags)
+    ]
+
+
+def test_backpressure_bounds_queued_batches():
+    fetched = []
+    release = threading.Event()
+
+    def source():
+        for index in range(100):
+            fetched.append(index)
+            yield [index]
+
+    pipeline = Pipeline(source(), [Stage("blocked", lambda batch: release.wait())], queue_size=2)
+    pipeline.start()
+    time.sleep(0.1)
+
+    # one batch in the stage, two queued and one waiting to be queued by the source
+    assert len(fetched) == 4
+    assert pipeline.report()["blocked"]["queue_depth"] == 2
+
+    release.set()
+    assert pipeline.join(timeout=5.0)
+    assert pipeline.report()["blocked"]["items"] == 100
+
+
+def test_failed_batch_dropped():
+    def fail_on_odd(batch: list) -> list:
+        if batch[0] % 2:
+            raise ValueError("odd")
+        return batch
+
+    results = []
+    with Pipeline(batched(list(range(4)), 1), [Stage("even", fail_on_odd), Stage("sink", results.extend)]) as pipeline:
+        assert pipeline.join(timeout=5.0)
+
+    assert results == [0, 2]
+    assert pipeline.report()["even"]["errors"] == 2
+
+
+def test_failed_source_ends_the_pipeline():
+    def fail_after_one():
+        yield [1]
+        raise ValueError("source broke")
+
+    results = []
+    with Pipeline(fail_after_one(), [Stage("sink", results.extend)]) as pipeline:
+        assert pipeline.join(timeout=5.0)
+
+    assert results == [1]
+    assert isinstance(pipeline.error, ValueError)
+    assert pipeline.report()["fetch"]["errors"] == 1
+
+
+def test_close_stops_an_endless_source():
+    def forever():
+        while True:
+            time.sleep(0.01)
+            yield [1]
+
+    results = []
+    pipeline = Pipeline(forever(), [Stage("sink", results.extend)])
+    pipeline.start()
+    time.sleep(0.05)
+
+    assert pipeline.close(timeout=1.0)
+    assert len(results) == pipeline.report()["fetch"]["items"]
+
+
+def test_stages_measured():
+    metrics = Metrics()
+    with Pipeline(batched(list(range(100)), 10), [Stage("double", double)], metrics=metrics) as pipeline:
+        assert pipeline.join(timeout=5.0)
+
+    report = metrics.report()
+    assert report["stage_batch_items{stage=fetch}"]["count"] == 10
+    assert report["stage_batch_items{stage=double}"]["sum"] == 100.0
+    assert report["stage_batch_seconds{stage=double}"]["count"] == 10
+    assert report["stage_queue_depth{stage=double}"] == 0
@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+from src.helpers.profiling import CycleProfiler
+from src.sensortags.sensordata import GatewayTag
+from src.sensortags.synthetic import synthetic_tags
+
+
+def gateway_points(tags: list) -> list:
+    points = []
+    for tag in tags:
+        gateway_tag = GatewayTag.from_any_dict(tag)
+        if gateway_tag.tokenize_data():
+            points.append(gateway_tag.as_influx_point_dict(tag_keys=["tagId"]))
+    return points
+
+
+@pytest.fixture
+def tags():
+    return synthetic_tags(200, gateway_ratio=1.0, unparseable_ratio=0.0, seed=1)
+
+
+def test_every_nth_cycle_profiled(tmp_path):
+    profiler = CycleProfiler(every=3, directory=tmp_path, frames=0)
+    calls = []
+    work = profiler.profiled(lambda: calls.append(profiler.active))
+
+    reports = []
+    for _ in range(7):
+        work()
+        reports.append(profiler.cycle())
+
+    assert calls == [False, False, True, False, False, True, False]
+    assert [report is not None for report in reports] == [False, False, True, False, False, True, False]
+    assert reports[2].name.endswith("-cycle3.txt")
+    assert reports[2].with_suffix(".pstats").exists()
+
+
+def test_hotspots_reported_from_every_thread(tmp_path, tags):
+    profiler = CycleProfiler(every=1, directory=tmp_path, frames=0)
+    profiled_points = profiler.profiled(gateway_points)
+
+    thread = threading.Thread(target=profiled_points, args=(tags,))
+    thread.start()
+    thread.join()
+    profiled_points(tags)
+    report = profiler.cycle().read_text()
+
+    assert "# Callees of tokenize_data" in report
+    assert "tokenize_data" in report.split("# Callees of tokenize_data")[1].split("#")[0]
+    assert "400 " in report  # as_influx_point_dict calls of both threads, merged
+
+
+def test_allocation_growth(tmp_path):
+    profiler = CycleProfiler(every=1, directory=tmp_path, frames=1)
+    kept = profiler.profiled(lambda: [bytearray(1024) for _ in range(1000)])()
+    report = profiler.cycle().read_text()
+    profiler.close()
+
+    growth = report.split("allocation growth since the last report\n")[1].splitlines()
+    assert "profiling_test.py" in growth[0]
+    assert len(kept) == 1000
+
+
+def test_reports_rotated(tmp_path):
+    profiler = CycleProfiler(every=1, directory=tmp_path, keep=2, frames=0)
+    reports = []
+    for _ in range(4):
+        profiler.profiled(sum)([1, 2])
+        reports.append(profiler.cycle())
+
+    assert sorted(tmp_path.glob("profile-*.txt")) == sorted(reports[2:])
+    assert len(list(tmp_path.glob("profile-*.pstats"))) == 2
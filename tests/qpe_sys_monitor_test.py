@@ -0,0 +1,30 @@
+import src.standalone_scripts.qpe_sys_monitor as qsm
+
+LINES = b"qpe cpuLoad=1.5 1\nqpe cpuLoad=2.5 2"
+
+
+def test_spooled_points_taken_once(tmp_path):
+    spool = qsm.LineSpool(tmp_path / "spool" / "qpe.lp")
+
+    spool.append(LINES)
+    spool.append(LINES.decode() + "\n")
+
+    assert spool.take() == LINES + b"\n" + LINES + b"\n"
+    assert spool.take() == b""
+    assert spool.pending_bytes == 0
+
+
+def test_spool_kept_between_runs(tmp_path):
+    qsm.LineSpool(tmp_path / "qpe.lp").append(LINES)
+
+    assert qsm.LineSpool(tmp_path / "qpe.lp").take() == LINES + b"\n"
+
+
+def test_points_past_max_bytes_dropped(tmp_path):
+    spool = qsm.LineSpool(tmp_path / "qpe.lp", max_bytes=len(LINES) + 1)
+
+    spool.append(LINES)
+    spool.append(LINES)
+
+    assert spool.dropped_points == 2
+    assert spool.take() == LINES + b"\n"
@@ -0,0 +1,149 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from src.helpers.metrics import Metrics
+from src.helpers.qpe import QpeClient, QpeError
+from src.sensortags.sensordata import QpeInfoData
+
+PE_INFO = {
+    "cpuLoad": 5.0,
+    "issues": [],
+    "memoryAllocated": 6.0,
+    "memoryFree": 7.0,
+    "memoryMax": 8.0,
+    "memoryUsed": 4.0,
+    "packetsPerSecond": 10.2,
+    "projectName": "projname",
+    "running": True,
+    "udpRx": 11.2,
+    "udpTx": 15.6,
+}
+TAGS = [
+    {"tagId": "a", "advertisingDataPayload": None},
+    {"tagId": "b", "advertisingDataPayload": "0x02 0x01 0x06"},
+]
+
+
+class StandInQpe(ThreadingHTTPServer):
+    """answers from self.responses, path without query -> response dict, or raw body bytes"""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.responses = {
+            "/qpe/getPEInfo": {"code": 0, "positioningEngine": PE_INFO},
+            "/qpe/getTagData": {"code": 0, "tags": TAGS},
+        }
+        self.requests = []  # (path, client port)
+        self.delay = 0.0
+        threading.Thread(target=self.serve_forever, args=(0.01,), daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/qpe"
+
+    def handle_error(self, request, client_address):
+        pass  # e.g. a client that timed out and hung up
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep alive
+    disable_nagle_algorithm = True  # headers and body are separate writes
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.client_address[1]))
+        time.sleep(self.server.delay)
+        response = self.server.responses.get(self.path.split("?")[0])
+        body = response if isinstance(response, bytes) else json.dumps(response).encode()  # bytes as is
+        self.send_response(200 if response else 404)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def qpe():
+    server = StandInQpe()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_typed_results(qpe):
+    with QpeClient(qpe.url) as client:
+        info = client.get_pe_info()
+        tags = client.get_gateway_data()
+
+    assert type(info).__name__ == QpeInfoData.__name__  # imported as sensortags.sensordata by the client
+    assert info.percentMemoryUsed == 0.5
+    assert [tag["tagId"] for tag in tags] == ["b"]
+
+
+def test_connection_kept_alive(qpe):
+    with QpeClient(qpe.url) as client:
+        for _ in range(5):
+            client.get_tag_data()
+
+    assert len({port for (_, port) in qpe.requests}) == 1
+
+
+def test_query_params(qpe):
+    qpe.responses["/qpe/setTagGroup"] = {"code": 0}
+    with QpeClient(qpe.url) as client:
+        client.set_tag_group(["a", "b"], "group")
+
+    assert qpe.requests[0][0] == "/qpe/setTagGroup?tag=a%2Cb&targetGroup=group"
+
+
+def test_qpe_error_code(qpe):
+    qpe.responses["/qpe/getTagData"] = {"code": 11, "message": "not in track mode"}
+    with QpeClient(qpe.url) as client, pytest.raises(QpeError) as error:
+        client.get_tag_data()
+
+    assert error.value.code == 11
+
+
+def test_read_timeout(qpe):
+    qpe.delay = 0.2
+    with QpeClient(qpe.url, timeout=(1.0, 0.05)) as client, pytest.raises(requests.Timeout):
+        client.get_tag_data()
+
+
+def test_streamed_gateway_data(qpe):
+    with QpeClient(qpe.url) as client:
+        assert client.get_gateway_data(stream=True) == client.get_gateway_data()
+
+        qpe.responses["/qpe/getTagData"] = {"code": 11}
+        with pytest.raises(QpeError):
+            client.get_gateway_data(stream=True)
+
+
+def test_requests_measured(qpe):
+    metrics = Metrics()
+    with QpeClient(qpe.url, metrics=metrics) as client:
+        client.get_pe_info()
+        client.get_gateway_data(stream=True)
+    qpe.delay = 0.2
+    with QpeClient(qpe.url, timeout=(1.0, 0.05), metrics=metrics) as client, pytest.raises(requests.Timeout):
+        client.get_tag_data()
+
+    report = metrics.report()
+    assert report["qpe_request_seconds{endpoint=getPEInfo}"]["count"] == 1
+    body = json.dumps(qpe.responses["/qpe/getTagData"])
+    assert report["qpe_response_bytes{endpoint=getTagData}"]["sum"] == len(body)
+    assert report["qpe_request_errors{endpoint=getTagData}"] == 1
+
+
+def test_truncated_gateway_data(qpe):
+    metrics = Metrics()
+    qpe.responses["/qpe/getTagData"] = json.dumps({"code": 0, "tags": TAGS}).encode()[:-20]
+    with QpeClient(qpe.url, metrics=metrics) as client, pytest.raises(ValueError):
+        client.get_gateway_data(stream=True)
+
+    assert metrics.report()["qpe_request_errors{endpoint=getTagData}"] == 1
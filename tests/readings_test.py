@@ -0,0 +1,68 @@
+import pickle
+import sys
+
+import pytest
+import src.sensortags.sensordata as sensor
+from src.sensortags.readings import SensorReading, record_type
+
+from tests.layouts_test import PARSER_TEST_DATA
+
+
+def raw_tag(adv_data: str, tag_id: str = "ac233fab8231") -> dict:
+    return {
+        "tagId": tag_id,
+        "advertisingDataPayload": " ".join(f"0x{adv_data[i:i + 2]}" for i in range(0, len(adv_data), 2)),
+        "advertisingDataPayloadTS": 1650000000000,
+        "advertisingDataPayloadSignalStrength": -60.0,
+        "advertisingDataPayloadLocatorId": "locid",
+        "advertisingDataPayloadLocatorName": "somelocator",
+    }
+
+
+@pytest.mark.parametrize("parser, adv_data", PARSER_TEST_DATA)
+def test_same_point_as_gateway_tag(parser, adv_data):
+    tag = sensor.GatewayTag.from_any_dict(raw_tag(adv_data))
+    assert tag.tokenize_data()
+
+    reading = SensorReading.from_any_dict(raw_tag(adv_data))
+
+    assert reading.as_influx_point_dict() == tag.as_influx_point_dict(
+        tag_keys=["tagId", "advertisingDataPayloadLocatorId"]
+    )
+
+
+def test_decoded_values_as_attributes():
+    reading = SensorReading.from_any_dict(raw_tag("0201060303e1ff1016e1ffa101640a304c593182ab3f23ac"))
+
+    assert reading.packet_type == "minew_s1"
+    assert reading.temperature == 10.1875
+    assert getattr(reading, "measurement_sequence_number", None) is None
+    assert not hasattr(reading, "__dict__")
+
+
+def test_ids_interned():
+    tag_id = "".join(["ac23", "3fab8231"])  # not interned by the compiler
+    reading = SensorReading.from_any_dict(raw_tag("0201060303e1ff1016e1ffa101640a304c593182ab3f23ac", tag_id))
+
+    assert reading.tagId is sys.intern("ac233fab8231")
+
+
+def test_record_type_shared_per_packet_type():
+    values = {"temperature": 1.0, "_mac": "aa"}
+
+    assert record_type("x", values) is record_type("x", dict(values))
+    assert record_type("x", values) is not record_type("y", values)
+
+
+def test_unparseable_payload():
+    assert SensorReading.from_any_dict(raw_tag("ffffffff")) is None
+
+
+@pytest.mark.parametrize("parser, adv_data", PARSER_TEST_DATA)
+def test_pickled(parser, adv_data):
+    reading = SensorReading.from_any_dict(raw_tag(adv_data))
+
+    copy = pickle.loads(pickle.dumps(reading))
+
+    assert copy.as_influx_point_dict() == reading.as_influx_point_dict()
+    assert type(copy.values) is type(reading.values)
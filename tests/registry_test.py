@@ -0,0 +1,202 @@
+import importlib
+import pkgutil
+import re
+import threading
+
+import pytest
+
+import src.sensortags.sensordata as sensor
+from src.sensortags.registry import ParserCache, ParserRegistry, device_type_of
+
+S1_ADV_DATA = "0201060303e1ff1016e1ffa101640a304c593182ab3f23ac"
+S1_PAYLOAD = " ".join(f"0x{S1_ADV_DATA[i:i + 2]}" for i in range(0, len(S1_ADV_DATA), 2))
+S1_BYTES = bytes.fromhex(S1_ADV_DATA)
+UNKNOWN_BYTES = bytes.fromhex("ffffffff")
+# frames with the header of a parser and one byte its tokens_reg_ex does not allow
+REJECTED_FRAMES = [
+    "0201050303e1ff0d16e1ffa10264016b9aa23f23ac",  # minew_e6, AD flags
+    "0201060303e1ff0d16e1ffa10263016b9aa23f23ac",  # minew_e6, battery not 64
+    "0201060303e1ff0d16e1ffa10264026b9aa23f23ac",  # minew_e6, light value not of binary digits
+    "0201060303e1fe1016e1ffa101640a304c593182ab3f23ac",  # minew_s1, service UUID list
+    "02010613ff3906a40164010101ff0677aa3f23ac3b5a",  # minew_s4_alarm, AD length
+    "02010612ff3906a40164020101ff0677aa3f23ac3b5a",  # minew_s4_alarm, alarm status
+    "02010612ff3906a40164010120ff0677aa3f23ac3b5a",  # minew_s4_alarm, alarm trigger sign
+    "02010612ff3906a40164010101fe0677aa3f23ac3b5a",  # minew_s4_alarm, no ff after the flags
+    "03010611ff990403658145c71effcafff404050b71",  # ruuvi_raw_v1, AD flags type
+    "03010611ff99040512fc5394c37c0004fffc040cac364200cdcbb8334c884f",  # ruuvi_raw_v2_f5, AD flags type
+]
+
+
+def test_discovers_all_parsers():
+    registry = ParserRegistry()
+
+    assert set(registry.parsers) == {"minew_e6", "minew_s1", "minew_s4_alarm", "ruuvi_raw_v1", "ruuvi_raw_v2_f5"}
+    assert registry.patterns == {}  # compiled on first use
+
+
+def test_precomputed_parser_list_complete():
+    package = importlib.import_module("src.sensortags.parsers")
+    scanned = {info.name for info in pkgutil.iter_modules(package.__path__) if not info.ispkg}
+
+    assert set(package.PARSERS) == scanned
+
+
+def test_patterns_compiled_once():
+    registry = ParserRegistry()
+    parser = registry.get("minew_s1")
+
+    assert registry.pattern(parser) is registry.pattern(parser)
+    assert set(registry.patterns) == {"minew_s1"}
+
+
+def test_get_by_device_type():
+    registry = ParserRegistry()
+
+    assert device_type_of(registry.get("minew_s1")) == "minew_s1"
+    assert registry.get("not_a_parser") is None
+
+
+def test_match_payload():
+    registry = ParserRegistry()
+
+    assert device_type_of(registry.match(S1_BYTES)) == "minew_s1"
+    assert registry.match(UNKNOWN_BYTES) is None
+
+
+def test_discovery_independent_of_working_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    assert len(ParserRegistry().parsers) == 5
+
+
+def test_tokenize_with_registry():
+    tag = sensor.GatewayTag("ac233fab8231", S1_PAYLOAD, 5, -60, "locid", "somelocator")
+
+    assert tag.tokenize_data()
+    assert tag._packet_type == "minew_s1"
+    assert tag.battery_level == 100
+
+
+def test_header_routes_to_one_candidate():
+    registry = ParserRegistry()
+
+    assert registry.candidates(S1_BYTES) == ["minew_s1"]
+    assert registry.candidates(bytes.fromhex("0201060303e1ff0d16e1ffa10264016b9aa23f23ac")) == ["minew_e6"]
+    assert registry.candidates(
+        bytes.fromhex("02010611ff99040512fc5394c37c0004fffc040cac364200cdcbb8334c884f")
+    ) == ["ruuvi_raw_v2_f5"]
+    assert registry.candidates(UNKNOWN_BYTES) == []
+
+
+def test_header_does_not_skip_format_check():
+    registry = ParserRegistry()
+    truncated = S1_BYTES[:15]
+
+    assert registry.candidates(truncated) == ["minew_s1"]
+    assert registry.match(truncated) is None
+
+
+@pytest.mark.parametrize("adv_data", REJECTED_FRAMES)
+def test_layout_checks_what_the_regex_does(adv_data):
+    registry = ParserRegistry()
+    payload = bytes.fromhex(adv_data)
+    (device_type,) = registry.candidates(payload)
+    parser = registry.get(device_type)
+
+    assert re.match(parser.tokens_reg_ex, adv_data, re.VERBOSE) is None
+    assert not registry.accepts(parser, payload)
+    assert registry.match(payload) is None
+    assert registry.decode(parser, payload) is None
+
+
+def test_cached_parser_checks_the_layout():
+    cache = ParserCache(ParserRegistry())
+    e6 = "0201060303e1ff0d16e1ffa10264016b9aa23f23ac"
+
+    assert device_type_of(cache.resolve("tag", bytes.fromhex(e6))) == "minew_e6"
+    assert cache.resolve("tag", bytes.fromhex(REJECTED_FRAMES[2])) is None
+
+
+def test_duplicate_header_rejected():
+    registry = ParserRegistry()
+
+    with pytest.raises(ValueError):
+        registry.register("minew_s1_copy", registry.get("minew_s1"))
+
+
+def test_cache_hit_and_negative_result():
+    cache = ParserCache(ParserRegistry())
+
+    assert device_type_of(cache.resolve("tag", S1_BYTES)) == "minew_s1"
+    assert device_type_of(cache.resolve("tag", S1_BYTES)) == "minew_s1"
+    assert cache.resolve("unknown", UNKNOWN_BYTES) is None
+    assert cache.resolve("unknown", UNKNOWN_BYTES) is None
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_cache_invalidated_on_payload_change():
+    cache = ParserCache(ParserRegistry())
+    cache.resolve("tag", S1_BYTES)
+
+    assert cache.resolve("tag", UNKNOWN_BYTES) is None
+    assert cache.misses == 2
+
+
+def test_negative_cache_expires_and_follows_header():
+    cache = ParserCache(ParserRegistry(), negative_ttl=0.0)
+    cache.resolve("tag", UNKNOWN_BYTES)
+    assert cache.resolve("tag", UNKNOWN_BYTES) is None
+    assert cache.misses == 2
+
+    cache = ParserCache(ParserRegistry())
+    cache.resolve("tag", UNKNOWN_BYTES)
+    assert device_type_of(cache.resolve("tag", S1_BYTES)) == "minew_s1"
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ParserCache(ParserRegistry(), max_size=2)
+    for tag_id in ("a", "b", "a", "c"):
+        cache.resolve(tag_id, S1_BYTES)
+
+    assert list(cache.entries) == ["a", "c"]
+
+
+def test_cache_persistence(tmp_path):
+    cache = ParserCache(ParserRegistry())
+    cache.resolve("tag", S1_BYTES)
+    cache.resolve("unknown", UNKNOWN_BYTES)
+    cache.save(tmp_path / "parsers.json")
+
+    warm = ParserCache(ParserRegistry())
+    warm.load(tmp_path / "parsers.json")
+    warm.load(tmp_path / "missing.json")
+
+    assert list(warm.entries) == ["tag"]
+    assert device_type_of(warm.resolve("tag", S1_BYTES)) == "minew_s1"
+    assert warm.misses == 0
+
+
+def test_cache_saved_while_resolving(tmp_path):
+    cache = ParserCache(ParserRegistry())
+    tag_ids = [f"tag{number}" for number in range(1_000)]
+    for tag_id in tag_ids:
+        cache.resolve(tag_id, S1_BYTES)
+    stop = threading.Event()
+
+    def resolve():  # every hit moves its tag to the end of the entries
+        while not stop.is_set():
+            for tag_id in tag_ids:
+                cache.resolve(tag_id, S1_BYTES)
+
+    thread = threading.Thread(target=resolve)
+    thread.start()
+    try:
+        for _ in range(50):
+            cache.save(tmp_path / "parsers.json")
+    finally:
+        stop.set()
+        thread.join()
+
+    warm = ParserCache(ParserRegistry())
+    warm.load(tmp_path / "parsers.json")
+    assert sorted(warm.entries) == sorted(tag_ids)
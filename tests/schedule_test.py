@@ -0,0 +1,106 @@
+import time
+
+import pytest
+from src.helpers.schedule import COALESCE, SKIP, PollScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_deadlines_do_not_drift(clock):
+    scheduler = PollScheduler(10.0, clock=clock)
+    assert scheduler.next_delay() == 0.0
+
+    clock.now += 3.0  # the cycle took 3 s
+    assert scheduler.next_delay() == pytest.approx(7.0)
+    clock.now += 7.0 + 4.5
+    assert scheduler.next_delay() == pytest.approx(5.5)
+    assert scheduler.deadline == pytest.approx(120.0)
+    assert scheduler.overruns == 0
+
+
+def test_offset(clock):
+    scheduler = PollScheduler(10.0, offset=2.5, clock=clock)
+    assert scheduler.next_delay() == 2.5
+    clock.now += 2.5
+    assert scheduler.next_delay() == pytest.approx(10.0)
+
+
+def test_overrun_skipped(clock):
+    scheduler = PollScheduler(10.0, policy=SKIP, clock=clock)
+    scheduler.next_delay()
+
+    clock.now += 25.0  # ran past the deadlines at 110 and 120
+    assert scheduler.next_delay() == pytest.approx(5.0)  # waits for 130, on the grid
+
+    assert scheduler.overruns == 1
+    assert scheduler.skipped == 2
+    assert scheduler.max_lateness == pytest.approx(15.0)
+
+
+def test_overrun_coalesced(clock):
+    scheduler = PollScheduler(10.0, policy=COALESCE, clock=clock)
+    scheduler.next_delay()
+
+    clock.now += 25.0
+    assert scheduler.next_delay() == 0.0  # the missed cycles run once, right away
+    clock.now += 1.0
+    assert scheduler.next_delay() == pytest.approx(9.0)  # the grid restarted at 125
+
+    assert scheduler.overruns == 1
+    assert scheduler.skipped == 1
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        PollScheduler(10.0, policy="catch up")
+
+
+def test_adapts_within_range(clock):
+    scheduler = PollScheduler(8.0, min_interval=2.0, max_interval=20.0, target=0.5, clock=clock)
+
+    assert scheduler.adapt(1.0) == pytest.approx(4.0)  # every tag changed, poll faster
+    assert scheduler.adapt(1.0) == pytest.approx(2.0)
+    assert scheduler.adapt(1.0) == pytest.approx(2.0)  # at min_interval
+    assert scheduler.adapt(0.4) == pytest.approx(2.5)
+    assert scheduler.adapt(0.0) == pytest.approx(5.0)  # nothing changed, at most doubled
+    for _ in range(5):
+        scheduler.adapt(0.0)
+    assert scheduler.interval == 20.0
+
+
+def test_not_adaptive_without_target(clock):
+    scheduler = PollScheduler(8.0, min_interval=2.0, max_interval=20.0, clock=clock)
+    assert not scheduler.adaptive
+    assert scheduler.adapt(1.0) == 8.0
+
+
+def test_adapted_interval_applies_to_the_next_deadline(clock):
+    scheduler = PollScheduler(10.0, min_interval=1.0, max_interval=10.0, target=0.5, clock=clock)
+    scheduler.next_delay()
+    scheduler.adapt(1.0)
+
+    clock.now += 1.0
+    assert scheduler.next_delay() == pytest.approx(4.0)
+
+
+def test_iterates_on_real_deadlines():
+    scheduler = PollScheduler(0.02)
+    start = time.monotonic()
+    for cycle in scheduler:
+        time.sleep(0.005)
+        if cycle == 5:
+            break
+
+    assert time.monotonic() - start == pytest.approx(0.085, abs=0.02)
+    assert scheduler.overruns == 0
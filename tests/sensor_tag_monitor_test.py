@@ -0,0 +1,99 @@
+from src.helpers.metrics import Metrics
+from src.helpers.pipeline import Pipeline, Stage
+from src.helpers.qpe import QpeClient
+from src.helpers.udp import UdpTagListener
+from src.sensor_tag_monitor import (
+    count_decoded,
+    decode_chunk,
+    get_gateway_data,
+    poll_gateway_data,
+    push_gateway_data,
+    receive_gateway_data,
+)
+from src.sensortags.changes import ChangeTracker
+
+from tests.qpe_test import StandInQpe
+from tests.readings_test import raw_tag
+from tests.udp_test import StandInQpeSender
+
+MINEW_S1 = "0201060303e1ff1016e1ffa101640a304c593182ab3f23ac"
+
+
+class Cycles(list):
+    """a scheduler that is not adaptive and runs out"""
+
+    adaptive = False
+
+
+def test_failed_poll_skipped():
+    polls = []
+
+    def fetch(qpe, url=None) -> list[dict]:
+        polls.append(url)
+        if len(polls) == 2:
+            raise RuntimeError("unexpected response")
+        return [{**raw_tag(MINEW_S1, "a"), "advertisingDataPayloadTS": len(polls)}]
+
+    results = []
+    source = poll_gateway_data(None, ChangeTracker(), "url", Cycles(range(4)), 10, fetch=fetch)
+    with Pipeline(source, [Stage("sink", results.extend)]) as pipeline:
+        assert pipeline.join(timeout=5.0)
+
+    assert [tag["advertisingDataPayloadTS"] for tag in results] == [1, 3, 4]
+    assert pipeline.error is None
+
+
+def test_failed_receive_skipped():
+    received = []
+
+    def receive(listener, changes) -> list[dict]:
+        received.append(None)
+        if len(received) == 1:
+            raise RuntimeError("unexpected datagram")
+        return [{**raw_tag(MINEW_S1, "a"), "advertisingDataPayloadTS": len(received)}]
+
+    source = push_gateway_data(None, ChangeTracker(), 10, receive=receive)
+
+    assert [next(source)[0]["advertisingDataPayloadTS"] for _ in range(2)] == [2, 3]
+
+
+def test_decoded_chunk_counted():
+    metrics = Metrics()
+    chunk = decode_chunk([raw_tag(MINEW_S1, "a"), raw_tag("ffffffff", "b")])
+
+    readings = count_decoded(chunk, metrics)
+
+    assert [reading.tagId for reading in readings] == ["a"]
+    assert metrics.report() == {"tags_parsed{packet_type=minew_s1}": 1, "tags_no_parser{packet_type=unknown}": 1}
+
+
+def test_incomplete_pushed_tags_counted():
+    with UdpTagListener(0, host="127.0.0.1") as listener:
+        sender = StandInQpeSender(listener.address)
+        sender.send({"tagId": "a", "advertisingDataPayload": "0x02"})  # no advertisingDataPayloadTS
+        sender.send({**raw_tag(MINEW_S1, "b"), "tagId": ["b"]})
+        sender.send({"tagId": "c", "advertisingDataPayload": None})  # no gateway data, not invalid
+        sender.send(raw_tag(MINEW_S1, "d"))
+        sender.close()
+
+        tags = []
+        for _ in range(10):
+            tags += receive_gateway_data(listener, ChangeTracker(), timeout=0.2)
+            if listener.datagrams == 4:
+                break
+
+        assert [tag["tagId"] for tag in tags] == ["d"]
+        assert listener.invalid == 2
+
+
+def test_truncated_response_skipped():
+    metrics = Metrics()
+    qpe = StandInQpe()
+    qpe.responses["/qpe/getTagData"] = b'{"code": 0, "tags": [{"tagId": "a", "advertisingDataPayload": "0x0'
+
+    with QpeClient(qpe.url, metrics=metrics) as client:
+        assert get_gateway_data(client) == []
+    qpe.shutdown()
+    qpe.server_close()
+
+    assert metrics.report()["qpe_request_errors{endpoint=getTagData}"] == 1
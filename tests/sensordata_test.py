@@ -49,3 +49,27 @@ def test_from_any_dict():
     tag = sensor.QpeInfoData.from_any_dict(test_vals)
 
     assert "notinc" not in tag.__dict__
+
+
+def test_fields_to_ignore_not_mutated():
+    tag = sensor.GatewayTag("gtag", "0xff 0x12", 5, 10, "locid", "somelocator")
+    setattr(tag, "pub", 1)
+    setattr(tag, "ignored", 2)
+    fields_to_ignore = ["ignored"]
+    point_dict = tag.as_influx_point_dict(tag_keys=["tagId"], fields_to_ignore=fields_to_ignore)
+
+    assert fields_to_ignore == ["ignored"]
+    assert point_dict["tags"] == {"tagId": "gtag"}
+    assert point_dict["fields"] == {"advertisingDataPayloadLocatorId": "locid", "pub": 1}
+
+
+def test_point_converter_cached():
+    first = sensor.InfluxPoint.point_converter("m", ("a",), frozenset(["b"]))
+    second = sensor.InfluxPoint.point_converter("m", ("a",), frozenset(["b"]))
+
+    assert first is second
+    assert first({"a": 1, "b": 2, "c": 3, "_d": 4}) == {
+        "measurement": "m",
+        "tags": {"a": 1},
+        "fields": {"c": 3, "_d": 4},
+    }
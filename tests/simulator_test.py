@@ -0,0 +1,133 @@
+import time
+
+import pytest
+import requests
+from src.helpers.qpe import QpeClient, QpeError
+from src.helpers.simulator import CONFIG_STEPS, NOT_IN_TRACK_MODE, TAG_DATA_FORMATS, QpeSimulator
+from src.sensortags.readings import SensorReading
+
+
+@pytest.fixture
+def qpe():
+    with QpeSimulator(("127.0.0.1", 0), tags=200, advertising_interval=(0.05, 0.1), config_step=0.05) as qpe:
+        yield qpe
+
+
+@pytest.fixture
+def client(qpe):
+    with QpeClient(qpe.url, timeout=(1.0, 2.0)) as client:
+        yield client
+
+
+@pytest.mark.parametrize("tag_format", ["defaultInfo", "defaultLocation", "defaultLocationAndInfo"])
+def test_tag_data_formats(client, tag_format):
+    tags = client.get_tag_data(client.urls.tag_data_url(tag_format))
+
+    assert len(tags) == 200
+    assert list(tags[0]) == list(TAG_DATA_FORMATS[tag_format])
+
+
+def test_all_items_decoded(client):
+    tags = client.get_gateway_data()
+    readings = [reading for tag in tags if (reading := SensorReading.from_any_dict(tag))]
+
+    assert 50 < len(tags) < 150
+    assert len(readings) > 0.8 * len(tags)  # the rest are frames no parser accepts
+
+
+def test_frames_evolve(client):
+    first = {tag["tagId"]: tag for tag in client.get_gateway_data()}
+    time.sleep(0.25)
+    later = client.get_gateway_data()
+
+    assert all(tag["advertisingDataPayloadTS"] > first[tag["tagId"]]["advertisingDataPayloadTS"] for tag in later)
+    changed = [tag for tag in later if tag["advertisingDataPayload"] != first[tag["tagId"]]["advertisingDataPayload"]]
+    assert len(changed) > 0.5 * len(later)
+
+
+def test_tag_and_group_filters(client):
+    tags = client.get_tag_data(client.urls.tag_data_url("defaultInfo", tags=["a4da22000001", "a4da22000002"]))
+    assert [tag["tagId"] for tag in tags] == ["a4da22000001", "a4da22000002"]
+
+    client.set_tag_group(["a4da22000003"], "group")
+    tags = client.get_tag_data(client.urls.tag_data_url("defaultInfo", groups=["group"]))
+    assert [tag["tagId"] for tag in tags] == ["a4da22000003"]
+
+
+def test_max_age(qpe, client):
+    tag = qpe.tags["a4da22000001"]
+    tag.next_packet = time.time() + 60.0  # goes quiet
+    tag.data["lastPacketTS"] = int(time.time() * 1000) - 30_000
+
+    tags = client.get_tag_data(client.urls.tag_data_url("defaultInfo", max_age=10.0))
+    assert len(tags) == 199
+
+
+def test_not_in_track_mode(qpe, client):
+    client.get(client.urls.qpe_stop_mode)
+    with pytest.raises(QpeError) as error:
+        client.get_tag_data()
+    assert error.value.code == NOT_IN_TRACK_MODE
+    assert not client.get_pe_info().running
+
+    client.get(client.urls.qpe_mode_track_url)
+    assert len(client.get_tag_data()) == 200
+
+
+def test_forced_error(qpe, client):
+    qpe.errors["getLocatorInfo"] = 5
+    with pytest.raises(QpeError) as error:
+        client.get_locator_info()
+    assert error.value.code == 5
+
+
+def test_latency(qpe):
+    qpe.latency = 0.3
+    with QpeClient(qpe.url, timeout=(1.0, 0.1)) as client:
+        with pytest.raises(requests.Timeout):
+            client.get_pe_info()
+
+
+def test_configuration_status_transitions(qpe, client):
+    qpe.config_failure_rate = 0.0
+    tag_ids = ["a4da22000001", "a4da22000002"]
+    client.configure_tag(tag_ids, "ASSET_TAG", "37")
+
+    statuses = set()
+    deadline = time.monotonic() + 2.0
+    while time.monotonic() < deadline:
+        tags = client.get_tag_data(client.urls.tag_data_url("defaultInfo", tags=tag_ids))
+        statuses.update(tag["configStatus"] for tag in tags)
+        if all(tag["configStatus"] == "done" for tag in tags):
+            break
+        time.sleep(0.01)
+
+    assert statuses >= {CONFIG_STEPS[0], "done"}
+    assert all(tag["configStatus"] == "done" for tag in tags)
+
+
+def test_failed_configurations(qpe, client):
+    qpe.config_failure_rate = 1.0
+    qpe.config_step = 0.0
+    client.configure_tag(["a4da22000001"], "ASSET_TAG", "37")
+
+    (tag,) = client.get_tag_data(client.urls.tag_data_url("defaultInfo", tags=["a4da22000001"]))
+    assert tag["configStatus"] == "failed"
+
+
+def test_unknown_configuration(client):
+    with pytest.raises(QpeError):
+        client.configure_tag(["a4da22000001"], "NO_SUCH_CONFIG", "37")
+
+
+def test_pe_and_locator_info(qpe, client):
+    info = client.get_pe_info()
+    assert info.running
+    assert info.packetsPerSecond == pytest.approx(qpe.packets_per_second, abs=0.1)
+    assert len(client.get_locator_info()) == 16
+    assert qpe.requests == {"getPEInfo": 1, "getLocatorInfo": 1}
+
+
+def test_same_seed_same_site():
+    with QpeSimulator(("127.0.0.1", 0), tags=50, seed=3) as a, QpeSimulator(("127.0.0.1", 0), tags=50, seed=3) as b:
+        assert [tag.first_frame for tag in a.tags.values()] == [tag.first_frame for tag in b.tags.values()]
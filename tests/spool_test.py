@@ -0,0 +1,100 @@
+from src.helpers.spool import RECORD_HEADER, Spool
+
+
+def batch(value: int, lines: int = 1) -> bytes:
+    return b"".join(b"m value=%di\n" % (value + line) for line in range(lines))
+
+
+def test_append_peek_consume(tmp_path):
+    spool = Spool(tmp_path)
+    spool.append(batch(0, 2), 2)
+    spool.append(batch(2), 1)
+    spool.append(batch(3), 1)
+
+    (data, lines, size) = spool.peek(max_lines=3)
+    assert data == batch(0, 3)
+    assert lines == 3
+    assert spool.pending_points == 4  # nothing is removed by peek
+
+    spool.consume(size, lines)
+    (data, lines, size) = spool.peek(max_lines=3)
+    assert (data, lines) == (batch(3), 1)
+    spool.consume(size, lines)
+
+    assert not spool
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_segments_rotate(tmp_path):
+    spool = Spool(tmp_path, segment_bytes=len(batch(0)) + RECORD_HEADER.size)
+    for value in range(3):
+        spool.append(batch(value), 1)
+
+    assert len(list(tmp_path.iterdir())) == 3
+    replayed = []
+    while spool:
+        (data, lines, size) = spool.peek(max_lines=10)
+        replayed.append(data)
+        spool.consume(size, lines)
+
+    assert replayed == [batch(0), batch(1), batch(2)]
+
+
+def test_oldest_segments_evicted(tmp_path):
+    record = len(batch(0)) + RECORD_HEADER.size
+    spool = Spool(tmp_path, segment_bytes=record, max_bytes=2 * record)
+    for value in range(5):
+        spool.append(batch(value), 1)
+
+    assert spool.evicted_points == 3
+    assert spool.pending_bytes <= 2 * record
+    assert spool.peek(max_lines=1)[0] == batch(3)
+
+
+def test_picked_up_after_restart(tmp_path):
+    spool = Spool(tmp_path)
+    spool.append(batch(0), 1)
+    spool.append(batch(1), 1)
+    spool.close()
+    with open(next(tmp_path.iterdir()), "ab") as segment:  # a record cut short
+        segment.write(RECORD_HEADER.pack(100, 1) + b"m va")
+
+    spool = Spool(tmp_path)
+    assert spool.pending_points == 2
+    assert spool.peek(max_lines=10)[0] == batch(0, 2)
+
+    spool.append(batch(2), 1)  # into a new segment
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_replay_resumed_after_restart(tmp_path):
+    spool = Spool(tmp_path)
+    for value in range(3):
+        spool.append(batch(value), 1)
+    (_, lines, size) = spool.peek(max_lines=2)
+    spool.consume(size, lines)
+    spool.close()
+
+    spool = Spool(tmp_path)
+    assert spool.pending_points == 1
+    assert spool.peek(max_lines=10)[0] == batch(2)
+
+
+def test_consume_after_eviction_skipped(tmp_path):
+    record = len(batch(0)) + RECORD_HEADER.size
+    spool = Spool(tmp_path, segment_bytes=2 * record, max_bytes=3 * record)
+    spool.append(batch(0), 1)
+    spool.append(batch(1), 1)
+    (_, lines, size) = spool.peek(max_lines=1)
+
+    spool.append(batch(2), 1)  # e.g. from a producer thread, the peeked segment is evicted
+    spool.append(batch(3), 1)
+    spool.consume(size, lines)
+
+    assert spool.evicted_points == 2
+    replayed = []
+    while spool:
+        (data, lines, size) = spool.peek(max_lines=10)
+        replayed.append(data)
+        spool.consume(size, lines)
+    assert replayed == [batch(2, 2)]
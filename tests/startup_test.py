@@ -0,0 +1,57 @@
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+SRC = pathlib.Path(__file__).parent.parent / "src"
+
+# generous, so a slow CI machine passes, a heavy eager import still does not (about 0.12 s here)
+STARTUP_BUDGET = 1.0  # s
+# only imported when the option that needs them is used
+DEFERRED = ("pprint", "concurrent.futures.process", "cProfile", "pstats", "tracemalloc", "influxdb_client")
+
+
+def import_times(module: str, cwd: pathlib.Path) -> dict:
+    """imports module in a fresh interpreter with -X importtime
+
+    Returns:
+        dict: module name -> cumulative import time in s, of every module it imported
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        (_, cumulative, name) = line.split("|")
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+@pytest.mark.parametrize(
+    ("module", "cwd"),
+    [("sensor_tag_monitor", SRC), ("qpe_sys_monitor", SRC / "standalone_scripts")],
+)
+def test_heavy_imports_deferred(module, cwd):
+    times = import_times(module, cwd)
+
+    assert module in times
+    assert [name for name in DEFERRED if name in times] == []
+
+
+def test_parsers_discovered_on_first_use():
+    times = import_times("sensor_tag_monitor", SRC)
+
+    assert not any(name.startswith("sensortags.parsers.") for name in times)
+
+
+def test_startup_budget():
+    times = import_times("sensor_tag_monitor", SRC)
+
+    assert times["sensor_tag_monitor"] < STARTUP_BUDGET
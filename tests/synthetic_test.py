@@ -0,0 +1,57 @@
+import json
+import random
+
+import pytest
+from src.sensortags.registry import ParserRegistry
+from src.sensortags.readings import SensorReading
+from src.sensortags.synthetic import (
+    SAMPLE_FRAMES,
+    UNPARSEABLE_FRAMES,
+    all_items_tag,
+    evolve_frame,
+    synthetic_tags,
+    tag_data_response,
+)
+from src.sensortags.tagstream import TagStream
+
+
+@pytest.mark.parametrize("packet_type, frame", SAMPLE_FRAMES.items())
+def test_sample_frames_parse(packet_type, frame):
+    assert SensorReading.from_any_dict(all_items_tag(1, frame)).packet_type == packet_type
+
+
+@pytest.mark.parametrize("frame", UNPARSEABLE_FRAMES)
+def test_unparseable_frames(frame):
+    assert SensorReading.from_any_dict(all_items_tag(1, frame)) is None
+
+
+@pytest.mark.parametrize("packet_type, frame", SAMPLE_FRAMES.items())
+def test_evolved_frames_parse(packet_type, frame):
+    registry = ParserRegistry()
+    parser = registry.get(packet_type)
+    (first, rng) = (bytes.fromhex(frame), random.Random(1))
+    frame = first
+    for _ in range(50):
+        frame = evolve_frame(frame, first, parser.layout, rng)
+        assert registry.accepts(parser, frame)
+
+
+def test_deterministic_mix():
+    tags = synthetic_tags(2_000, gateway_ratio=0.5, unparseable_ratio=0.1, seed=3)
+
+    assert tags == synthetic_tags(2_000, gateway_ratio=0.5, unparseable_ratio=0.1, seed=3)
+    assert len({tag["tagId"] for tag in tags}) == 2_000
+    gateway = [tag for tag in tags if tag["advertisingDataPayload"] is not None]
+    assert 900 < len(gateway) < 1_100
+    packet_types = [reading.packet_type if (reading := SensorReading.from_any_dict(tag)) else None for tag in gateway]
+    assert set(packet_types) == {*SAMPLE_FRAMES, None}
+    assert 50 < packet_types.count(None) < 150
+
+
+def test_tag_data_response():
+    tags = synthetic_tags(50)
+    body = tag_data_response(tags, code=11)
+
+    assert json.loads(body)["code"] == 11
+    assert json.loads(body)["tags"] == tags
+    assert len(list(TagStream([body]))) == sum(tag["advertisingDataPayload"] is not None for tag in tags)
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from src.sensortags.payloads import payloads_to_buffer
+from src.sensortags.registry import ParserCache, ParserRegistry
+from src.sensortags.tagbatch import TagBatch
+from src.sensortags.vectorized import decode_batch
+
+from tests.layouts_test import PARSER_TEST_DATA
+from tests.readings_test import raw_tag
+
+
+def poll_response() -> list:
+    tags = [raw_tag(adv_data, f"tag{i}") for (i, (_, adv_data)) in enumerate(PARSER_TEST_DATA)]
+    tags.append(raw_tag("ffffffff", "unknown"))
+    tags.append({**raw_tag("00", "no_gateway_data"), "advertisingDataPayload": None})
+    return tags
+
+
+def test_payloads_to_buffer():
+    (buffer, offsets) = payloads_to_buffer(["0x02 0x01", "", "0xbe 0xac 0x00"])
+    assert buffer == b"\x02\x01\xbe\xac\x00"
+    assert list(offsets) == [0, 2, 2, 5]
+
+    (buffer, offsets) = payloads_to_buffer(["0201", "beac00"])
+    assert buffer == b"\x02\x01\xbe\xac\x00"
+    assert list(offsets) == [0, 2, 5]
+
+
+def test_from_tags():
+    batch = TagBatch.from_tags(poll_response())
+
+    assert len(batch) == len(PARSER_TEST_DATA) + 1
+    assert batch.tag_ids[0] == "tag0"
+    assert batch.payload(0) == bytes.fromhex(PARSER_TEST_DATA[0][1])
+    assert batch.timestamps[0] == 1650000000000
+
+
+def test_slice_and_filter_share_payloads():
+    batch = TagBatch.from_tags(poll_response())
+
+    sliced = batch[2:4]
+    assert sliced.tag_ids == ["tag2", "tag3"]
+    assert sliced.payload(1) == batch.payload(3)
+    assert sliced.payload_data is batch.payload_data
+
+    filtered = batch.filter(np.array(batch.tag_ids) == "tag3")
+    assert filtered.tag_ids == ["tag3"]
+    assert filtered.payload(0) == batch.payload(3)
+
+    with pytest.raises(TypeError):
+        batch[0]
+
+
+def test_group_by_packet_type():
+    batch = TagBatch.from_tags(poll_response())
+
+    groups = batch.group_by_packet_type(ParserCache(ParserRegistry()))
+
+    assert {packet_type: len(group) for (packet_type, group) in groups.items()} == {
+        "minew_e6": 2,
+        "minew_s1": 1,
+        "minew_s4_alarm": 3,
+        "ruuvi_raw_v1": 3,
+        "ruuvi_raw_v2_f5": 3,
+        None: 1,
+    }
+
+
+def test_decode_batch():
+    batch = TagBatch.from_tags(poll_response())
+    registry = ParserRegistry()
+
+    decoded = decode_batch(batch, registry)
+
+    (rows, columns) = decoded["ruuvi_raw_v2_f5"]
+    assert [batch.tag_ids[row] for row in rows] == ["tag9", "tag10", "tag11"]
+    assert list(columns["measurement_sequence_number"]) == [205, 65534, 0]
+    assert sum(len(columns.rows) for columns in decoded.values()) == len(PARSER_TEST_DATA)
+
+
+def test_empty_batch():
+    batch = TagBatch.from_tags([])
+
+    assert len(batch) == 0
+    assert decode_batch(batch, ParserRegistry()) == {}
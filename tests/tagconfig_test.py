@@ -10,6 +10,8 @@ Documentation:
 
 import src.standalone_scripts.auto_tag_config as tc
 
+from tests.qpe_test import StandInQpe
+
 
 def test_update_url_query():
     """tests if the function returns the correct URL string"""
@@ -20,3 +22,25 @@ def test_update_url_query():
     test_url = tc.update_url_query(original_url, parameters)
 
     assert test_url == final_url
+
+
+def test_self_metrics_observed():
+    tc.observe("qpe_request_seconds", 0.5)
+    tc.observe("qpe_request_seconds", 1.5)
+
+    assert tc.self_metrics["qpe_request_seconds"] == {"count": 2, "sum": 2.0, "max": 1.5}
+
+
+def test_timed_out_request_skipped(monkeypatch):
+    qpe = StandInQpe()
+    qpe.delay = 0.2
+    monkeypatch.setattr(tc, "TIMEOUT", (1.0, 0.05))
+    errors = tc.self_metrics.get("qpe_request_errors", {}).get("count", 0)
+
+    res = tc.request_qpe(f"{qpe.url}/configureTag?tag=a", "configure_request_seconds")
+    tc.print_response(res)
+    qpe.shutdown()
+    qpe.server_close()
+
+    assert res is None
+    assert tc.self_metrics["qpe_request_errors"]["count"] == errors + 1
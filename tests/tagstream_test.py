@@ -0,0 +1,87 @@
+import json
+import tracemalloc
+
+import pytest
+from src.sensortags.tagstream import GATEWAY_KEYS, TagStream, iter_gateway_tags, object_end
+
+from tests.readings_test import raw_tag
+
+
+def all_items_tag(index: int, gateway: bool) -> dict:
+    tag = raw_tag("02010611ff99040512fc5394c37c0004fffc040cac364200cdcbb8334c884f", f"{index:012x}")
+    tag.update(
+        {
+            "tagName": f'tag {{"{index}"}} \\ ,]',  # braces, quotes and brackets inside a string
+            "location": [1.0, 2.0, 0.5],
+            "zones": [{"id": "zone", "name": "{zone}"}],
+            "battery": None,
+        }
+    )
+    if not gateway:
+        tag.update({key: None for key in GATEWAY_KEYS if key != "tagId"})
+    return tag
+
+
+def response(count: int, **top_level) -> bytes:
+    body = {"code": 0, "command": "getTagData", "tags": [all_items_tag(i, gateway=i % 3 == 0) for i in range(count)]}
+    body.update(top_level)
+    return json.dumps(body, indent=1).encode()
+
+
+def chunked(data: bytes, size: int) -> list:
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 16])
+def test_same_tags_as_json(chunk_size):
+    data = response(30, responseTS=1650000000000)
+    stream = TagStream(chunked(data, chunk_size))
+    tags = list(stream)
+
+    expected = [
+        {key: tag[key] for key in GATEWAY_KEYS}
+        for tag in json.loads(data)["tags"]
+        if tag["advertisingDataPayload"] is not None
+    ]
+    assert tags == expected
+    assert stream.skipped == 20
+    assert stream.response == {"code": 0, "command": "getTagData", "responseTS": 1650000000000}
+
+
+def test_error_response():
+    stream = TagStream([b'{"code": 11, "message": "not in track mode"}'])
+
+    assert list(stream) == []
+    assert stream.response["code"] == 11
+
+
+def test_non_ascii_split_across_chunks():
+    data = json.dumps({"code": 0, "tags": [dict(all_items_tag(0, True), tagName="Käyttäjä")]}, ensure_ascii=False)
+    tags = list(TagStream(chunked(data.encode(), 1), keys=("tagName",)))
+
+    assert tags == [{"tagName": "Käyttäjä"}]
+
+
+def test_cut_short():
+    data = response(3)
+    with pytest.raises(ValueError):
+        list(iter_gateway_tags([data[: len(data) // 2]]))
+
+
+def test_object_end():
+    text = '{"a": "}", "b": {"c": [1, {}]}} tail'
+    assert text[: object_end(text, 0)] == '{"a": "}", "b": {"c": [1, {}]}}'
+    assert object_end(text[:10], 0) is None
+
+
+def test_peak_memory_flat():
+    peaks = []
+    for count in (1_000, 10_000):
+        chunks = chunked(response(count), 64 * 1024)
+        tracemalloc.start()
+        for _ in TagStream(chunks):
+            pass
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    assert peaks[1] < 1.5 * peaks[0]
@@ -11,3 +11,13 @@ def test_hex_string_to_2s_comp_signed_int_positive():
 
 def test_hex_string_to_2s_comp_signed_int_negative():
     assert t.hex_string_to_2s_comp_signed_int("ff", 8) == -1
+
+
+def test_twos_complement():
+    assert t.twos_complement(0x7FFF, 16) == 32767
+    assert t.twos_complement(0x8001, 16) == -32767
+
+
+def test_ruuvi_sign_magnitude_to_float():
+    assert t.ruuvi_sign_magnitude_to_float(0x81, 0x45) == -1.69
+    assert t.ruuvi_sign_magnitude_to_float(0x01, 0x45) == 1.69
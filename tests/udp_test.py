@@ -0,0 +1,107 @@
+import json
+import socket
+import sys
+
+import pytest
+from src.helpers.udp import UdpTagListener
+from src.sensortags.readings import SensorReading
+
+from tests.readings_test import raw_tag
+
+MINEW_S1 = "0201060303e1ff1016e1ffa101640a304c593182ab3f23ac"
+
+
+class StandInQpeSender:
+    """pushes datagrams to a listener the way QPE does"""
+
+    def __init__(self, address: tuple):
+        self.address = address
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, message) -> None:
+        self.send_raw(json.dumps(message).encode())
+
+    def send_raw(self, data: bytes) -> None:
+        self.socket.sendto(data, self.address)
+
+    def close(self) -> None:
+        self.socket.close()
+
+
+@pytest.fixture
+def listener():
+    with UdpTagListener(0, host="127.0.0.1") as listener:
+        yield listener
+
+
+@pytest.fixture
+def sender(listener):
+    sender = StandInQpeSender(listener.address)
+    yield sender
+    sender.close()
+
+
+def test_single_tags_lists_and_tag_data(listener, sender):
+    sender.send(raw_tag(MINEW_S1, "a"))
+    sender.send([raw_tag(MINEW_S1, "b"), raw_tag(MINEW_S1, "c")])
+    sender.send({"code": 0, "tags": [raw_tag(MINEW_S1, "d")]})
+
+    tags = []
+    while len(tags) < 4 and (batch := listener.receive_batch(timeout=1.0)):
+        tags += batch
+
+    assert [tag["tagId"] for tag in tags] == ["a", "b", "c", "d"]
+    assert listener.datagrams == 3
+    assert listener.dropped == 0
+
+
+def test_decoded_with_the_gateway_parsers(listener, sender):
+    sender.send(raw_tag(MINEW_S1))
+
+    (tag,) = listener.receive_batch(timeout=1.0)
+
+    assert SensorReading.from_any_dict(tag).as_influx_point_dict() == SensorReading.from_any_dict(
+        raw_tag(MINEW_S1)
+    ).as_influx_point_dict()
+
+
+def test_invalid_datagrams_are_counted(listener, sender):
+    sender.send_raw(b'{"tagId": "cut sh')
+    sender.send_raw(b"42")
+    sender.send(raw_tag(MINEW_S1))
+
+    tags = []
+    while len(tags) < 1 and (batch := listener.receive_batch(timeout=1.0)):
+        tags += batch
+
+    assert len(tags) == 1
+    assert listener.datagrams == 3
+    assert listener.invalid == 2
+
+
+def test_timeout_without_data(listener):
+    assert listener.receive_batch(timeout=0.05) == []
+
+
+def test_receive_buffer_is_configurable():
+    with UdpTagListener(0, host="127.0.0.1", receive_buffer=64 * 1024) as small:
+        with UdpTagListener(0, host="127.0.0.1", receive_buffer=256 * 1024) as large:
+            assert small.receive_buffer < large.receive_buffer
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="SO_RXQ_OVFL is Linux only")
+def test_full_receive_buffer_drops_are_counted():
+    with UdpTagListener(0, host="127.0.0.1", receive_buffer=4096) as listener:
+        sender = StandInQpeSender(listener.address)
+        for index in range(200):  # not read meanwhile, most do not fit in the buffer
+            sender.send(raw_tag(MINEW_S1, str(index)))
+        while listener.receive_batch(timeout=0.1):
+            pass
+        # the drop count comes with the datagrams queued after the drops
+        sender.send(raw_tag(MINEW_S1, "last"))
+        sender.close()
+
+        assert listener.receive_batch(timeout=1.0)
+
+        assert listener.kernel_dropped > 0
+        assert listener.datagrams + listener.kernel_dropped == 201
@@ -20,3 +20,14 @@ def test_compendium_constructor():
     comp = QpeUrlCompendium("http://localhost:8080/qpe")
 
     assert test_url == comp.qpe_mode_deployment_url
+
+
+def test_tag_data_url():
+    comp = QpeUrlCompendium("http://localhost:8080/qpe")
+
+    assert comp.tag_data_url("ALL_ITEMS") == comp.get_tag_data_all_items
+    assert (
+        comp.tag_data_url(tags=["a", "b"], groups=["g"], max_age=30, humanReadable="true")
+        == "http://localhost:8080/qpe/getTagData?mode=json&format=defaultInfo&tag=a%2Cb&tagGroup=g&maxAge=30000"
+        "&humanReadable=true"
+    )
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+import src.helpers.tools as tools
+from src.sensortags.registry import ParserRegistry
+from src.sensortags.vectorized import decode_frames, stack_frames
+
+from tests.layouts_test import PARSER_TEST_DATA
+from tests.registry_test import REJECTED_FRAMES
+
+UNPARSEABLE = ["ffffffff", "02010612ff3906a40001000200020100020677aa3f23ac4bf4", "02010611ff990405", *REJECTED_FRAMES]
+
+
+def test_batch_matches_layout_decode():
+    adv_data = [data for (_, data) in PARSER_TEST_DATA] + UNPARSEABLE
+    registry = ParserRegistry()
+    (frames, lengths) = stack_frames([bytes.fromhex(data) for data in adv_data])
+
+    decoded = decode_frames(frames, lengths, registry)
+
+    assert sum(len(columns.rows) for columns in decoded.values()) == len(PARSER_TEST_DATA)
+    for (packet_type, (rows, columns)) in decoded.items():
+        layout = registry.get(packet_type).layout
+        for (column_index, row) in enumerate(rows):
+            expected = layout.decode(bytes.fromhex(adv_data[row]))
+            for (name, value) in expected.items():
+                if name == "_little_endian_mac":
+                    assert columns[name][column_index].tobytes().hex() == value
+                else:
+                    assert columns[name][column_index] == pytest.approx(value)
+
+
+def test_empty_batch():
+    (frames, lengths) = stack_frames([])
+
+    assert decode_frames(frames, lengths, ParserRegistry()) == {}
+
+
+def test_tools_are_array_aware():
+    assert list(tools.twos_complement(np.array([0x0FFF, 0xFFFF]), 16)) == [4095, -1]
+    assert list(tools.ruuvi_sign_magnitude_to_float(np.array([0x01, 0x81]), np.array([69, 69]))) == [1.69, -1.69]